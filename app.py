@@ -1,16 +1,39 @@
 from flask import Flask, render_template, request, jsonify, send_from_directory,send_file
-from flask import session, redirect, url_for
+from flask import session, redirect, url_for, after_this_request, Response
 from functools import wraps
 from pathlib import Path
+import copy
+import hashlib
 import json
 from datetime import datetime
 import os 
 import re
-import itertools
 import math
+import threading
+import time
+import click
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from urllib.parse import urlsplit
+from werkzeug.exceptions import HTTPException
+
+from pairing import (
+    TeamOdds, assignment_alternatives, discrete_normal, k_best_assignments, k_best_completions,
+    k_best_layout_assignments, k_best_rosters,
+    pairing_game, plan_pairing_game, process_pool,
+)
+from calibration import CALIBRATION_DOC, SCORE_TABLES, ScoreTable, next_calibration
+from events import EventBroker
+from game_index import GameIndex, decode_cursor, project
+from jobs import DONE, RUNNING, JobQueue, QueueFull, report_progress
+from layout_images import LayoutImages
+from list_pdf import PDF_CACHE_DIR, PdfCache, merge_pdfs, pdf_source, render_pdf, source_hash, zip_stream
+import metrics
+from report import (
+    REPORT_DOC, REPORT_VERSION, averages, build_report, game_rows, history_of, player_history,
+    set_game_rows, set_player_history, suggest_cell,
+)
+from simulation import OPPONENT_STRATEGIES, simulate
+from storage import StorageError, apply_edit, open_store
 
 
 app = Flask(__name__)
@@ -32,8 +55,16 @@ TEAM_SLUG = os.getenv("TEAM_SLUG", slugify(TEAM_NAME))
 DATA_DIR = Path(os.getenv("DATA_DIR", "/app/data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-PLAYERS_FILE = DATA_DIR / "players.json"
-GAMES_FILE = DATA_DIR / "games.json"
+# "json" (games.json / players.json) or "sqlite" (data/pairing.db, imports the JSON files once)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+STORE = open_store(DATA_DIR, STORAGE_BACKEND)
+
+# Live matrix / pairing changes for the open pages (in-process, see events.py)
+EVENTS = EventBroker()
+
+# METRICS=1: Server-Timing headers on every response and /metrics for Prometheus (see metrics.py)
+if os.getenv("METRICS") == "1":
+    metrics.enable()
 
 ALLOWED_MATRIX_STATES = {
     "GAMBLE", "UNKNOWN", "EASY", "WIN",
@@ -52,6 +83,26 @@ STATE_TO_SCORE = {
     "GAMBLE": 10.0,
 }
 
+# Spread of the 0-20 game score around STATE_TO_SCORE (win-probability mode)
+STATE_TO_SPREAD = {
+    "HELP": 2.5,
+    "LOOSE": 2.0,
+    "S_LOOSE": 1.5,
+    "S_WIN": 1.5,
+    "WIN": 2.0,
+    "EASY": 2.5,
+    "UNKNOWN": 4.0,
+    "GAMBLE": 5.5,
+}
+
+# The constants above as a ScoreTable; ?scores=calibrated uses tables fitted on real scores
+FIXED_SCORES = ScoreTable(STATE_TO_SCORE, STATE_TO_SPREAD)
+
+# Team result on 8 games, same as the fight page summary:
+# Loss below 75, Draw up to 85, Win above
+TEAM_LOSS_BELOW = 75
+TEAM_WIN_ABOVE = 85
+
 def default_list_text(player: dict):
     lists = player.get("lists") or []
     idx = player.get("default_index")
@@ -67,22 +118,141 @@ def login_required(view):
         return view(*args, **kwargs)
     return wrapped
 
-def load_games():
-    if not GAMES_FILE.exists():
-        return []
+@app.errorhandler(StorageError)
+def storage_error(e):
+    return jsonify({"error": str(e)}), 500
+
+def transactional(view):
+    # Whole handler in one store transaction, so read-modify-write cycles don't interleave
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        with STORE.transaction():
+            return view(*args, **kwargs)
+    return wrapped
+
+# ---------- Revisions ----------
+# Every game write bumps game["revision"]. game["cell_revisions"] keeps the
+# revision that last changed each item ("matrix:<pid>-<army>", "pairing:<n>",
+# "comment", "scenario", "layout_modifier:<scenario>:<pid>-<army>-<layout>"),
+# so a write made from an older revision is only rejected for items it
+# changes that someone else changed in the meantime.
+
+def request_base_revision(payload):
+    """Revision the client edited from (If-Match or base_revision): (rev or None, error)."""
+    raw = request.headers.get("If-Match")
+    if raw is not None:
+        raw = raw.strip()
+        if raw.startswith("W/"):
+            raw = raw[2:]
+        raw = raw.strip('"')
+    else:
+        raw = payload.get("base_revision")
+    if raw is None:
+        return None, None
     try:
-        with GAMES_FILE.open() as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            return []
-    except json.JSONDecodeError:
+        return int(raw), None
+    except (TypeError, ValueError):
+        return None, "base revision must be an integer"
+
+def revision_conflicts(game, base, changes):
+    """changes: {item: (current value, new value)}. Items someone else changed after base."""
+    if base is None:
         return []
+    revisions = game.get("cell_revisions") or {}
+    reset = game.get("reset_revision", 0)
+    return [
+        {"key": key, "value": current}
+        for key, (current, new) in changes.items()
+        if current != new and revisions.get(key, reset) > base
+    ]
+
+def conflict_response(game, conflicts, error="Someone else changed this since you loaded it"):
+    return jsonify({
+        "error": error,
+        "revision": game.get("revision", 0),
+        "conflicts": conflicts,
+    }), 409
+
+def revision_edit(game, changes):
+    """Next revision and the cell_revisions entries for the items that really change."""
+    rev = game.get("revision", 0) + 1
+    return rev, {key: rev for key, (current, new) in changes.items() if current != new}
+
+def publish_game_event(game_id, event):
+    """Push `event` to the game's live streams once the request succeeded and its transaction committed."""
+    event["client"] = request.headers.get("X-Client-Id")
+
+    @after_this_request
+    def push(response):
+        if response.status_code < 300:
+            EVENTS.publish(game_id, event)
+        return response
+
+def changed_items(changes, prefix):
+    """{item: new value} for the `prefix:item` entries that really change."""
+    return {
+        key[len(prefix):]: new
+        for key, (current, new) in changes.items()
+        if key.startswith(prefix) and current != new
+    }
 
-def save_games(games):
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with GAMES_FILE.open("w") as f:
-        json.dump(games, f, indent=2)
+def load_games():
+    return STORE.load_games()
+
+def get_game(game_id):
+    return STORE.get_game(game_id)
+
+def save_game(game):
+    with STORE.transaction():
+        STORE.save_game(game)
+        update_report(game["id"], game)
+
+def patch_game(game, edit):
+    """Small edit of a stored game (see storage.apply_edit), also applied to `game`."""
+    with STORE.transaction():
+        STORE.patch_game(game["id"], edit)
+        apply_edit(game, edit)
+        update_report(game["id"], game)
+
+def delete_game(game_id):
+    with STORE.transaction():
+        deleted = STORE.delete_game(game_id)
+        if deleted:
+            update_report(game_id, None)
+        return deleted
+
+def load_report():
+    """Report aggregates (report.py), built from all games and players the first time."""
+    report = STORE.load_doc(REPORT_DOC)
+    if report is None or report.get("version") != REPORT_VERSION:
+        with STORE.transaction():
+            report = STORE.load_doc(REPORT_DOC)
+            if report is None or report.get("version") != REPORT_VERSION:
+                with metrics.span("report.build"):
+                    report = build_report(load_games(), STORE.load_players(), STATE_TO_SCORE)
+                STORE.save_doc(REPORT_DOC, report)
+                refit_calibration(report)
+    return report
+
+def update_report(game_id, game):
+    """Swap one game's rows in the report aggregates (game None: deleted). Call inside the write's transaction."""
+    report = load_report()
+    rows = game_rows(game, STATE_TO_SCORE) if game is not None else None
+    if report["games"].get(str(game_id)) == rows:
+        # most saves (matrix cells, layouts...) leave the results alone
+        return
+    report = set_game_rows(copy.deepcopy(report), game_id, rows)
+    STORE.save_doc(REPORT_DOC, report)
+    refit_calibration(report)
+
+def update_report_history(player_id, player):
+    """Swap one player's match_history tally in the report aggregates (player None: deleted)."""
+    report = load_report()
+    history = player_history(player) if player is not None else None
+    if report["history"].get(str(player_id)) == history:
+        return
+    report = set_player_history(copy.deepcopy(report), player_id, history)
+    STORE.save_doc(REPORT_DOC, report)
 
 def next_game_id(games):
     ids = [g.get("id") for g in games if isinstance(g, dict) and "id" in g]
@@ -91,19 +261,13 @@ def next_game_id(games):
     return max(ids) + 1
 
 def load_players():
-    if not PLAYERS_FILE.exists():
-        return []
-    try:
-        with PLAYERS_FILE.open() as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                data = normalize_players(data)
-                # optional: save back once to persist "active" field
-                save_players(data)
-                return data
-            return []
-    except json.JSONDecodeError:
-        return []
+    players = STORE.load_players()
+    if any(isinstance(p, dict) and "active" not in p for p in players):
+        # Files from before the "active" field: normalize and persist once
+        with STORE.transaction():
+            players = normalize_players(copy.deepcopy(STORE.load_players()))
+            save_players(players)
+    return players
 
 def normalize_players(players):
     # ensure each player has "active"
@@ -123,10 +287,69 @@ def normalize_players(players):
                 active_count += 1
     return players
 
+def calibration_inputs(report):
+    """The real score statistics of the report aggregates that a fit is made from."""
+    return {"states": report["state_scores"], "player_states": report["player_state_scores"]}
+
+def refit_calibration(report):
+    """
+    Fit the calibration (calibration.py) again if the real scores in
+    `report` changed since the last fit. Call inside the transaction that
+    saves the report aggregates, so the two never disagree.
+    """
+    inputs = calibration_inputs(report)
+    doc = STORE.load_doc(CALIBRATION_DOC)
+    if doc is None or doc["current"]["inputs"] != inputs:
+        fitted_at = datetime.now().isoformat(timespec="seconds")
+        doc = next_calibration(doc, copy.deepcopy(inputs), STATE_TO_SCORE, STATE_TO_SPREAD, fitted_at)
+        STORE.save_doc(CALIBRATION_DOC, doc)
+    return doc
+
+def calibrate():
+    """
+    The calibration document, as refitted by the last report write. Only
+    reads: before the first fit is stored (data from older versions) the
+    fit is made on the fly, with fitted_at None.
+    """
+    doc = STORE.load_doc(CALIBRATION_DOC)
+    if doc is None:
+        inputs = calibration_inputs(load_report())
+        doc = next_calibration(None, copy.deepcopy(inputs), STATE_TO_SCORE, STATE_TO_SPREAD, None)
+    return doc
+
+def score_table(name):
+    """ScoreTable for fixed / calibrated / calibrated_player: (table, None) or (None, error response)."""
+    if name in (None, "", "fixed"):
+        return FIXED_SCORES, None
+    if name not in SCORE_TABLES:
+        return None, (jsonify({"error": f"scores must be one of {', '.join(SCORE_TABLES)}"}), 400)
+    current = calibrate()["current"]
+    return ScoreTable.from_calibration(current, per_player=name == "calibrated_player"), None
+
 def save_players(players):
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with PLAYERS_FILE.open("w") as f:
-        json.dump(players, f, indent=2)
+    with STORE.transaction():
+        STORE.save_players(players)
+        report = load_report()
+        history = history_of(players)
+        if report["history"] != history:
+            report = copy.deepcopy(report)
+            report["history"] = history
+            STORE.save_doc(REPORT_DOC, report)
+
+def get_player(player_id):
+    return STORE.get_player(player_id)
+
+def save_player(player):
+    with STORE.transaction():
+        STORE.save_player(player)
+        update_report_history(player["id"], player)
+
+def delete_player(player_id):
+    with STORE.transaction():
+        deleted = STORE.delete_player(player_id)
+        if deleted:
+            update_report_history(player_id, None)
+        return deleted
 
 def next_player_id(players):
     """Compute next player id, even if some entries are odd."""
@@ -173,12 +396,16 @@ def players_page():
 @app.route("/api/players", methods=["GET"])
 @login_required
 def api_get_players():
-    players = load_players()
-    return jsonify(players)
+    etag = resource_etag("players", STORE.version("players"))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return conditional_json(load_players(), etag)
 
 
 @app.route("/api/players", methods=["POST"])
 @login_required
+@transactional
 def api_add_player():
     try:
         data = request.get_json(silent=True) or {}
@@ -194,8 +421,7 @@ def api_add_player():
             "default_index": None,
             "active": False,   # NEW
         }
-        players.append(new_player)
-        save_players(players)
+        save_player(new_player)
         return jsonify(new_player), 201
 
     except Exception as e:
@@ -205,6 +431,7 @@ def api_add_player():
     
 @app.route("/api/players/<int:player_id>/active", methods=["POST"])
 @login_required
+@transactional
 def api_set_player_active(player_id):
     payload = request.get_json(silent=True) or {}
     active = payload.get("active")
@@ -219,21 +446,19 @@ def api_set_player_active(player_id):
     if active and active_others >= 8:
         return jsonify({"error": "You can only activate 8 players."}), 400
 
-    for p in players:
-        if p.get("id") == player_id:
-            p["active"] = active
-            save_players(players)
-            return jsonify(p)
+    p = get_player(player_id)
+    if not p:
+        return jsonify({"error": "Player not found"}), 404
 
-    return jsonify({"error": "Player not found"}), 404
+    p["active"] = active
+    save_player(p)
+    return jsonify(p)
 
 
 @app.route("/api/players/<int:player_id>", methods=["DELETE"])
 @login_required
 def api_delete_player(player_id):
-    players = load_players()
-    players = [p for p in players if p["id"] != player_id]
-    save_players(players)
+    delete_player(player_id)
     return jsonify({"status": "ok"})
 
 
@@ -241,61 +466,64 @@ def api_delete_player(player_id):
 
 @app.route("/api/players/<int:player_id>/lists", methods=["POST"])
 @login_required
+@transactional
 def api_add_list(player_id):
     data = request.get_json()
     text = data.get("text", "").strip()
     if not text:
         return jsonify({"error": "List text is required"}), 400
 
-    players = load_players()
-    for p in players:
-        if p["id"] == player_id:
-            p["lists"].append(text)
-            # if it's the first list, make it default
-            if p["default_index"] is None:
-                p["default_index"] = 0
-            save_players(players)
-            return jsonify(p)
-    return jsonify({"error": "Player not found"}), 404
+    p = get_player(player_id)
+    if not p:
+        return jsonify({"error": "Player not found"}), 404
+
+    p["lists"].append(text)
+    # if it's the first list, make it default
+    if p["default_index"] is None:
+        p["default_index"] = 0
+    save_player(p)
+    return jsonify(p)
 
 
 @app.route("/api/players/<int:player_id>/lists/<int:list_index>", methods=["DELETE"])
 @login_required
+@transactional
 def api_delete_list(player_id, list_index):
-    players = load_players()
-    for p in players:
-        if p["id"] == player_id:
-            if 0 <= list_index < len(p["lists"]):
-                p["lists"].pop(list_index)
-                # adjust default_index
-                if p["default_index"] is not None:
-                    if list_index == p["default_index"]:
-                        p["default_index"] = 0 if p["lists"] else None
-                    elif list_index < p["default_index"]:
-                        p["default_index"] -= 1
-                save_players(players)
-                return jsonify(p)
-            return jsonify({"error": "List index out of range"}), 400
-    return jsonify({"error": "Player not found"}), 404
+    p = get_player(player_id)
+    if not p:
+        return jsonify({"error": "Player not found"}), 404
+
+    if not (0 <= list_index < len(p["lists"])):
+        return jsonify({"error": "List index out of range"}), 400
+    p["lists"].pop(list_index)
+    # adjust default_index
+    if p["default_index"] is not None:
+        if list_index == p["default_index"]:
+            p["default_index"] = 0 if p["lists"] else None
+        elif list_index < p["default_index"]:
+            p["default_index"] -= 1
+    save_player(p)
+    return jsonify(p)
 
 
 @app.route("/api/players/<int:player_id>/default_list", methods=["POST"])
 @login_required
+@transactional
 def api_set_default_list(player_id):
     data = request.get_json()
     index = data.get("index")
     if index is None:
         return jsonify({"error": "Index is required"}), 400
 
-    players = load_players()
-    for p in players:
-        if p["id"] == player_id:
-            if not (0 <= index < len(p["lists"])):
-                return jsonify({"error": "Index out of range"}), 400
-            p["default_index"] = index
-            save_players(players)
-            return jsonify(p)
-    return jsonify({"error": "Player not found"}), 404
+    p = get_player(player_id)
+    if not p:
+        return jsonify({"error": "Player not found"}), 404
+
+    if not (0 <= index < len(p["lists"])):
+        return jsonify({"error": "Index out of range"}), 400
+    p["default_index"] = index
+    save_player(p)
+    return jsonify(p)
 
 
 @app.route("/games/new")
@@ -305,6 +533,7 @@ def new_game_page():
 
 @app.route("/api/games", methods=["POST"])
 @login_required
+@transactional
 def api_create_game():
     data = request.get_json(silent=True) or {}
     opponent_name = (data.get("opponent_name") or "").strip()
@@ -334,8 +563,7 @@ def api_create_game():
         "armies": armies,
         "created_at": datetime.now().isoformat(timespec="seconds"),
     }
-    games.append(new_game)
-    save_games(games)
+    save_game(new_game)
     return jsonify(new_game), 201
 
 
@@ -345,22 +573,92 @@ def games_list_page():
     return render_template("game_list.html")
 
 
+GAMES_PAGE_SIZE = 50
+GAMES_PAGE_MAX = 500
+
+def requested_fields():
+    """?fields=summary or ?fields=id,opponent_name,... (None: whole games)."""
+    fields = request.args.get("fields")
+    if not fields:
+        return None
+    if fields == "summary":
+        return "summary"
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
 @app.route("/api/games", methods=["GET"])
 @login_required
 def api_get_games():
-    games = load_games()
-    # Sort newest first
-    games_sorted = sorted(games, key=lambda g: g.get("created_at", ""), reverse=True)
-    return jsonify(games_sorted)
+    """
+    Without parameters: every game, newest first (a plain list).
+    With any of opponent, faction, scenario, from, to (inclusive dates),
+    cursor, limit or fields: {"games", "next_cursor", "total"}, served from
+    the in-memory game index (game_index.py).
+    """
+    etag = resource_etag("games", STORE.version("games"), request.query_string)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    if not request.args:
+        games = load_games()
+        # Sort newest first
+        games_sorted = sorted(games, key=lambda g: g.get("created_at", ""), reverse=True)
+        return conditional_json(games_sorted, etag)
+
+    args = request.args
+    try:
+        limit = int(args.get("limit", GAMES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not (1 <= limit <= GAMES_PAGE_MAX):
+        return jsonify({"error": f"limit must be 1..{GAMES_PAGE_MAX}"}), 400
+
+    cursor = args.get("cursor")
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        cursor = None
+
+    index = STORE.derived("games", "index", GameIndex)
+    games, next_cursor, total = index.query(
+        opponent=args.get("opponent") or None,
+        faction=args.get("faction") or None,
+        scenario=args.get("scenario") or None,
+        date_from=args.get("from") or None,
+        date_to=args.get("to") or None,
+        cursor=cursor,
+        limit=limit,
+    )
+    fields = requested_fields()
+    return conditional_json({
+        "games": [project(g, fields) for g in games],
+        "next_cursor": next_cursor,
+        "total": total,
+    }, etag)
+
+@app.route("/api/games/<int:game_id>", methods=["GET"])
+@login_required
+def api_get_game(game_id):
+    etag = resource_etag(*game_etag(game_id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+    return conditional_json(project(game, requested_fields()), etag)
 
 @app.route("/api/games/<int:game_id>", methods=["DELETE"])
 @login_required
 def api_delete_game(game_id):
-    games = load_games()
-    new_games = [g for g in games if g.get("id") != game_id]
-    if len(new_games) == len(games):
+    if not delete_game(game_id):
         return jsonify({"error": "Game not found"}), 404
-    save_games(new_games)
+    publish_game_event(game_id, {"type": "deleted"})
     return jsonify({"status": "ok"})
 
 @app.route("/games/<int:game_id>/matrix")
@@ -370,20 +668,51 @@ def game_matrix_page(game_id):
     return render_template("game_matrix.html", game_id=game_id)
 
 
-@app.route("/api/games/<int:game_id>/matrix", methods=["GET"])
-@login_required
-def api_get_game_matrix(game_id):
-    games = load_games()
-    game = next((g for g in games if g.get("id") == game_id), None)
-    if not game:
-        return jsonify({"error": "Game not found"}), 404
+# Clients may keep read API responses but must revalidate them every time
+CACHE_CONTROL = "private, no-cache"
 
-    roster = game.get("roster", [])
-    roster_locked = isinstance(roster, list) and len(roster) == 8
+def resource_etag(*versions):
+    """ETag of a response built from these versions (store versions, item hashes, query args)."""
+    return hashlib.sha1(repr(versions).encode()).hexdigest()
 
-    matrix = game.get("matrix", {})
+def not_modified(etag):
+    """
+    Bodyless 304 if the client's If-None-Match already has `etag`, else None.
+    Checked before the payload is built, so a match costs no serialisation.
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+def conditional_json(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+def game_etag(game_id):
+    """
+    ETag parts of a game's views. The players collection is part of it: an
+    open roster shows every player.
+    """
+    return "game", game_id, STORE.item_version("games", game_id), STORE.version("players"), request.query_string
 
-    return jsonify({
+def team_size(game):
+    """Players per side: one per opposing army (3, 5, 8...)."""
+    return len(game.get("armies") or [])
+
+def roster_locked(game):
+    roster = game.get("roster")
+    return isinstance(roster, list) and 0 < len(roster) == team_size(game)
+
+def matrix_view(game):
+    """Game header, roster (or every player to pick from) and matrix, as the matrix page reads them."""
+    roster = game.get("roster", [])
+    locked = roster_locked(game)
+    return {
         "game": {
             "id": game.get("id"),
             "opponent_name": game.get("opponent_name"),
@@ -391,11 +720,51 @@ def api_get_game_matrix(game_id):
             "created_at": game.get("created_at"),
             "comment": game.get("comment", ""),
         },
-        "roster_locked": roster_locked,
-        "players": roster if roster_locked else [],
-        "all_players": load_players() if not roster_locked else [],
-        "matrix": matrix
-    })
+        "roster_locked": locked,
+        "players": roster if locked else [],
+        "all_players": load_players() if not locked else [],
+        "matrix": game.get("matrix", {}),
+        "revision": game.get("revision", 0)
+    }
+
+
+@app.route("/api/games/<int:game_id>/matrix", methods=["GET"])
+@login_required
+def api_get_game_matrix(game_id):
+    etag = resource_etag(*game_etag(game_id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+    return conditional_json(matrix_view(game), etag)
+
+
+@app.route("/api/games/<int:game_id>/bootstrap", methods=["GET"])
+@login_required
+def api_game_bootstrap(game_id):
+    """
+    Everything the matrix and fight pages load, in one response: the game,
+    roster (or every player to pick from), matrix, pairings, scenario and
+    the layouts found in data/.
+    """
+    layouts_version, layouts = layout_manifest()
+    etag = resource_etag(*game_etag(game_id), layouts_version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+    return conditional_json({
+        **matrix_view(game),
+        "scenario": game.get("scenario"),
+        "pairings": game.get("pairings", []),
+        "layouts": layouts,
+    }, etag)
 
 
 
@@ -403,17 +772,17 @@ def api_get_game_matrix(game_id):
 
 @app.route("/api/games/<int:game_id>/matrix", methods=["POST"])
 @login_required
+@transactional
 def api_save_game_matrix(game_id):
     
-    games = load_games()
-    game = next((g for g in games if g.get("id") == game_id), None)
+    game = get_game(game_id)
     if not game:
         return jsonify({"error": "Game not found"}), 404
 
     roster = game.get("roster", [])
     roster_ids = {p.get("player_id") for p in roster if isinstance(p, dict)}
 
-    if len(roster_ids) != 8:
+    if not roster_locked(game) or len(roster_ids) != team_size(game):
         return jsonify({"error": "Roster not locked yet for this game"}), 400
     
     payload = request.get_json(silent=True) or {}
@@ -426,6 +795,10 @@ def api_save_game_matrix(game_id):
     if not isinstance(comment, str):
         return jsonify({"error": "comment must be a string"}), 400
 
+    base, error = request_base_revision(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
     new_matrix = {}
 
     for entry in entries:
@@ -444,39 +817,175 @@ def api_save_game_matrix(game_id):
         key = f"{player_id}-{army_index}"
         new_matrix[key] = value
 
+    current = game.get("matrix") or {}
+    changes = {
+        f"matrix:{key}": (current.get(key), new_matrix.get(key))
+        for key in set(current) | set(new_matrix)
+    }
+    changes["comment"] = (game.get("comment", ""), comment.strip())
+    conflicts = revision_conflicts(game, base, changes)
+    if conflicts:
+        return conflict_response(game, conflicts)
+
+    rev, cell_revisions = revision_edit(game, changes)
     game["matrix"] = new_matrix
     game["comment"] = comment.strip()
-    save_games(games)
+    game["revision"] = rev
+    game.setdefault("cell_revisions", {}).update(cell_revisions)
+    save_game(game)
 
-    return jsonify({"status": "ok", "matrix": new_matrix})
+    event = {"type": "matrix", "cells": changed_items(changes, "matrix:"), "revision": rev}
+    if changes["comment"][0] != changes["comment"][1]:
+        event["comment"] = game["comment"]
+    publish_game_event(game_id, event)
 
+    return jsonify({"status": "ok", "matrix": new_matrix, "revision": rev})
 
 
-@app.route("/games/<int:game_id>/fight")
+
+@app.route("/api/games/<int:game_id>/matrix", methods=["PATCH"])
 @login_required
-def game_fight_page(game_id):
-    return render_template("game_fight.html", game_id=game_id)
+@transactional
+def api_patch_game_matrix(game_id):
+    """
+    Change only some cells: {"cells": [{player_id, army_index, value}], "comment"?}.
+    value null clears a cell. Stored as a small journal record, not a full rewrite.
+    """
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
 
+    roster = game.get("roster", [])
+    roster_ids = {p.get("player_id") for p in roster if isinstance(p, dict)}
+    if not roster_locked(game) or len(roster_ids) != team_size(game):
+        return jsonify({"error": "Roster not locked yet for this game"}), 400
 
+    payload = request.get_json(silent=True) or {}
+    cells = payload.get("cells", [])
+    if not isinstance(cells, list):
+        return jsonify({"error": "cells must be a list"}), 400
+    base, error = request_base_revision(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    changes = {}
+    for cell in cells:
+        if not isinstance(cell, dict):
+            return jsonify({"error": "Invalid cell entry"}), 400
+        player_id = cell.get("player_id")
+        army_index = cell.get("army_index")
+        value = cell.get("value")
 
-@app.route("/api/games/<int:game_id>/pairings", methods=["POST"])
+        if player_id not in roster_ids:
+            return jsonify({"error": f"player_id {player_id} is not in this game's roster"}), 400
+        if not isinstance(player_id, int) or not isinstance(army_index, int):
+            return jsonify({"error": "player_id and army_index must be integers"}), 400
+        if value is not None and value not in ALLOWED_MATRIX_STATES:
+            return jsonify({"error": f"Invalid state {value}"}), 400
+
+        changes[f"{player_id}-{army_index}"] = value
+
+    current = game.get("matrix") or {}
+    diff = {f"matrix:{key}": (current.get(key), value) for key, value in changes.items()}
+    edit = {"set": {}, "merge": {"matrix": changes}}
+    if "comment" in payload:
+        comment = payload.get("comment") or ""
+        if not isinstance(comment, str):
+            return jsonify({"error": "comment must be a string"}), 400
+        diff["comment"] = (game.get("comment", ""), comment.strip())
+        edit["set"]["comment"] = comment.strip()
+
+    conflicts = revision_conflicts(game, base, diff)
+    if conflicts:
+        return conflict_response(game, conflicts)
+
+    rev, cell_revisions = revision_edit(game, diff)
+    edit["set"]["revision"] = rev
+    edit["merge"]["cell_revisions"] = cell_revisions
+    patch_game(game, edit)
+
+    event = {"type": "matrix", "cells": changed_items(diff, "matrix:"), "revision": rev}
+    if "comment" in cell_revisions:
+        event["comment"] = game["comment"]
+    publish_game_event(game_id, event)
+
+    # Merged matrix: includes the other editors' cells too
+    return jsonify({"status": "ok", "cells": changes, "matrix": game["matrix"], "revision": rev})
+
+
+@app.route("/api/games/<int:game_id>/matrix/suggestions", methods=["GET"])
 @login_required
-def api_save_game_pairings(game_id):
-    games = load_games()
-    game = next((g for g in games if g.get("id") == game_id), None)
+def api_matrix_suggestions(game_id):
+    """
+    Suggested state for every cell, from the roster players' past results
+    against each faction and their match_history (report aggregates).
+    Cells without any data are left out.
+    """
+    report = load_report()
+    etag = resource_etag(*game_etag(game_id), STORE.doc_version(REPORT_DOC))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    game = get_game(game_id)
     if not game:
         return jsonify({"error": "Game not found"}), 404
 
-    payload = request.get_json(silent=True) or {}
+    roster = game.get("roster", [])
+    roster_ids = [p.get("player_id") for p in roster if isinstance(p, dict)]
+    if not roster_locked(game) or len(set(roster_ids)) != team_size(game):
+        return jsonify({"error": "Roster not locked yet for this game"}), 400
 
-    # ⭐ NEW: global scenario
-    scenario = payload.get("scenario")
-    if scenario is not None:
-        game["scenario"] = scenario
+    # this game's own results would only echo back
+    own = report["games"].get(str(game_id), [])
+    scenario = game.get("scenario")
 
-    pairings = payload.get("pairings", [])
+    suggestions = {}
+    for army_index, army in enumerate(game.get("armies") or []):
+        faction = army.get("faction") if isinstance(army, dict) else None
+        for player_id in roster_ids:
+            suggestion = suggest_cell(report, player_id, faction, scenario, STATE_TO_SCORE, exclude=own)
+            if suggestion:
+                suggestions[f"{player_id}-{army_index}"] = suggestion
+
+    return conditional_json({"scenario": scenario, "suggestions": suggestions}, etag)
+
+
+@app.route("/games/<int:game_id>/fight")
+@login_required
+def game_fight_page(game_id):
+    return render_template("game_fight.html", game_id=game_id)
+
+
+
+def slots_by_game_no(pairings):
+    """game_no -> (player_id, army_index, layout_n, real_score), empty slots left out."""
+    out = {}
+    for p in pairings or []:
+        if isinstance(p, dict) and p.get("player_id") is not None and p.get("army_index") is not None:
+            out[p.get("game_no")] = (p.get("player_id"), p.get("army_index"), p.get("layout_n"), p.get("real_score"))
+    return out
+
+
+def publish_pairings_event(game_id, pairings, changes, rev):
+    """Live update with the slots (and scenario) that really changed."""
+    by_slot = {p.get("game_no"): p for p in pairings if isinstance(p, dict)}
+    slots = []
+    for game_no in changed_items(changes, "pairing:"):
+        game_no = int(game_no)
+        # same empty slot shape as the fight page
+        slots.append(by_slot.get(game_no) or {"game_no": game_no, "player_id": None, "army_index": None,
+                                              "layout_n": None, "real_score": None})
+    event = {"type": "pairings", "slots": slots, "revision": rev}
+    if "scenario" in changes and changes["scenario"][0] != changes["scenario"][1]:
+        event["scenario"] = changes["scenario"][1]
+    publish_game_event(game_id, event)
+
+
+def pairings_error(pairings, size):
+    """Validation message for a pairings list of a game with `size` fights, or None if it is valid."""
     if not isinstance(pairings, list):
-        return jsonify({"error": "pairings must be a list"}), 400
+        return "pairings must be a list"
 
     used_players = set()
     used_armies = set()
@@ -484,7 +993,7 @@ def api_save_game_pairings(game_id):
 
     for p in pairings:
         if not isinstance(p, dict):
-            return jsonify({"error": "Invalid pairing entry"}), 400
+            return "Invalid pairing entry"
 
         game_no = p.get("game_no")
         player_id = p.get("player_id")
@@ -495,53 +1004,217 @@ def api_save_game_pairings(game_id):
         if player_id is None or army_index is None:
             continue
 
-        if not isinstance(game_no, int) or not (1 <= game_no <= 8):
-            return jsonify({"error": "game_no must be 1..8"}), 400
+        if not isinstance(game_no, int) or not (1 <= game_no <= size):
+            return f"game_no must be 1..{size} (one fight per opponent codex)"
         if not isinstance(player_id, int) or not isinstance(army_index, int):
-            return jsonify({"error": "player_id and army_index must be int"}), 400
+            return "player_id and army_index must be int"
         if not isinstance(layout_n, int) or layout_n <= 0:
-            return jsonify({"error": "layout_n must be a positive integer"}), 400
+            return "layout_n must be a positive integer"
 
         if player_id in used_players:
-            return jsonify({"error": "A player is used more than once"}), 400
+            return "A player is used more than once"
         if army_index in used_armies:
-            return jsonify({"error": "An opponent list is used more than once"}), 400
+            return "An opponent list is used more than once"
         if layout_n in used_layouts:
-            return jsonify({"error": "A layout number is used more than once"}), 400
-        
+            return "A layout number is used more than once"
+
         real_score = p.get("real_score")
         if real_score is not None:
             if not isinstance(real_score, int) or not (0 <= real_score <= 20):
-                return jsonify({"error": "real_score must be an integer between 0 and 20"}), 400
-
+                return "real_score must be an integer between 0 and 20"
 
         used_players.add(player_id)
         used_armies.add(army_index)
         used_layouts.add(layout_n)
 
+    return None
+
+
+def scenario_error(scenario):
+    """Validation message for the scenario of a pairings save (None: left unchanged), or None if it is valid."""
+    if scenario is not None and (not isinstance(scenario, str) or scenario not in SCENARIO_PREFIX):
+        return f"scenario must be one of {', '.join(SCENARIO_PREFIX)}"
+    return None
+
+
+@app.route("/api/games/<int:game_id>/pairings", methods=["POST"])
+@login_required
+@transactional
+def api_save_game_pairings(game_id):
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    payload = request.get_json(silent=True) or {}
+    base, error = request_base_revision(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    pairings = payload.get("pairings", [])
+    error = pairings_error(pairings, team_size(game))
+    if error:
+        return jsonify({"error": error}), 400
+
+    # ⭐ NEW: global scenario
+    scenario = payload.get("scenario")
+    error = scenario_error(scenario)
+    if error:
+        return jsonify({"error": error}), 400
+
+    current = slots_by_game_no(game.get("pairings", []))
+    new = slots_by_game_no(pairings)
+    changes = {
+        f"pairing:{n}": (current.get(n), new.get(n))
+        for n in set(current) | set(new)
+    }
+
+    if scenario is not None:
+        changes["scenario"] = (game.get("scenario"), scenario)
+
+    conflicts = revision_conflicts(game, base, changes)
+    if conflicts:
+        return conflict_response(game, conflicts)
+
+    rev, cell_revisions = revision_edit(game, changes)
+    if scenario is not None:
+        game["scenario"] = scenario
     game["pairings"] = pairings
-    save_games(games)
+    game["revision"] = rev
+    game.setdefault("cell_revisions", {}).update(cell_revisions)
+    save_game(game)
+    publish_pairings_event(game_id, pairings, changes, rev)
 
     return jsonify({
         "status": "ok",
         "scenario": game.get("scenario"),
-        "pairings": pairings
+        "pairings": pairings,
+        "revision": rev
     })
 
 @app.route("/api/games/<int:game_id>/pairings", methods=["GET"])
 @login_required
 def api_get_game_pairings(game_id):
-    games = load_games()
-    game = next((g for g in games if g.get("id") == game_id), None)
+    etag = resource_etag(*game_etag(game_id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    game = get_game(game_id)
     if not game:
         return jsonify({"error": "Game not found"}), 404
 
-    return jsonify({
+    return conditional_json({
         "scenario": game.get("scenario"),
-        "pairings": game.get("pairings", [])
+        "pairings": game.get("pairings", []),
+        "revision": game.get("revision", 0)
+    }, etag)
+
+
+@app.route("/api/games/<int:game_id>/pairings", methods=["PATCH"])
+@login_required
+@transactional
+def api_patch_game_pairings(game_id):
+    """
+    Change only some fight slots: {"slots": [{game_no, player_id, army_index,
+    layout_n, real_score}, ...]} replaces those slots, {"game_no": n,
+    "clear": true} empties one; "scenario" (optional) is set as with POST.
+    Stored as a small journal record.
+    """
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    payload = request.get_json(silent=True) or {}
+    slots = payload.get("slots", [])
+    if not isinstance(slots, list):
+        return jsonify({"error": "slots must be a list"}), 400
+    base, error = request_base_revision(payload)
+    if error:
+        return jsonify({"error": error}), 400
+    # as with POST, a null scenario leaves it unchanged
+    scenario = payload.get("scenario")
+    error = scenario_error(scenario)
+    if error:
+        return jsonify({"error": error}), 400
+
+    size = team_size(game)
+    by_slot = {p.get("game_no"): p for p in game.get("pairings", []) if isinstance(p, dict)}
+    for slot in slots:
+        game_no = slot.get("game_no") if isinstance(slot, dict) else None
+        # clearing also works on a slot left past the team size by a change of the codex
+        if not isinstance(game_no, int) or game_no < 1 or (game_no > size and not slot.get("clear")):
+            return jsonify({"error": f"Each slot needs a game_no 1..{size} (one fight per opponent codex)"}), 400
+        if slot.get("clear"):
+            # same empty slot shape as the fight page
+            slot = {"game_no": game_no, "player_id": None, "army_index": None,
+                    "layout_n": None, "real_score": None}
+        by_slot[slot["game_no"]] = slot
+
+    pairings = [by_slot[n] for n in sorted(by_slot, key=lambda n: n if isinstance(n, int) else 0)]
+    current = slots_by_game_no(game.get("pairings", []))
+    new = slots_by_game_no(pairings)
+    changes = {f"pairing:{s['game_no']}": (current.get(s["game_no"]), new.get(s["game_no"])) for s in slots}
+    if scenario is not None:
+        changes["scenario"] = (game.get("scenario"), scenario)
+
+    conflicts = revision_conflicts(game, base, changes)
+    if conflicts:
+        return conflict_response(game, conflicts)
+
+    error = pairings_error(pairings, size)
+    if error:
+        if base is not None and game.get("revision", 0) > base:
+            # valid on the client's copy, broken by someone else's slots
+            return conflict_response(game, [], error)
+        return jsonify({"error": error}), 400
+
+    rev, cell_revisions = revision_edit(game, changes)
+    edit = {"set": {"pairings": pairings, "revision": rev}, "merge": {"cell_revisions": cell_revisions}}
+    if scenario is not None:
+        edit["set"]["scenario"] = scenario
+    patch_game(game, edit)
+    publish_pairings_event(game_id, pairings, changes, rev)
+
+    return jsonify({
+        "status": "ok",
+        "scenario": scenario if scenario is not None else game.get("scenario"),
+        "pairings": pairings,
+        "revision": rev
     })
 
 
+@app.route("/api/games/<int:game_id>/events", methods=["GET"])
+@login_required
+def api_game_events(game_id):
+    """
+    Server-Sent Events stream of the game's changes: matrix cells, pairing
+    slots, scenario. A client that missed changes (?since= or Last-Event-ID
+    older than the game) first gets a "reload" event.
+    """
+    # Subscribe before reading the revision, so no change falls in between
+    q = EVENTS.subscribe(game_id)
+    game = get_game(game_id)
+    if not game:
+        EVENTS.unsubscribe(game_id, q)
+        return jsonify({"error": "Game not found"}), 404
+
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    revision = game.get("revision", 0)
+    first = None
+    if since is not None:
+        try:
+            if int(since) < revision:
+                first = {"type": "reload", "revision": revision}
+        except ValueError:
+            first = {"type": "reload", "revision": revision}
+
+    return Response(
+        EVENTS.stream(game_id, q, first),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/layouts/<path:filename>")
 @login_required
 def serve_layout(filename):
@@ -549,6 +1222,41 @@ def serve_layout(filename):
     return send_from_directory(str(DATA_DIR), filename)
 
 
+LAYOUT_IMAGES = LayoutImages(DATA_DIR)
+
+@app.route("/layouts/derived/<name>")
+@login_required
+def serve_layout_derivative(name):
+    """Thumbnail / compressed copy of a layout (layout_images.py). Content-hashed names: cached for good."""
+    found = LAYOUT_IMAGES.path(name)
+    if found is None:
+        return jsonify({"error": "Layout image not found"}), 404
+    path, mimetype = found
+    response = send_file(path, mimetype=mimetype, conditional=True)
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+_layouts_warming = threading.Lock()
+
+@app.before_request
+def warm_layout_images():
+    # First request after startup: list the layouts (which renders their
+    # missing derivatives) in the background, before a fight page asks
+    if _layouts_warming.acquire(blocking=False):
+        threading.Thread(target=layout_manifest, name="layout-manifest", daemon=True).start()
+
+
+@app.cli.command("build-layouts")
+def build_layouts_command():
+    """Render the layout thumbnails and compressed copies ahead of the first page load."""
+    if not LAYOUT_IMAGES.enabled:
+        raise click.ClickException("Pillow is not installed: layouts are served as they are")
+    files = [l["file"] for layouts in layout_manifest()[1].values() for l in layouts]
+    written = LAYOUT_IMAGES.build(files)
+    click.echo(f"{written} derivative(s) written for {len(files)} layout(s).")
+
+
 SCENARIO_PREFIX = {
     "HAMMER_ANVIL": "HA",
     "SEEK_DESTROY": "SD",
@@ -558,6 +1266,12 @@ SCENARIO_PREFIX = {
     "SWEEPING_ENGAGEMENT": "SE"  
     }
 
+# <prefix><number>.png, e.g. HA1.png / DOW3.png
+LAYOUT_FILE_RX = {
+    scenario: re.compile(rf"^{re.escape(prefix)}(\d+)\.png$", re.IGNORECASE)
+    for scenario, prefix in SCENARIO_PREFIX.items()
+}
+
 @app.route("/api/layouts", methods=["GET"])
 @login_required
 def api_list_layouts():
@@ -569,100 +1283,404 @@ def api_list_layouts():
       }
     Only lists files that exist in data/ and match <prefix><number>.png
     """
-    out = {k: [] for k in SCENARIO_PREFIX.keys()}
+    version, layouts = layout_manifest()
+    etag = resource_etag("layouts", version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return conditional_json(layouts, etag)
+
 
+# (layout files and their stats, (version, manifest)): rebuilt only when a layout file is added, removed or changed
+_layout_manifest = (None, None)
+
+def layout_files():
+    """Sorted (name, (st_ino, st_mtime_ns, st_size)) of the layout images in data/."""
     try:
         files = os.listdir(DATA_DIR)
     except FileNotFoundError:
         files = []
+    out = []
+    for fn in files:
+        if not any(rx.match(fn) for rx in LAYOUT_FILE_RX.values()):
+            continue
+        try:
+            st = (DATA_DIR / fn).stat()
+        except FileNotFoundError:
+            continue
+        out.append((fn, (st.st_ino, st.st_mtime_ns, st.st_size)))
+    return tuple(sorted(out))
 
-    for scenario, prefix in SCENARIO_PREFIX.items():
-        # match like HA1.png / DOW3.png etc.
-        rx = re.compile(rf"^{re.escape(prefix)}(\d+)\.png$", re.IGNORECASE)
-        matches = []
-        for fn in files:
-            m = rx.match(fn)
-            if m:
-                n = int(m.group(1))
-                matches.append({"n": n, "file": fn})
-        matches.sort(key=lambda x: x["n"])
-        out[scenario] = matches
+def layout_manifest():
+    """
+    (version, {scenario: scenario_layouts(...)}) for every scenario, each
+    layout with the URLs of its derivatives ("images", see layout_images.py)
+    when Pillow is there. Keyed on the layout files alone, so writes of
+    games.json and other files in data/ neither rebuild it nor start
+    another prebuild of the derivatives.
+    """
+    global _layout_manifest
+    files = layout_files()
+    cached_files, cached = _layout_manifest
+    if cached is None or cached_files != files:
+        names = [fn for fn, _ in files]
+        manifest = {scenario: scenario_layouts(scenario, names) for scenario in SCENARIO_PREFIX}
+        for layouts in manifest.values():
+            for layout in layouts:
+                images = LAYOUT_IMAGES.urls(layout["file"], "/layouts/derived")
+                if images:
+                    layout["images"] = images
+        cached = (resource_etag(manifest), manifest)
+        _layout_manifest = (files, cached)
+        LAYOUT_IMAGES.prebuild(names)
+    return cached
+
+
+def scenario_layouts(scenario, files=None):
+    """Layouts of a scenario found in data/: [{"n": 1, "file": "HA1.png"}, ...]"""
+    rx = LAYOUT_FILE_RX.get(scenario)
+    if rx is None:
+        return []
+    if files is None:
+        try:
+            files = os.listdir(DATA_DIR)
+        except FileNotFoundError:
+            files = []
+
+    matches = []
+    for fn in files:
+        m = rx.match(fn)
+        if m:
+            n = int(m.group(1))
+            matches.append({"n": n, "file": fn})
+    matches.sort(key=lambda x: x["n"])
+    return matches
+
+
+@app.route("/api/games/<int:game_id>/layout_modifiers", methods=["GET"])
+@login_required
+def api_get_layout_modifiers(game_id):
+    etag = resource_etag(*game_etag(game_id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    return jsonify(out)
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
 
+    # scenario -> {"playerId-armyIndex-layoutN": bonus}
+    return conditional_json(game.get("layout_modifiers", {}), etag)
 
 
-@app.route("/api/games/<int:game_id>/optimize", methods=["GET"])
-def api_optimize_pairing(game_id):
-    games = load_games()
-    game = next((g for g in games if g.get("id") == game_id), None)
+@app.route("/api/games/<int:game_id>/layout_modifiers", methods=["POST"])
+@login_required
+@transactional
+def api_save_layout_modifiers(game_id):
+    """
+    Replace the modifiers of one scenario. Each entry adds `value` expected
+    points to a (player, army) matchup when it is played on layout layout_n.
+    With a base revision (If-Match or base_revision), modifiers someone else
+    changed since are a 409, like matrix cells.
+    """
+    game = get_game(game_id)
     if not game:
         return jsonify({"error": "Game not found"}), 404
 
-    # Only active players (same logic as your matrix API)
-    all_players = load_players()
-    roster_ids = game.get("player_ids") or []
-
-    by_id = {p.get("id"): p for p in all_players if isinstance(p, dict)}
-    players = [by_id.get(pid) for pid in roster_ids]
+    payload = request.get_json(silent=True) or {}
+    base, error = request_base_revision(payload)
+    if error:
+        return jsonify({"error": error}), 400
+    scenario = payload.get("scenario")
+    entries = payload.get("entries", [])
+    if scenario not in SCENARIO_PREFIX:
+        return jsonify({"error": f"scenario must be one of {', '.join(SCENARIO_PREFIX)}"}), 400
+    if not isinstance(entries, list):
+        return jsonify({"error": "entries must be a list"}), 400
+
+    roster_ids = set(game.get("player_ids") or [])
+    n_armies = len(game.get("armies", []))
+
+    modifiers = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            return jsonify({"error": "Invalid modifier entry"}), 400
+        player_id = entry.get("player_id")
+        army_index = entry.get("army_index")
+        layout_n = entry.get("layout_n")
+        value = entry.get("value")
+
+        if player_id not in roster_ids:
+            return jsonify({"error": f"player_id {player_id} is not in this game's roster"}), 400
+        if not isinstance(army_index, int) or not (0 <= army_index < n_armies):
+            return jsonify({"error": f"army_index must be 0..{n_armies - 1}"}), 400
+        if not isinstance(layout_n, int) or layout_n <= 0:
+            return jsonify({"error": "layout_n must be a positive integer"}), 400
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not (-20 <= value <= 20):
+            return jsonify({"error": "value must be a number between -20 and 20"}), 400
+
+        modifiers[f"{player_id}-{army_index}-{layout_n}"] = value
+
+    current = (game.get("layout_modifiers") or {}).get(scenario) or {}
+    prefix = f"layout_modifier:{scenario}:"
+    changes = {
+        f"{prefix}{key}": (current.get(key), modifiers.get(key))
+        for key in set(current) | set(modifiers)
+    }
+    conflicts = revision_conflicts(game, base, changes)
+    if conflicts:
+        return conflict_response(game, conflicts)
+
+    rev, cell_revisions = revision_edit(game, changes)
+    game.setdefault("layout_modifiers", {})[scenario] = modifiers
+    game["revision"] = rev
+    game.setdefault("cell_revisions", {}).update(cell_revisions)
+    save_game(game)
+    publish_game_event(game_id, {
+        "type": "layout_modifiers",
+        "scenario": scenario,
+        "modifiers": changed_items(changes, prefix),
+        "revision": rev,
+    })
+
+    return jsonify({"status": "ok", "scenario": scenario, "modifiers": modifiers, "revision": rev})
+
+
+
+def optimizer_inputs(game, all_players=None, tables=FIXED_SCORES):
+    """
+    Roster players, opponent armies, matrix and score table for the optimizers.
+    Pass all_players to reuse an already loaded players file, tables for
+    other expected scores than the fixed STATE_TO_SCORE (see score_table).
+    Returns (inputs, None) or (None, error response).
+    """
+    # Only active players (same logic as your matrix API)
+    if all_players is None:
+        all_players = load_players()
+    roster_ids = game.get("player_ids") or []
+
+    by_id = {p.get("id"): p for p in all_players if isinstance(p, dict)}
+    players = [by_id.get(pid) for pid in roster_ids]
     players = [p for p in players if p is not None]
 
     armies = game.get("armies", [])
     matrix = game.get("matrix", {})  # key "playerId-armyIndex" -> state
 
-    # Need exactly 8 and 8 for pairing optimization
-    if len(players) != 8:
-        return jsonify({"error": f"Need exactly 8 active players (found {len(players)})"}), 400
-    if len(armies) != 8:
-        return jsonify({"error": f"Need exactly 8 opponent codex (found {len(armies)})"}), 400
+    # Square problem: one codex per player, whatever the team size
+    n = len(players)
+    if n == 0:
+        return None, (jsonify({"error": "No roster players found for this game"}), 400)
+    if len(armies) != n:
+        error = f"Need as many opponent codex as players (found {n} players, {len(armies)} codex)"
+        return None, (jsonify({"error": error}), 400)
 
     # Build score table score[i][j]
     score = []
     missing = []
     for i, p in enumerate(players):
         row = []
-        for j in range(8):
+        for j in range(n):
             key = f"{p['id']}-{j}"
             state = matrix.get(key)
-            val = STATE_TO_SCORE.get(state)
+            val = tables.score(p["id"], state)
             if val is None:
                 missing.append({"player_id": p["id"], "army_index": j})
-                val = -9999.0  # hard-penalize missing cells
             row.append(val)
         score.append(row)
 
     if missing:
-        return jsonify({
+        return None, (jsonify({
             "error": "Matrix incomplete: some cells are not filled",
             "missing": missing
-        }), 400
+        }), 400)
+
+    return {"players": players, "armies": armies, "matrix": matrix, "score": score, "tables": tables}, None
+
+
+def pack_pairing(inputs, i, a_idx):
+    p = inputs["players"][i]
+    a = inputs["armies"][a_idx]
+    state = inputs["matrix"].get(f"{p['id']}-{a_idx}")
+    return {
+        "player_id": p["id"],
+        "player_name": p.get("name"),
+        "army_index": a_idx,
+        "faction": a.get("faction"),
+        "state": state,
+        "expected": inputs["tables"].score(p["id"], state) or 0.0,
+    }
 
-    # brute force best assignments
-    best = []
-    for perm in itertools.permutations(range(8)):  # perm[i] = army assigned to player i
-        total = 0.0
-        for i in range(8):
-            total += score[i][perm[i]]
-        best.append((total, perm))
 
-    best.sort(key=lambda x: x[0], reverse=True)
-    top = best[:5]  # top 5 solutions
+def pack_pairing_game(inputs, rounds, first_game_no=1):
+    """Turn PairingGame.plan() indexes into player / army payloads, numbering the games."""
+    players = inputs["players"]
+    armies = inputs["armies"]
+
+    def player_ref(i):
+        return {"player_id": players[i]["id"], "player_name": players[i].get("name")}
+
+    def army_ref(j):
+        return {"army_index": j, "faction": armies[j].get("faction")}
+
+    phases = []
+    game_no = first_game_no
+    total = 0.0
+    for r in rounds:
+        games = []
+        for i, j in r["games"]:
+            g = pack_pairing(inputs, i, j)
+            g["game_no"] = game_no
+            game_no += 1
+            total += inputs["score"][i][j]
+            games.append(g)
+        phase = {"phase": r["phase"], "value": round(r["value"], 1), "games": games}
+        if "our_defender" in r:
+            phase.update({
+                "our_defender": player_ref(r["our_defender"]),
+                "their_defender": army_ref(r["their_defender"]),
+                "our_attackers": [player_ref(i) for i in r["our_attackers"]],
+                "their_attackers": [army_ref(j) for j in r["their_attackers"]],
+                "our_pick": army_ref(r["our_pick"]),
+                "their_pick": player_ref(r["their_pick"]),
+            })
+        phases.append(phase)
 
-    def pack_solution(total, perm):
+    return {
+        "mode": "pairing_game",
+        "total_expected": round(total, 1),
+        "phases": phases,
+    }
+
+
+def team_odds(n, tables=FIXED_SCORES):
+    """TeamOdds for n games, with the 8-game result thresholds scaled to n."""
+    return TeamOdds(tables.distributions(), TEAM_LOSS_BELOW * n / 8, TEAM_WIN_ABOVE * n / 8)
+
+
+def rank_by_win_probability(inputs, k, candidates):
+    """
+    Exact P(win)/P(draw)/P(loss) for the best `candidates` pairings by
+    expected total, then the k most likely to win. The candidate pool comes
+    from the Murty ranking, so a pairing far below the expected optimum is
+    never considered.
+    """
+    n = len(inputs["players"])
+    matrix = inputs["matrix"]
+    tables = inputs["tables"]
+    odds = team_odds(n, tables)
+
+    ranked = []
+    with metrics.span("optimize"):
+        for total, perm in k_best_assignments(inputs["score"], candidates):
+            states = []
+            for i in range(n):
+                pid = inputs["players"][i]["id"]
+                states.append(tables.key(pid, matrix.get(f"{pid}-{perm[i]}")))
+            p_win, p_draw, p_loss = odds.odds(states)
+            ranked.append((p_win, p_draw, total, perm, p_loss))
+    ranked.sort(key=lambda r: (-r[0], -r[1], -r[2]))
+
+    solutions = []
+    for p_win, p_draw, total, perm, p_loss in ranked[:k]:
+        solutions.append({
+            "total_expected": round(total, 1),
+            "p_win": round(p_win, 4),
+            "p_draw": round(p_draw, 4),
+            "p_loss": round(p_loss, 4),
+            "pairings": [pack_pairing(inputs, i, perm[i]) for i in range(n)],
+        })
+    return {"mode": "win_probability", "candidates": len(ranked), "solutions": solutions}
+
+
+def optimize_with_layouts(inputs, game, scenario, k):
+    """k best pairings with a distinct layout per game, layout modifiers included."""
+    n = len(inputs["players"])
+    modifiers = (game.get("layout_modifiers") or {}).get(scenario, {})
+
+    # Layouts on disk for the scenario, plus any the modifiers mention
+    layout_ns = {l["n"] for l in layout_manifest()[1].get(scenario, [])}
+    for key in modifiers:
+        layout_ns.add(int(key.rsplit("-", 1)[1]))
+    # Without enough known layouts, plain numbers fill the gaps
+    extra = 1
+    while len(layout_ns) < n:
+        layout_ns.add(extra)
+        extra += 1
+    layout_ns = sorted(layout_ns)
+    layout_index = {l: idx for idx, l in enumerate(layout_ns)}
+    row_of = {p["id"]: i for i, p in enumerate(inputs["players"])}
+
+    mods = {}
+    for key, bonus in modifiers.items():
+        player_id, army_index, layout_n = (int(x) for x in key.split("-"))
+        if player_id in row_of and army_index < n:
+            mods[(row_of[player_id], army_index, layout_index[layout_n])] = bonus
+
+    with metrics.span("optimize"):
+        solutions, exact = k_best_layout_assignments(inputs["score"], mods, len(layout_ns), k)
+
+    def pack_solution(total, cols, layouts):
         pairings = []
-        for i in range(8):
-            p = players[i]
-            a_idx = perm[i]
-            a = armies[a_idx]
-            state = matrix.get(f"{p['id']}-{a_idx}")
-            pairings.append({
-                "player_id": p["id"],
-                "player_name": p.get("name"),
-                "army_index": a_idx,
-                "faction": a.get("faction"),
-                "state": state,
-                "expected": STATE_TO_SCORE.get(state, 0.0),
-            })
+        for i in range(n):
+            p = pack_pairing(inputs, i, cols[i])
+            p["layout_n"] = layout_ns[layouts[i]]
+            p["layout_modifier"] = mods.get((i, cols[i], layouts[i]), 0)
+            pairings.append(p)
+        return {"total_expected": round(total, 1), "pairings": pairings}
+
+    return {
+        "mode": "layout_aware",
+        "scenario": scenario,
+        "exact": exact,
+        "solutions": [pack_solution(*s) for s in solutions],
+    }
+
+
+@app.route("/api/games/<int:game_id>/optimize", methods=["GET"])
+def api_optimize_pairing(game_id):
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    mode = request.args.get("mode", "ideal_assignment")
+    if mode not in {"ideal_assignment", "pairing_game", "win_probability", "layout_aware"}:
+        return jsonify({"error": "mode must be ideal_assignment, pairing_game, win_probability or layout_aware"}), 400
+
+    k = request.args.get("k", default=5, type=int)
+    if k is None or not (1 <= k <= 50):
+        return jsonify({"error": "k must be an integer between 1 and 50"}), 400
+
+    tables, error = score_table(request.args.get("scores"))
+    if error:
+        return error
+    inputs, error = optimizer_inputs(game, tables=tables)
+    if error:
+        return error
+    n = len(inputs["players"])
+
+    if mode == "pairing_game":
+        with metrics.span("optimize"):
+            rounds = pairing_game(inputs["score"]).plan()
+        return jsonify(pack_pairing_game(inputs, rounds))
+
+    if mode == "win_probability":
+        candidates = request.args.get("candidates", default=200, type=int)
+        if candidates is None or not (k <= candidates <= 1000):
+            return jsonify({"error": "candidates must be an integer between k and 1000"}), 400
+        return jsonify(rank_by_win_probability(inputs, k, candidates))
+
+    if mode == "layout_aware":
+        scenario = request.args.get("scenario") or game.get("scenario")
+        if scenario not in SCENARIO_PREFIX:
+            return jsonify({"error": "Pick a scenario first"}), 400
+        return jsonify(optimize_with_layouts(inputs, game, scenario, k))
+
+    # Hungarian for the optimum, Murty ranking for the next k-1
+    with metrics.span("optimize"):
+        top = k_best_assignments(inputs["score"], k)
+
+    def pack_solution(total, perm):
+        pairings = [pack_pairing(inputs, i, perm[i]) for i in range(n)]
         return {"total_expected": round(total, 1), "pairings": pairings}
 
     return jsonify({
@@ -670,24 +1688,497 @@ def api_optimize_pairing(game_id):
         "solutions": [pack_solution(t, perm) for (t, perm) in top]
     })
 
+
+@app.route("/api/games/optimize/batch", methods=["POST"])
+@login_required
+def api_optimize_batch():
+    """
+    Best pairing for several games in one call, e.g. every possible opponent
+    of an event. game_ids is a list of ids or "all" (every game whose matrix
+    is complete). Games and players are loaded once, solves run on the
+    worker pool.
+    """
+    payload = request.get_json(silent=True) or {}
+    game_ids = payload.get("game_ids", "all")
+    mode = payload.get("mode", "ideal_assignment")
+    k = payload.get("k", 1)
+
+    if mode not in {"ideal_assignment", "pairing_game"}:
+        return jsonify({"error": "mode must be ideal_assignment or pairing_game"}), 400
+    if not isinstance(k, int) or not (1 <= k <= 50):
+        return jsonify({"error": "k must be an integer between 1 and 50"}), 400
+    tables, error = score_table(payload.get("scores"))
+    if error:
+        return error
+
+    games = load_games()
+    if game_ids == "all":
+        selected = games
+    elif isinstance(game_ids, list) and all(isinstance(x, int) for x in game_ids):
+        by_id = {g.get("id"): g for g in games}
+        unknown = [gid for gid in game_ids if gid not in by_id]
+        if unknown:
+            return jsonify({"error": f"Unknown game ids: {unknown}"}), 404
+        selected = [by_id[gid] for gid in game_ids]
+    else:
+        return jsonify({"error": "game_ids must be a list of ids or \"all\""}), 400
+
+    all_players = load_players()
+    ready = []
+    skipped = []
+    for game in selected:
+        inputs, error = optimizer_inputs(game, all_players, tables)
+        if error:
+            # "all" quietly leaves out games that are not ready yet
+            if game_ids != "all":
+                skipped.append({"game_id": game.get("id"), "error": error[0].get_json()["error"]})
+            continue
+        ready.append((game, inputs))
+
+    with metrics.span("optimize"):
+        if len(ready) > 1:
+            pool = process_pool()
+            if mode == "pairing_game":
+                futures = [pool.submit(plan_pairing_game, inputs["score"]) for _, inputs in ready]
+            else:
+                futures = [pool.submit(k_best_assignments, inputs["score"], k) for _, inputs in ready]
+            results = []
+            try:
+                for f in futures:
+                    results.append(f.result())
+                    report_progress(len(results), len(futures))
+            except BaseException:
+                # a cancelled job drops the games not started yet
+                for f in futures:
+                    f.cancel()
+                raise
+        elif mode == "pairing_game":
+            results = [plan_pairing_game(inputs["score"]) for _, inputs in ready]
+        else:
+            results = [k_best_assignments(inputs["score"], k) for _, inputs in ready]
+
+    rows = []
+    for (game, inputs), result in zip(ready, results):
+        row = {"game_id": game.get("id"), "opponent_name": game.get("opponent_name")}
+        if mode == "pairing_game":
+            plan = pack_pairing_game(inputs, result)
+            row["total_expected"] = plan["total_expected"]
+            row["phases"] = plan["phases"]
+        else:
+            n = len(inputs["players"])
+            row["total_expected"] = round(result[0][0], 1)
+            row["solutions"] = [
+                {
+                    "total_expected": round(total, 1),
+                    "pairings": [pack_pairing(inputs, i, perm[i]) for i in range(n)],
+                }
+                for total, perm in result
+            ]
+        rows.append(row)
+
+    # Hardest opponent first
+    rows.sort(key=lambda r: r["total_expected"])
+
+    return jsonify({"mode": mode, "games": rows, "skipped": skipped})
+
+
+# Ordered from worst to best, for "one state better / worse" shifts.
+# UNKNOWN and GAMBLE (10 pts) sit between S_LOOSE and S_WIN.
+STATE_SCALE = ["HELP", "LOOSE", "S_LOOSE", "S_WIN", "WIN", "EASY"]
+
+
+def shifted_state(state, steps):
+    """The state `steps` positions up (>0) or down (<0) the scale, or None past the ends."""
+    if state in STATE_SCALE:
+        pos = STATE_SCALE.index(state) + steps
+    elif steps > 0:
+        pos = STATE_SCALE.index("S_WIN") + steps - 1
+    else:
+        pos = STATE_SCALE.index("S_LOOSE") + steps + 1
+    if 0 <= pos < len(STATE_SCALE):
+        return STATE_SCALE[pos]
+    return None
+
+
+@app.route("/api/games/<int:game_id>/sensitivity", methods=["GET"])
+@login_required
+def api_pairing_sensitivity(game_id):
+    """
+    For every matrix cell: how far its expected score can move before the
+    best pairing changes (margin), and what one or two states up or down
+    would do to the best pairing and its total.
+    """
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    tables, error = score_table(request.args.get("scores"))
+    if error:
+        return error
+    inputs, error = optimizer_inputs(game, tables=tables)
+    if error:
+        return error
+    n = len(inputs["players"])
+    score = inputs["score"]
+
+    with metrics.span("optimize"):
+        total, cols, alt = assignment_alternatives(score)
+
+    cells = []
+    for i, p in enumerate(inputs["players"]):
+        for j in range(n):
+            cell = pack_pairing(inputs, i, j)
+            in_best = cols[i] == j
+            other = alt[i][j]
+            cell["in_best"] = in_best
+            # In the best pairing: how far the cell can drop before it changes.
+            # Outside: how far it must rise. None: no alternative exists.
+            cell["margin"] = None if other is None else round(total - other, 2)
+
+            shifts = []
+            for steps in (-2, -1, 1, 2):
+                state = shifted_state(cell["state"], steps)
+                if state is None:
+                    continue
+                delta = inputs["tables"].score(p["id"], state) - score[i][j]
+                if in_best:
+                    changes = other is not None and total + delta < other
+                    new_total = max(total + delta, other) if other is not None else total + delta
+                else:
+                    changes = other is not None and other + delta > total
+                    new_total = max(total, other + delta) if other is not None else total
+                shifts.append({
+                    "steps": steps,
+                    "state": state,
+                    "delta": round(delta, 1),
+                    "changes_pairing": changes,
+                    "total_expected": round(new_total, 1),
+                })
+            cell["shifts"] = shifts
+            cells.append(cell)
+
+    # Most fragile first: the cells closest to flipping the recommendation
+    cells.sort(key=lambda c: (c["margin"] is None, c["margin"] if c["margin"] is not None else 0))
+
+    return jsonify({
+        "total_expected": round(total, 1),
+        "pairings": [pack_pairing(inputs, i, cols[i]) for i in range(n)],
+        "cells": cells,
+    })
+
+
+@app.route("/api/games/<int:game_id>/optimize/live", methods=["POST"])
+@login_required
+def api_optimize_live(game_id):
+    """
+    Best completions of the fight page's current state: the locked pairings
+    stay, only the remaining players / codex are solved.
+    """
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    payload = request.get_json(silent=True) or {}
+    pairings = payload.get("pairings", [])
+    k = payload.get("k", 3)
+    if not isinstance(pairings, list):
+        return jsonify({"error": "pairings must be a list"}), 400
+    if not isinstance(k, int) or not (1 <= k <= 50):
+        return jsonify({"error": "k must be an integer between 1 and 50"}), 400
+    tables, error = score_table(payload.get("scores"))
+    if error:
+        return error
+
+    inputs, error = optimizer_inputs(game, tables=tables)
+    if error:
+        return error
+    n = len(inputs["players"])
+    row_of = {p["id"]: i for i, p in enumerate(inputs["players"])}
+
+    locked = []
+    locked_games = []
+    used_rows = set()
+    used_cols = set()
+    for p in pairings:
+        if not isinstance(p, dict):
+            return jsonify({"error": "Invalid pairing entry"}), 400
+        player_id = p.get("player_id")
+        army_index = p.get("army_index")
+
+        # allow empty slots
+        if player_id is None or army_index is None:
+            continue
+
+        if player_id not in row_of:
+            return jsonify({"error": f"player_id {player_id} is not in this game's roster"}), 400
+        if not isinstance(army_index, int) or not (0 <= army_index < n):
+            return jsonify({"error": f"army_index must be 0..{n - 1}"}), 400
+        i = row_of[player_id]
+        if i in used_rows:
+            return jsonify({"error": "A player is used more than once"}), 400
+        if army_index in used_cols:
+            return jsonify({"error": "An opponent list is used more than once"}), 400
+        used_rows.add(i)
+        used_cols.add(army_index)
+        locked.append((i, army_index))
+        locked_games.append(p.get("game_no"))
+
+    score = inputs["score"]
+    with metrics.span("optimize"):
+        top = k_best_completions(score, locked, k)
+    locked_rows = {i for i, _ in locked}
+
+    def pack_solution(total, perm):
+        remaining = [pack_pairing(inputs, i, perm[i]) for i in range(n) if i not in locked_rows]
+        return {
+            "total_expected": round(total, 1),
+            "remaining_expected": round(sum(p["expected"] for p in remaining), 1),
+            "pairings": remaining,
+        }
+
+    out = {
+        "mode": "live",
+        "locked_expected": round(sum((score[i][j] for i, j in locked), 0.0), 1),
+        "solutions": [pack_solution(t, perm) for (t, perm) in top],
+        "plan": None,
+    }
+
+    # When whole rounds are locked (games 1..2r), resume the pairing game from there
+    r = len(locked) // 2
+    if len(locked) % 2 == 0 and len(locked) < n and sorted(locked_games) == list(range(1, 2 * r + 1)):
+        full = (1 << n) - 1
+        pmask = full & ~sum(1 << i for i, _ in locked)
+        amask = full & ~sum(1 << j for _, j in locked)
+        with metrics.span("optimize"):
+            rounds = pairing_game(score).plan(pmask, amask, first_round=r)
+        out["plan"] = pack_pairing_game(inputs, rounds, first_game_no=2 * r + 1)["phases"]
+
+    return jsonify(out)
+
+
+@app.route("/api/games/<int:game_id>/roster/optimize", methods=["POST"])
+@login_required
+def api_optimize_roster(game_id):
+    """
+    Rank rosters from a pool of candidates (more players than opposing codex),
+    by the optimal assignment value of each roster.
+    Matrix rows come from the game's matrix, overridden by payload entries.
+    """
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    armies = game.get("armies", [])
+    size = len(armies)
+    if size == 0:
+        return jsonify({"error": "This game has no opponent codex"}), 400
+
+    payload = request.get_json(silent=True) or {}
+    entries = payload.get("entries", [])
+    k = payload.get("k", 5)
+    if not isinstance(entries, list):
+        return jsonify({"error": "entries must be a list"}), 400
+    if not isinstance(k, int) or not (1 <= k <= 50):
+        return jsonify({"error": "k must be an integer between 1 and 50"}), 400
+    tables, error = score_table(payload.get("scores"))
+    if error:
+        return error
+
+    players = load_players()
+    by_id = {p.get("id"): p for p in players if isinstance(p, dict) and isinstance(p.get("id"), int)}
+
+    player_ids = payload.get("player_ids")
+    if player_ids is None:
+        player_ids = list(by_id.keys())
+    if not isinstance(player_ids, list) or not all(isinstance(x, int) for x in player_ids):
+        return jsonify({"error": "Invalid player_ids"}), 400
+    if len(set(player_ids)) != len(player_ids):
+        return jsonify({"error": "Invalid player_ids"}), 400
+    unknown = [pid for pid in player_ids if pid not in by_id]
+    if unknown:
+        return jsonify({"error": f"Unknown player ids: {unknown}"}), 400
+    if len(player_ids) < size:
+        return jsonify({"error": f"Need at least {size} candidate players (found {len(player_ids)})"}), 400
+
+    matrix = dict(game.get("matrix") or {})
+    for entry in entries:
+        player_id = entry.get("player_id")
+        army_index = entry.get("army_index")
+        value = entry.get("value")
+        if player_id not in player_ids:
+            return jsonify({"error": f"player_id {player_id} is not a candidate"}), 400
+        if not isinstance(army_index, int) or not (0 <= army_index < size):
+            return jsonify({"error": f"army_index must be 0..{size - 1}"}), 400
+        if value not in ALLOWED_MATRIX_STATES:
+            return jsonify({"error": f"Invalid state {value}"}), 400
+        matrix[f"{player_id}-{army_index}"] = value
+
+    candidates = [by_id[pid] for pid in player_ids]
+    score = []
+    missing = []
+    for p in candidates:
+        row = []
+        for j in range(size):
+            val = tables.score(p["id"], matrix.get(f"{p['id']}-{j}"))
+            if val is None:
+                missing.append({"player_id": p["id"], "army_index": j})
+            row.append(val)
+        score.append(row)
+
+    if missing:
+        return jsonify({
+            "error": "Matrix incomplete: some cells are not filled",
+            "missing": missing
+        }), 400
+
+    inputs = {"players": candidates, "armies": armies, "matrix": matrix, "score": score, "tables": tables}
+
+    def pack_roster(total, picked):
+        pairings = [pack_pairing(inputs, picked[j], j) for j in range(size)]
+        return {
+            "total_expected": round(total, 1),
+            "player_ids": [candidates[i]["id"] for i in picked],
+            "pairings": pairings,
+        }
+
+    with metrics.span("optimize"):
+        rosters = k_best_rosters(score, k)
+    return jsonify({
+        "mode": "roster_selection",
+        "solutions": [pack_roster(t, picked) for (t, picked) in rosters]
+    })
+
+
+SIMULATION_MAX_ROUNDS = 1_000_000
+
+
+def run_simulation(inputs, strategies, rounds, workers=None, seed=None):
+    """Monte Carlo rounds per opponent strategy, with pairings packed for the UI."""
+    n = len(inputs["players"])
+    tables = inputs["tables"]
+    states = [
+        [tables.key(p["id"], inputs["matrix"].get(f"{p['id']}-{j}")) for j in range(n)]
+        for p in inputs["players"]
+    ]
+    with metrics.span("simulate"):
+        results = simulate(
+            inputs["score"], states, tables.distributions(), strategies, rounds,
+            TEAM_LOSS_BELOW * n / 8, TEAM_WIN_ABOVE * n / 8,
+            workers=workers, seed=seed, progress=report_progress,
+        )
+
+    out = {}
+    for strategy, r in results.items():
+        out[strategy] = {
+            "rounds": r["rounds"],
+            "mean": round(r["mean"], 2),
+            "sd": round(r["sd"], 2),
+            "p_win": round(r["p_win"], 4),
+            "p_draw": round(r["p_draw"], 4),
+            "p_loss": round(r["p_loss"], 4),
+            "percentiles": r["percentiles"],
+            "histogram": r["histogram"],
+            "pairings": [
+                {
+                    "share": round(count / r["rounds"], 4),
+                    "pairings": [pack_pairing(inputs, i, j) for i, j in games],
+                }
+                for games, count in r["pairings"]
+            ],
+        }
+    return {"mode": "simulation", "strategies": out}
+
+
+@app.route("/api/games/<int:game_id>/simulate", methods=["GET"])
+@login_required
+def api_simulate(game_id):
+    """
+    Play full pairing rounds, our solver against each opponent strategy,
+    and sample the game scores from the matrix states.
+    """
+    game = get_game(game_id)
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    rounds = request.args.get("rounds", default=10000, type=int)
+    if rounds is None or not (1 <= rounds <= SIMULATION_MAX_ROUNDS):
+        return jsonify({"error": f"rounds must be an integer between 1 and {SIMULATION_MAX_ROUNDS}"}), 400
+
+    strategies = request.args.get("strategies", ",".join(OPPONENT_STRATEGIES)).split(",")
+    unknown = [s for s in strategies if s not in OPPONENT_STRATEGIES]
+    if unknown or not strategies:
+        return jsonify({"error": f"strategies must be among {', '.join(OPPONENT_STRATEGIES)}"}), 400
+
+    workers = request.args.get("workers", type=int)
+    if workers is not None and not (1 <= workers <= (os.cpu_count() or 1)):
+        return jsonify({"error": "workers must be between 1 and the number of CPUs"}), 400
+    seed = request.args.get("seed", type=int)
+
+    tables, error = score_table(request.args.get("scores"))
+    if error:
+        return error
+    inputs, error = optimizer_inputs(game, tables=tables)
+    if error:
+        return error
+
+    return jsonify(run_simulation(inputs, strategies, rounds, workers, seed))
+
+
+@app.cli.command("simulate")
+@click.argument("game_id", type=int)
+@click.option("--rounds", default=100000, show_default=True, help="Rounds per strategy.")
+@click.option("--strategy", "strategies", multiple=True, type=click.Choice(OPPONENT_STRATEGIES),
+              help="Opponent strategy (repeatable, default all).")
+@click.option("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+@click.option("--seed", type=int, default=None)
+@click.option("--scores", type=click.Choice(SCORE_TABLES), default="fixed", show_default=True,
+              help="Expected scores: fixed constants or calibrated on real scores.")
+def simulate_command(game_id, rounds, strategies, workers, seed, scores):
+    """Simulate pairing rounds for a game against opponent strategies."""
+    game = get_game(game_id)
+    if not game:
+        raise click.ClickException("Game not found")
+    with app.test_request_context():
+        tables, _ = score_table(scores)
+        inputs, error = optimizer_inputs(game, tables=tables)
+        if error:
+            raise click.ClickException(error[0].get_json()["error"])
+
+    started = time.perf_counter()
+    result = run_simulation(inputs, list(strategies or OPPONENT_STRATEGIES), rounds, workers, seed)
+    elapsed = time.perf_counter() - started
+
+    for strategy, r in result["strategies"].items():
+        click.echo(
+            f"{strategy:8} mean {r['mean']:6.1f}  sd {r['sd']:5.1f}  "
+            f"win {r['p_win']:6.1%}  draw {r['p_draw']:6.1%}  loss {r['p_loss']:6.1%}  "
+            f"p5/p50/p95 {r['percentiles'][5]}/{r['percentiles'][50]}/{r['percentiles'][95]}"
+        )
+    click.echo(f"{rounds} rounds per strategy in {elapsed:.1f}s")
+
+
 @app.route("/api/games/<int:game_id>/roster", methods=["POST"])
 @login_required
+@transactional
 def api_set_game_roster(game_id):
-    games = load_games()
-    game = next((g for g in games if g.get("id") == game_id), None)
+    game = get_game(game_id)
     if not game:
         return jsonify({"error": "Game not found"}), 404
 
     # Don’t allow changes once locked
-    if isinstance(game.get("roster"), list) and len(game["roster"]) == 8:
+    if roster_locked(game):
         return jsonify({"error": "Roster already locked for this game"}), 400
 
+    size = team_size(game)
+    if size == 0:
+        return jsonify({"error": "This game has no opponent codex"}), 400
+
     payload = request.get_json(silent=True) or {}
     player_ids = payload.get("player_ids")
 
-    if not isinstance(player_ids, list) or len(player_ids) != 8:
-        return jsonify({"error": "You must select exactly 8 players"}), 400
-    if len(set(player_ids)) != 8 or not all(isinstance(x, int) for x in player_ids):
+    if not isinstance(player_ids, list) or len(player_ids) != size:
+        return jsonify({"error": f"You must select exactly {size} players"}), 400
+    if len(set(player_ids)) != size or not all(isinstance(x, int) for x in player_ids):
         return jsonify({"error": "Invalid player_ids"}), 400
 
     players = load_players()
@@ -712,7 +2203,13 @@ def api_set_game_roster(game_id):
     game["player_ids"] = player_ids  # optional (keep for compatibility)
     game["matrix"] = {}
     game["pairings"] = []
-    save_games(games)
+    # every cell and slot changes at once
+    game["revision"] = game["reset_revision"] = game.get("revision", 0) + 1
+    game["cell_revisions"] = {}
+    save_game(game)
+    # every cell and slot was reset: the pages reload
+    publish_game_event(game_id, {"type": "reload", "reset": True, "revision": game["revision"]})
+    warm_lists_pdf(game)
 
     return jsonify({"status": "ok", "roster": roster})
 
@@ -726,113 +2223,158 @@ def report_page():
 @app.route("/api/report", methods=["GET"])
 @login_required
 def api_report():
-    games = load_games()
-    players = load_players()
-    by_id = {p.get("id"): p for p in players if isinstance(p, dict)}
-
-    # Expected score mapping (same as your JS)
-    STATE_TO_EXPECTED = {
-        "HELP": 3.0,
-        "LOOSE": 6.5,
-        "S_LOOSE": 9.0,
-        "S_WIN": 11.0,
-        "WIN": 13.5,
-        "EASY": 16.0,
-        "UNKNOWN": 10.0,
-        "GAMBLE": 10.0,
-    }
-
-    # Aggregate per player
-    stats = {}  # pid -> dict
-
-    def ensure(pid):
-        if pid not in stats:
-            p = by_id.get(pid, {})
-            stats[pid] = {
-                "player_id": pid,
-                "name": p.get("name") or f"Player {pid}",
-                "games_played": 0,
-                "sum_real": 0.0,
-                "sum_delta": 0.0,
-                "delta_count": 0,
-                "details": []  # per game detail (optional but nice)
-            }
-        return stats[pid]
-
-    # Iterate all games, all pairings with real_score
-    for g in games:
-        gid = g.get("id")
-        opp = g.get("opponent_name") or "Unknown"
-        scenario = g.get("scenario")
-        matrix = g.get("matrix") or {}
-        armies = g.get("armies") or []
-        pairings = g.get("pairings") or []
-
-        for pr in pairings:
-            pid = pr.get("player_id")
-            aidx = pr.get("army_index")
-            real = pr.get("real_score")
-
-            if not isinstance(pid, int):
-                continue
-            if not isinstance(real, (int, float)):
-                continue
-
-            row = ensure(pid)
-            row["games_played"] += 1
-            row["sum_real"] += float(real)
-
-            # expected from matrix state
-            expected = None
-            state = None
-            if isinstance(aidx, int):
-                state = matrix.get(f"{pid}-{aidx}")
-                expected = STATE_TO_EXPECTED.get(state) if state else None
-
-            if isinstance(expected, (int, float)):
-                d = float(real) - float(expected)
-                row["sum_delta"] += d
-                row["delta_count"] += 1
-            else:
-                d = None
-
-            faction = None
-            if isinstance(aidx, int) and 0 <= aidx < len(armies):
-                faction = armies[aidx].get("faction")
-
-            row["details"].append({
-                "game_id": gid,
-                "opponent": opp,
-                "game_no": pr.get("game_no"),
-                "faction": faction,
-                "scenario": scenario,
-                "real_score": real,
-                "state": state,
-                "expected": expected,
-                "delta": d,
-            })
+    """
+    Per player (and per opponent faction / scenario) results, read from the report aggregates.
+    ?scores=calibrated|calibrated_player: player avg_delta against the calibrated
+    expected scores (faction / scenario deltas stay on the fixed ones).
+    """
+    tables, error = score_table(request.args.get("scores"))
+    if error:
+        return error
+    report = load_report()
+    etag = report_etag(tables)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    by_id = {p.get("id"): p for p in load_players() if isinstance(p, dict)}
 
-    # Build final rows
     rows = []
-    for pid, r in stats.items():
-        avg_real = (r["sum_real"] / r["games_played"]) if r["games_played"] else None
-        avg_delta = (r["sum_delta"] / r["delta_count"]) if r["delta_count"] else None
-        rows.append({
-            "player_id": pid,
-            "name": r["name"],
-            "games_played": r["games_played"],
-            "avg_score": avg_real,
-            "avg_delta": avg_delta,
-            "details": r["details"],
-        })
+    for pid, totals in report["players"].items():
+        pid = int(pid)
+        p = by_id.get(pid, {})
+        row = {"player_id": pid, "name": p.get("name") or f"Player {pid}", **averages(totals)}
+        if tables is not FIXED_SCORES:
+            row["avg_delta"] = calibrated_delta(report, pid, tables)
+        rows.append(row)
 
     # Sort default: best avg_score
     rows.sort(key=lambda x: (x["avg_score"] is None, -(x["avg_score"] or 0), x["name"].lower()))
 
-    return jsonify({
+    return conditional_json({
         "players": rows,
-        "games_count": len(games)
-    })
+        "factions": {k: averages(t) for k, t in sorted(report["factions"].items())},
+        "scenarios": {k: averages(t) for k, t in sorted(report["scenarios"].items())},
+        "games_count": len(report["games"]),
+        "scores": tables.describe(),
+    }, etag)
+
+
+def report_etag(tables):
+    """ETag parts of the report views: aggregates, player names, and the calibration in use."""
+    calibration = STORE.doc_version(CALIBRATION_DOC) if tables is not FIXED_SCORES else None
+    return resource_etag(
+        "report", STORE.doc_version(REPORT_DOC), STORE.version("players"), calibration, request.path,
+        request.query_string,
+    )
+
+
+def calibrated_delta(report, player_id, tables):
+    """Average real - expected of a player's results, from the per-state score sums."""
+    delta = 0.0
+    count = 0
+    prefix = f"{player_id}|"
+    for key, stats in report["player_state_scores"].items():
+        if not key.startswith(prefix):
+            continue
+        expected = tables.score(player_id, key[len(prefix):])
+        if expected is None:
+            continue
+        delta += stats["sum"] - stats["n"] * expected
+        count += stats["n"]
+    return delta / count if count else None
+
+
+@app.route("/api/report/players/<int:player_id>", methods=["GET"])
+@login_required
+def api_report_player(player_id):
+    """One player's per-game breakdown, loaded when the report row is opened. Takes ?scores= like /api/report."""
+    tables, error = score_table(request.args.get("scores"))
+    if error:
+        return error
+    report = load_report()
+    etag = report_etag(tables)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    totals = report["players"].get(str(player_id))
+    if totals is None:
+        return jsonify({"error": "No results for this player"}), 404
+
+    player = get_player(player_id) or {}
+    details = [row for rows in report["games"].values() for row in rows if row["player_id"] == player_id]
+    details.sort(key=lambda d: (d.get("game_id") or 0, d.get("game_no") or 0))
+    averaged = averages(totals)
+    if tables is not FIXED_SCORES:
+        averaged["avg_delta"] = calibrated_delta(report, player_id, tables)
+        details = [dict(row) for row in details]
+        for row in details:
+            row["expected"] = tables.score(player_id, row["state"]) if row["state"] else None
+            row["delta"] = float(row["real_score"]) - row["expected"] if row["expected"] is not None else None
+
+    return conditional_json({
+        "player_id": player_id,
+        "name": player.get("name") or f"Player {player_id}",
+        **averaged,
+        "details": details,
+        "scores": tables.describe(),
+    }, etag)
+
+
+def rebuild_report():
+    """Rebuild the report aggregates from every game. Returns the number of games."""
+    with STORE.transaction():
+        games = load_games()
+        with metrics.span("report.build"):
+            report = build_report(games, STORE.load_players(), STATE_TO_SCORE, progress=report_progress)
+        STORE.save_doc(REPORT_DOC, report)
+        refit_calibration(report)
+    return len(games)
+
+
+@app.route("/api/report/rebuild", methods=["POST"])
+@login_required
+def api_rebuild_report():
+    """Full rebuild of the report aggregates; run it as a job (POST /api/jobs)."""
+    return jsonify({"status": "ok", "games_count": rebuild_report()})
+
+
+@app.cli.command("rebuild-report")
+def rebuild_report_command():
+    """Rebuild the report aggregates from every game (after editing the data files by hand)."""
+    click.echo(f"Report rebuilt from {rebuild_report()} game(s).")
+
+
+def pack_calibration(doc):
+    current = doc["current"]
+    return {
+        "version": current["version"],
+        "fitted_at": current["fitted_at"],
+        "states": {
+            state: {**fitted, "fixed_score": STATE_TO_SCORE[state], "fixed_spread": STATE_TO_SPREAD[state]}
+            for state, fitted in current["states"].items()
+        },
+        "players": current["players"],
+        "previous": doc.get("previous", []),
+    }
+
+
+@app.route("/api/calibration", methods=["GET"])
+@login_required
+def api_calibration():
+    """Calibrated expected score per matrix state (and per player), as fitted on the last real scores saved."""
+    return jsonify(pack_calibration(calibrate()))
+
+
+@app.cli.command("calibrate")
+def calibrate_command():
+    """Refit the calibrated score tables on the logged real scores."""
+    with STORE.transaction():
+        doc = pack_calibration(refit_calibration(load_report()))
+    click.echo(f"Calibration v{doc['version']} ({doc['fitted_at']}):")
+    for state, v in doc["states"].items():
+        click.echo(f"{state:8} {v['score']:5.1f} +- {v['spread']:4.1f}  "
+                   f"(fixed {v['fixed_score']:4.1f} +- {v['fixed_spread']:3.1f}, {v['n']} game(s))")
 
 
 @app.route("/players/<int:player_id>")
@@ -843,8 +2385,12 @@ def player_detail_page(player_id):
 @app.route("/api/players/<int:player_id>", methods=["GET"])
 @login_required
 def api_get_player(player_id):
-    players = load_players()
-    p = next((x for x in players if x.get("id") == player_id), None)
+    etag = resource_etag("player", player_id, STORE.item_version("players", player_id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    p = get_player(player_id)
     if not p:
         return jsonify({"error": "Player not found"}), 404
     # ensure fields exist
@@ -852,11 +2398,12 @@ def api_get_player(player_id):
     p.setdefault("default_index", None)
     p.setdefault("active", False)
     p.setdefault("match_history", [])
-    return jsonify(p)
+    return conditional_json(p, etag)
 
 
 @app.route("/api/players/<int:player_id>/matches", methods=["POST"])
 @login_required
+@transactional
 def api_add_player_match(player_id):
     payload = request.get_json(silent=True) or {}
 
@@ -878,8 +2425,7 @@ def api_add_player_match(player_id):
     if opponent_level < 1 or opponent_level > 5:
         return jsonify({"error": "Opponent level must be 1..5"}), 400
 
-    players = load_players()
-    p = next((x for x in players if x.get("id") == player_id), None)
+    p = get_player(player_id)
     if not p:
         return jsonify({"error": "Player not found"}), 404
 
@@ -896,16 +2442,16 @@ def api_add_player_match(player_id):
         "comment": comment
     }
     p["match_history"].append(entry)
-    save_players(players)
+    save_player(p)
 
     return jsonify({"status": "ok", "match": entry}), 201
 
 
 @app.route("/api/players/<int:player_id>/matches/<int:match_id>", methods=["DELETE"])
 @login_required
+@transactional
 def api_delete_player_match(player_id, match_id):
-    players = load_players()
-    p = next((x for x in players if x.get("id") == player_id), None)
+    p = get_player(player_id)
     if not p:
         return jsonify({"error": "Player not found"}), 404
 
@@ -915,115 +2461,255 @@ def api_delete_player_match(player_id, match_id):
         return jsonify({"error": "Match not found"}), 404
 
     p["match_history"] = new_hist
-    save_players(players)
+    save_player(p)
     return jsonify({"status": "ok"})
 
+PDF_CACHE = PdfCache(DATA_DIR / PDF_CACHE_DIR)
+
+# Most games one bulk export renders
+LISTS_EXPORT_MAX = 100
+
+def lists_pdf_source(game, all_players=None):
+    by_id = {p.get("id"): p for p in all_players or load_players() if isinstance(p, dict)}
+    return pdf_source(game, by_id)
+
+def warm_lists_pdf(game):
+    """Render a game's list PDF on the worker pool once the request succeeded, so the first click is cached."""
+    source = lists_pdf_source(game)
+    if source is None:
+        return
+    key = source_hash(source)
+
+    def store(future):
+        if future.exception() is None:
+            PDF_CACHE.put(key, future.result())
+
+    @after_this_request
+    def warm(response):
+        if response.status_code < 300 and PDF_CACHE.get(key) is None:
+            process_pool().submit(render_pdf, source).add_done_callback(store)
+        return response
+
+
 @app.route("/api/games/<int:game_id>/lists_pdf", methods=["GET"])
 @login_required
 def api_game_lists_pdf(game_id):
-    games = load_games()
-    game = next((g for g in games if g.get("id") == game_id), None)
+    """Roster army lists as a PDF, rendered only when the roster or a list text changed (list_pdf.py)."""
+    game = get_game(game_id)
     if not game:
         return jsonify({"error": "Game not found"}), 404
 
-    all_players = load_players()
-    roster_ids = game.get("player_ids") or []
-
-    # Map id -> player (global)
-    by_id = {p.get("id"): p for p in all_players if isinstance(p, dict)}
-
-    # Current roster players
-    roster_players = [by_id.get(pid) for pid in roster_ids if by_id.get(pid)]
-
-    if not roster_players:
+    source = lists_pdf_source(game)
+    if source is None:
         return jsonify({"error": "No roster defined for this game"}), 400
 
-    # Helper to get default list text (full text, not truncated)
-    def get_default_list_text(player):
-        # If at some point you store a frozen snapshot, prefer that:
-        snap_text = player.get("list_text")
-        if isinstance(snap_text, str) and snap_text.strip():
-            return snap_text.strip()
-
-        lists = player.get("lists") or []
-        idx = player.get("default_index")
-        if isinstance(idx, int) and 0 <= idx < len(lists):
-            return (lists[idx] or "").strip()
-
-        # Fallback: first list if exists
-        if lists:
-            return (lists[0] or "").strip()
-
-        return "(No list text)"
-
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    y = height - 40  # start position
-    left_margin = 40
-    line_height = 12
-
-    # Title
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(left_margin, y, f"Game #{game.get('id')} – {game.get('opponent_name') or 'Opponent'}")
-    y -= 24
-
-    for p in roster_players:
-        name = p.get("name") or f"Player {p.get('id')}"
-        list_text = get_default_list_text(p)
-
-        # Page break if needed
-        if y < 80:
-            c.showPage()
-            y = height - 40
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(left_margin, y, f"Game #{game.get('id')} – {game.get('opponent_name') or 'Opponent'}")
-            y -= 24
-
-        # Player header
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(left_margin, y, name)
-        y -= 16
-
-        # List text (monospace style)
-        c.setFont("Courier", 9)
-
-        # Simple word-wrap
-        max_chars = 95  # rough width
-        for raw_line in list_text.splitlines() or [""]:
-            line = raw_line if raw_line.strip() != "" else " "
-            while len(line) > max_chars:
-                segment = line[:max_chars]
-                c.drawString(left_margin, y, segment)
-                y -= line_height
-                line = line[max_chars:]
-                if y < 40:
-                    c.showPage()
-                    y = height - 40
-                    c.setFont("Courier", 9)
-            c.drawString(left_margin, y, line)
-            y -= line_height
-            if y < 40:
-                c.showPage()
-                y = height - 40
-                c.setFont("Courier", 9)
-
-        # Spacer between players
-        y -= 10
-
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-
     filename = f"game_{game_id}_lists.pdf"
     return send_file(
-        buffer,
+        BytesIO(PDF_CACHE.fetch(source)),
         as_attachment=True,
         download_name=filename,
         mimetype="application/pdf"
     )
 
 
+@app.route("/api/games/lists_pdf", methods=["GET"])
+@login_required
+def api_export_lists_pdf():
+    """
+    Team packs of several games: ?ids=1,2,3 (default: every game with a
+    roster) and format=zip (one PDF per game, streamed as they are ready)
+    or format=pdf (one merged PDF). Missing PDFs render in parallel on the
+    worker pool.
+    """
+    fmt = request.args.get("format", "zip")
+    if fmt not in {"zip", "pdf"}:
+        return jsonify({"error": "format must be zip or pdf"}), 400
+
+    games = load_games()
+    ids = request.args.get("ids")
+    if ids:
+        try:
+            game_ids = [int(x) for x in ids.split(",")]
+        except ValueError:
+            return jsonify({"error": "ids must be a comma-separated list of game ids"}), 400
+        by_id = {g.get("id"): g for g in games}
+        unknown = [gid for gid in game_ids if gid not in by_id]
+        if unknown:
+            return jsonify({"error": f"Unknown game ids: {unknown}"}), 404
+        games = [by_id[gid] for gid in game_ids]
+    else:
+        games = sorted(games, key=lambda g: g.get("created_at", ""), reverse=True)
+
+    all_players = load_players()
+    sources = [s for s in (lists_pdf_source(g, all_players) for g in games) if s]
+    if not sources:
+        return jsonify({"error": "No roster defined for these games"}), 400
+    if len(sources) > LISTS_EXPORT_MAX:
+        return jsonify({"error": f"At most {LISTS_EXPORT_MAX} games per export"}), 400
+
+    stamp = datetime.now().strftime("%Y%m%d")
+    if fmt == "pdf":
+        # One document: the per-game PDFs (cached, misses rendered in parallel) joined
+        data = merge_pdfs(PDF_CACHE.fetch_all(sources, process_pool(), progress=report_progress))
+        return send_file(BytesIO(data), as_attachment=True, download_name=f"team_pack_{stamp}.pdf",
+                         mimetype="application/pdf")
+
+    names = [f"game_{s['game_id']}_lists.pdf" for s in sources]
+    pdfs = PDF_CACHE.fetch_all(sources, process_pool(), progress=report_progress)
+    return Response(
+        zip_stream(zip(names, pdfs)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="team_pack_{stamp}.zip"'},
+    )
+
+
+# ---------- Background jobs ----------
+
+JOBS = JobQueue()
+
+# API calls that may run as jobs: the long computations and exports
+JOB_ENDPOINTS = {
+    "api_optimize_pairing", "api_optimize_batch", "api_pairing_sensitivity", "api_optimize_roster",
+    "api_simulate", "api_rebuild_report", "api_game_lists_pdf", "api_export_lists_pdf",
+}
+
+# Job endpoints that never report progress (a single PDF render), so cannot stop once running
+UNCANCELLABLE_ENDPOINTS = {"api_game_lists_pdf"}
+
+def run_api_job(method, path, body):
+    """
+    Replay an API call in a job thread, as the user who queued it. The
+    result is the call's own response, served back by /api/jobs/<id>/result.
+    """
+    with app.test_request_context(path, method=method, json=body):
+        session["logged_in"] = True
+        response = app.full_dispatch_request()
+        response.direct_passthrough = False  # send_file() bodies (PDFs) are read here too
+        data = response.get_data()  # runs streamed bodies (zip exports) here too
+    return {
+        "status_code": response.status_code,
+        "mimetype": response.mimetype,
+        "content_disposition": response.headers.get("Content-Disposition"),
+        "data": data,
+    }
+
+def pack_job(job):
+    out = job.to_dict()
+    if job.status == DONE:
+        out["status_code"] = job.result["status_code"]
+        out["result_url"] = url_for("api_job_result", job_id=job.id)
+    return out
+
+
+@app.route("/api/jobs", methods=["POST"])
+@login_required
+def api_submit_job():
+    """
+    Run a long API call in the background: {"path": "/api/games/3/optimize?mode=win_probability",
+    "method": "GET" (default) or "POST", "body": {...} for POST}. Answers 202 with the job;
+    poll GET /api/jobs/<id>, then read the call's response from /api/jobs/<id>/result.
+    """
+    payload = request.get_json(silent=True) or {}
+    path = payload.get("path")
+    method = (payload.get("method") or "GET").upper()
+    body = payload.get("body")
+    if not isinstance(path, str) or not path.startswith("/api/"):
+        return jsonify({"error": "path must be an /api/ URL"}), 400
+    if body is not None and not isinstance(body, dict):
+        return jsonify({"error": "body must be an object"}), 400
+
+    try:
+        endpoint, _ = app.url_map.bind("localhost").match(urlsplit(path).path, method=method)
+    except HTTPException:
+        return jsonify({"error": f"No API call {method} {path}"}), 400
+    if endpoint not in JOB_ENDPOINTS:
+        return jsonify({"error": f"{method} {path} cannot run as a job"}), 400
+
+    try:
+        job = JOBS.submit(endpoint, f"{method} {path}", run_api_job, method, path, body,
+                          cancellable=endpoint not in UNCANCELLABLE_ENDPOINTS)
+    except QueueFull as e:
+        return jsonify({"error": f"Too many background jobs ({e}), try again shortly"}), 503
+    response = jsonify(pack_job(job))
+    response.headers["Location"] = url_for("api_get_job", job_id=job.id)
+    return response, 202
+
+
+@app.route("/api/jobs", methods=["GET"])
+@login_required
+def api_list_jobs():
+    return jsonify([pack_job(job) for job in JOBS.list()])
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@login_required
+def api_get_job(job_id):
+    """Status and progress ({"done", "total", "message"}) of a job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found (unknown or expired)"}), 404
+    return jsonify(pack_job(job))
+
+
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+@login_required
+def api_cancel_job(job_id):
+    """Cancel a queued or running job; a running one stops at its next progress report."""
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found (unknown or expired)"}), 404
+    if job.status == RUNNING and not job.cancellable:
+        return jsonify({"error": "This job cannot be stopped once running", "job": pack_job(job)}), 409
+    return jsonify(pack_job(job))
+
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+@login_required
+def api_job_result(job_id):
+    """The response of the job's API call, as if it had been called directly."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found (unknown or expired)"}), 404
+    if job.status != DONE:
+        return jsonify({"error": f"Job is {job.status}", "job": pack_job(job)}), 409
+    result = job.result
+    response = Response(result["data"], status=result["status_code"], mimetype=result["mimetype"])
+    if result["content_disposition"]:
+        response.headers["Content-Disposition"] = result["content_disposition"]
+    return response
+
+
+# ---------- Metrics ----------
+
+@app.before_request
+def start_request_timing():
+    if not metrics.enabled():
+        return
+    metrics.start_request()
+    if request.is_json:
+        # Parsed here once (Flask keeps the result) so the body's parse time shows on its own
+        with metrics.span("parse"):
+            request.get_json(silent=True)
+
+@app.after_request
+def finish_request_timing(response):
+    if metrics.enabled():
+        timing = metrics.finish_request(request.endpoint or "unmatched", request.method, response.status_code)
+        if timing:
+            response.headers["Server-Timing"] = timing
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    Prometheus scrape target, 404 unless METRICS=1. No login: it only holds
+    route names, timings and byte counts, and scrapers have no session.
+    """
+    if not metrics.enabled():
+        return jsonify({"error": "Metrics are off (set METRICS=1)"}), 404
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,131 @@
+"""
+Expected-score tables calibrated on the logged real scores.
+
+The report aggregates keep sufficient statistics of real_score per matrix
+state and per (player, state): count, sum and sum of squares. fit() turns
+them into a table in one pass over those few entries, without touching the
+games:
+  - per state, the mean and spread of the real scores, shrunk towards the
+    fixed STATE_TO_SCORE / STATE_TO_SPREAD values by PRIOR_WEIGHT games;
+  - per player and state, the same, shrunk towards the fitted state table.
+
+Fits are stored in the "calibration" document with an increasing version;
+a new one is only fitted when the statistics changed since the last fit.
+ScoreTable is what the optimizers and the report read: the fixed constants
+or a fitted table, with the same interface.
+"""
+import math
+
+from pairing import discrete_normal
+
+CALIBRATION_DOC = "calibration"
+
+# Fixed value counts as this many games on each side of a fit
+PRIOR_WEIGHT = 5
+PLAYER_PRIOR_WEIGHT = 5
+
+# Floor for a fitted spread: a few identical scores do not make a certainty
+MIN_SPREAD = 1.0
+
+# Older fits kept in the document, newest first
+KEEP_PREVIOUS = 10
+
+SCORE_TABLES = ("fixed", "calibrated", "calibrated_player")
+
+
+def _shrunk(stats, prior_mean, prior_sd, weight):
+    """Mean and spread of n scores, with `weight` pseudo-scores at prior_mean +- prior_sd."""
+    n, s, sq = stats["n"], stats["sum"], stats["sumsq"]
+    mean = (s + weight * prior_mean) / (n + weight)
+    # squared deviations around the shrunk mean, the prior adds its own variance
+    ss = sq - 2 * mean * s + n * mean * mean + weight * (prior_sd ** 2 + (prior_mean - mean) ** 2)
+    sd = math.sqrt(max(ss / (n + weight), MIN_SPREAD ** 2))
+    return {"score": mean, "spread": sd, "n": n}
+
+
+def fit(state_stats, player_state_stats, prior_scores, prior_spreads):
+    """
+    state_stats: {state: {"n", "sum", "sumsq"}}, player_state_stats:
+    {"player_id|state": {...}}. Returns {"states": {state: {"score", "spread",
+    "n"}}, "players": {player_id: {state: {...}}}}.
+    """
+    states = {}
+    for state, prior in prior_scores.items():
+        stats = state_stats.get(state) or {"n": 0, "sum": 0.0, "sumsq": 0.0}
+        states[state] = _shrunk(stats, prior, prior_spreads[state], PRIOR_WEIGHT)
+
+    players = {}
+    for key, stats in player_state_stats.items():
+        player_id, state = key.split("|", 1)
+        base = states.get(state)
+        if base is None or not stats["n"]:
+            continue
+        players.setdefault(player_id, {})[state] = _shrunk(
+            stats, base["score"], base["spread"], PLAYER_PRIOR_WEIGHT
+        )
+    return {"states": states, "players": players}
+
+
+def next_calibration(doc, inputs, prior_scores, prior_spreads, fitted_at):
+    """The calibration document with a new fit of `inputs` as current, the old one archived."""
+    previous = []
+    version = 0
+    if doc:
+        current = doc["current"]
+        version = current["version"]
+        previous = [{k: current[k] for k in ("version", "fitted_at", "states")}] + doc.get("previous", [])
+    return {
+        "current": {
+            "version": version + 1,
+            "fitted_at": fitted_at,
+            "inputs": inputs,
+            **fit(inputs["states"], inputs["player_states"], prior_scores, prior_spreads),
+        },
+        "previous": previous[:KEEP_PREVIOUS],
+    }
+
+
+class ScoreTable:
+    """
+    Expected score and spread of a game per matrix state, optionally per
+    player. key() names the score distribution of a cell for TeamOdds and
+    the simulation: the state, or "player_id:state" with per-player values.
+    """
+
+    def __init__(self, scores, spreads, players=None, name="fixed", version=None):
+        self.scores = scores
+        self.spreads = spreads
+        self.players = players or {}  # str(player_id) -> {state: {"score", "spread"}}
+        self.name = name
+        self.version = version
+
+    @classmethod
+    def from_calibration(cls, current, per_player=False):
+        states = current["states"]
+        return cls(
+            {s: v["score"] for s, v in states.items()},
+            {s: v["spread"] for s, v in states.items()},
+            current["players"] if per_player else None,
+            name="calibrated_player" if per_player else "calibrated",
+            version=current["version"],
+        )
+
+    def _entry(self, player_id, state):
+        return (self.players.get(str(player_id)) or {}).get(state)
+
+    def score(self, player_id, state):
+        entry = self._entry(player_id, state)
+        return entry["score"] if entry else self.scores.get(state)
+
+    def key(self, player_id, state):
+        return f"{player_id}:{state}" if self._entry(player_id, state) else state
+
+    def distributions(self):
+        out = {state: discrete_normal(self.scores[state], self.spreads[state]) for state in self.scores}
+        for player_id, states in self.players.items():
+            for state, v in states.items():
+                out[f"{player_id}:{state}"] = discrete_normal(v["score"], v["spread"])
+        return out
+
+    def describe(self):
+        return {"name": self.name, "version": self.version}
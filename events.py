@@ -0,0 +1,82 @@
+"""
+Live game changes pushed to open pages over Server-Sent Events.
+
+Handlers publish a compact diff per game (cells changed, slots assigned, ...)
+and every matrix / fight page streaming that game receives it. Fan-out is
+in-process: a change reaches the streams served by the same process, so
+live updates need a single (threaded) worker, like the default `flask run`.
+"""
+import json
+import queue
+import threading
+
+# Comment line sent when nothing happened, keeps proxies from closing the stream
+KEEPALIVE_SECONDS = 15
+
+# Events buffered per stream; a reader that falls this far behind reloads instead
+QUEUE_SIZE = 256
+
+
+def format_event(event):
+    """One SSE message. The id is the game revision, sent back as Last-Event-ID on reconnect."""
+    lines = []
+    if event.get("revision") is not None:
+        lines.append(f"id: {event['revision']}")
+    lines.append(f"event: {event['type']}")
+    lines.append("data: " + json.dumps(event, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # game_id -> set of queues
+
+    def subscribe(self, game_id):
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(game_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, game_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(game_id)
+            if subscribers:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[game_id]
+
+    def subscriber_count(self, game_id):
+        with self._lock:
+            return len(self._subscribers.get(game_id, ()))
+
+    def publish(self, game_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(game_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow reader: drop its backlog, it reloads everything instead
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+                q.put_nowait({"type": "reload", "revision": event.get("revision")})
+
+    def stream(self, game_id, q, first=None):
+        """Generator of SSE messages for one subscription, unsubscribes when the client goes away."""
+        try:
+            yield "retry: 3000\n\n"
+            if first:
+                yield format_event(first)
+            while True:
+                try:
+                    event = q.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(game_id, q)
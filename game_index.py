@@ -0,0 +1,121 @@
+"""
+Secondary indexes over the games, for the filtered and paginated games list.
+
+A GameIndex is built once per version of the cached games collection
+(CachedStore.derived), so queries never scan or sort the games. Games are
+ordered newest first by (created_at, id). A cursor is the (created_at, id)
+of the last game of the previous page, so pages stay stable while games
+are added or deleted.
+"""
+import base64
+import binascii
+import bisect
+import json
+
+# fields=summary: what the games list shows, without list texts or matrices
+SUMMARY_FIELDS = ("id", "opponent_name", "created_at", "scenario")
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, ValueError if it was not made by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, game_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(game_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, game_id
+
+
+def game_summary(game):
+    out = {field: game.get(field) for field in SUMMARY_FIELDS}
+    out["armies"] = [{"faction": a.get("faction")} for a in game.get("armies") or [] if isinstance(a, dict)]
+    roster = game.get("roster") or []
+    out["roster_locked"] = 0 < len(roster) == len(game.get("armies") or [])
+    return out
+
+
+def project(game, fields):
+    """fields: None (whole game), "summary", or a list of top-level fields."""
+    if fields is None:
+        return game
+    if fields == "summary":
+        return game_summary(game)
+    return {field: game.get(field) for field in fields if field in game}
+
+
+def _normalize(text):
+    return (text or "").strip().lower()
+
+
+def _contains(keys, key):
+    i = bisect.bisect_left(keys, key)
+    return i < len(keys) and keys[i] == key
+
+
+class GameIndex:
+    def __init__(self, games):
+        self.by_key = {}
+        self.keys = []          # (created_at, id), ascending
+        # value -> its keys, ascending; lowercased opponent_name and faction
+        self.by_opponent = {}
+        self.by_faction = {}
+        self.by_scenario = {}
+
+        for game in games:
+            if not isinstance(game, dict) or not isinstance(game.get("id"), int):
+                continue
+            key = (str(game.get("created_at") or ""), game["id"])
+            self.by_key[key] = game
+            self.keys.append(key)
+            self.by_opponent.setdefault(_normalize(game.get("opponent_name")), []).append(key)
+            factions = {_normalize(a["faction"]) for a in game.get("armies") or []
+                        if isinstance(a, dict) and a.get("faction")}
+            for faction in factions:
+                self.by_faction.setdefault(faction, []).append(key)
+            if game.get("scenario"):
+                self.by_scenario.setdefault(game["scenario"], []).append(key)
+        self.keys.sort()
+        for index in (self.by_opponent, self.by_faction, self.by_scenario):
+            for keys in index.values():
+                keys.sort()
+
+    def query(self, opponent=None, faction=None, scenario=None, date_from=None, date_to=None,
+              cursor=None, limit=50):
+        """
+        Games matching every given filter, newest first.
+        opponent / faction match case-insensitively, date_from / date_to are
+        inclusive ISO date (or datetime) prefixes of created_at.
+        Returns (page, next_cursor or None, number of matching games).
+        """
+        filters = []
+        if opponent is not None:
+            filters.append(self.by_opponent.get(_normalize(opponent), []))
+        if faction is not None:
+            filters.append(self.by_faction.get(_normalize(faction), []))
+        if scenario is not None:
+            filters.append(self.by_scenario.get(scenario, []))
+
+        keys = self.keys
+        if filters:
+            # walk the shortest match list, the others are only probed
+            filters.sort(key=len)
+            keys = filters[0]
+            if len(filters) > 1:
+                keys = [k for k in keys if all(_contains(f, k) for f in filters[1:])]
+
+        lo = bisect.bisect_left(keys, (date_from,)) if date_from else 0
+        hi = bisect.bisect_right(keys, (date_to + "\uffff",)) if date_to else len(keys)
+        total = max(0, hi - lo)
+        if cursor is not None:
+            hi = min(hi, bisect.bisect_left(keys, tuple(cursor)))
+
+        start = max(lo, hi - limit)
+        page = keys[start:hi][::-1]
+        next_cursor = encode_cursor(page[-1]) if page and start > lo else None
+        return [self.by_key[key] for key in page], next_cursor, total
@@ -0,0 +1,174 @@
+"""
+Background jobs for long computations (optimizers, simulations, exports).
+
+A job runs a callable on a small, bounded thread pool and keeps its status,
+progress and result for a while, so the request that starts it returns at
+once and the page polls for completion. Code running inside a job reports
+progress with report_progress(), which is also where a cancelled job stops;
+loops without a meaningful total (solver searches) call check_cancelled().
+Outside a job both do nothing, so the same code serves synchronous requests.
+A job that cannot stop part way (one PDF render) is queued with
+cancellable=False: it can still be dropped while queued, not once running.
+
+Like the live events (events.py), jobs live in one process: the status of a
+job is only known to the worker that started it.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs running at once; the heavy ones fan out to the worker processes anyway
+JOB_WORKERS = 2
+
+# Queued + running jobs accepted before new ones are refused
+MAX_PENDING = 32
+
+# Finished jobs (and their results) are kept this long, and at most this many
+RESULT_TTL_SECONDS = 3600
+MAX_FINISHED = 50
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+_current = threading.local()
+
+
+def check_cancelled():
+    """Raise JobCancelled if the job running in this thread was cancelled (no-op outside a job)."""
+    job = getattr(_current, "job", None)
+    if job is not None and job.cancel_requested:
+        raise JobCancelled()
+
+
+def report_progress(done, total, message=None):
+    """Progress of the job running in this thread (no-op outside a job). Raises JobCancelled once cancelled."""
+    job = getattr(_current, "job", None)
+    if job is None:
+        return
+    if job.cancel_requested:
+        raise JobCancelled()
+    job.progress = {"done": done, "total": total, "message": message}
+
+
+class Job:
+    def __init__(self, kind, description, cancellable=True):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.description = description
+        self.cancellable = cancellable
+        self.status = QUEUED
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "cancellable": self.cancellable,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> Job, oldest first
+
+    def submit(self, kind, description, fn, *args, cancellable=True):
+        """
+        Queue fn(*args) as a job; its return value becomes the result. Raises
+        QueueFull. cancellable=False: fn never reports progress, so once
+        running it cannot be stopped.
+        """
+        job = Job(kind, description, cancellable)
+        with self._lock:
+            self._evict()
+            pending = sum(1 for j in self._jobs.values() if j.status not in FINISHED)
+            if pending >= MAX_PENDING:
+                raise QueueFull(f"{pending} jobs are already waiting")
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        with self._lock:
+            if job.cancel_requested:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+        _current.job = job
+        try:
+            result = fn(*args)
+        except JobCancelled:
+            status, result, error = CANCELLED, None, None
+        except Exception as e:
+            status, result, error = FAILED, None, str(e) or type(e).__name__
+        else:
+            status, error = DONE, None
+            if job.cancel_requested:
+                # a cancel that came too late to stop the work still drops its result
+                status, result = CANCELLED, None
+        finally:
+            _current.job = None
+        with self._lock:
+            job.status, job.result, job.error = status, result, error
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            self._evict()
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job. Returns the job, None if unknown; a
+        running job that is not cancellable is returned untouched.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            if job.status == RUNNING and not job.cancellable:
+                return job
+            job.cancel_requested = True
+            if job.status == QUEUED:
+                job.future.cancel()
+                job.status = CANCELLED
+                job.finished_at = time.time()
+            return job
+
+    def _evict(self):
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.status in FINISHED]
+        for i, job in enumerate(finished):
+            if now - job.finished_at > RESULT_TTL_SECONDS or i < len(finished) - MAX_FINISHED:
+                del self._jobs[job.id]
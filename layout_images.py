@@ -0,0 +1,165 @@
+"""
+Web derivatives of the battlefield layout images in data/.
+
+The PNGs there are large and the fight page shows a strip of them over
+venue Wi-Fi. Every layout gets a thumbnail and a full-size copy, each as
+WebP and as an optimised PNG, named after the content hash of the source:
+a name never changes meaning, so browsers may keep them forever.
+Derivatives are rendered on a background thread whenever the app sees
+new layout files (prebuild()), or all at once with `flask build-layouts`,
+and kept in data/derived/. One asked for before that is rendered on the
+spot.
+
+Without Pillow there are no derivatives and the pages show the originals.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # originals only
+    Image = None
+
+log = logging.getLogger(__name__)
+
+DERIVED_DIR = "derived"
+
+# Thumbnail width in pixels: twice the strip's 240 CSS pixels would be the
+# originals again, the thumbnails are only there to pick a layout
+THUMB_WIDTH = 240
+
+WEBP_QUALITY = 80
+
+VARIANTS = ("thumb", "full")
+FORMATS = {"webp": "image/webp", "png": "image/png"}
+
+_NAME = re.compile(r"^([0-9a-f]{16})-(thumb|full)\.(webp|png)$")
+
+
+def render(source, variant, fmt, out):
+    """Write one derivative of the image at `source` to `out` (atomically)."""
+    with Image.open(source) as im:
+        im.load()
+        if variant == "thumb" and im.width > THUMB_WIDTH:
+            im = im.resize((THUMB_WIDTH, round(im.height * THUMB_WIDTH / im.width)), Image.LANCZOS)
+        fd, tmp = tempfile.mkstemp(dir=out.parent, prefix=out.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if fmt == "webp":
+                    im.save(f, "WEBP", quality=WEBP_QUALITY, method=6)
+                else:
+                    im.save(f, "PNG", optimize=True)
+            os.replace(tmp, out)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class LayoutImages:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.out_dir = data_dir / DERIVED_DIR
+        self._lock = threading.Lock()
+        self._hashes = {}   # file name -> ((inode, mtime_ns, size), content hash)
+        self._sources = {}  # content hash -> file name
+        self._pending = None  # files waiting for the background build
+        self._building = False
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def content_hash(self, filename):
+        """Short sha256 of a data/ file, re-read only when its inode, size or mtime changes."""
+        path = self.data_dir / filename
+        st = path.stat()
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self._hashes.get(filename)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+        with self._lock:
+            self._hashes[filename] = (stamp, digest)
+            self._sources[digest] = filename
+        return digest
+
+    def urls(self, filename, prefix):
+        """{"thumb": {"webp": url, "png": url}, "full": {...}} of a layout file, None without Pillow."""
+        if not self.enabled:
+            return None
+        try:
+            digest = self.content_hash(filename)
+        except OSError:
+            return None
+        return {
+            variant: {fmt: f"{prefix}/{digest}-{variant}.{fmt}" for fmt in FORMATS}
+            for variant in VARIANTS
+        }
+
+    def path(self, name):
+        """
+        (path, mimetype) of a derivative, rendered if it is not on disk yet.
+        None for names that are not ours or whose source is gone.
+        """
+        m = _NAME.match(name)
+        if not m or not self.enabled:
+            return None
+        digest, variant, fmt = m.groups()
+        out = self.out_dir / name
+        if not out.exists():
+            filename = self._sources.get(digest)
+            if filename is None:
+                return None
+            try:
+                if self.content_hash(filename) != digest:
+                    return None
+                self.out_dir.mkdir(exist_ok=True)
+                render(self.data_dir / filename, variant, fmt, out)
+            except OSError:
+                # source removed or replaced since the manifest listed it
+                return None
+        return out, FORMATS[fmt]
+
+    def build(self, filenames):
+        """Render every missing derivative of these data/ files. Returns how many were written."""
+        if not self.enabled:
+            return 0
+        written = 0
+        for filename in filenames:
+            try:
+                digest = self.content_hash(filename)
+            except OSError:
+                continue
+            for variant in VARIANTS:
+                for fmt in FORMATS:
+                    name = f"{digest}-{variant}.{fmt}"
+                    if not (self.out_dir / name).exists() and self.path(name):
+                        written += 1
+        return written
+
+    def prebuild(self, filenames):
+        """build(filenames) on a background thread, so pages never wait for a first render."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending = list(filenames)
+            if self._building:
+                return  # the running build picks them up next
+            self._building = True
+        threading.Thread(target=self._build_pending, name="layout-images", daemon=True).start()
+
+    def _build_pending(self):
+        while True:
+            with self._lock:
+                filenames, self._pending = self._pending, None
+                if filenames is None:
+                    self._building = False
+                    return
+            try:
+                self.build(filenames)
+            except Exception:
+                log.exception("Building layout derivatives failed")
@@ -0,0 +1,259 @@
+"""
+Army list PDFs of a game's roster, cached by content.
+
+pdf_source() collects everything a game's PDF shows (title, player names,
+list texts) as plain data. Its hash names the cached file in
+data/pdf_cache/, so a PDF is only rendered again when one of those changes.
+render_pdf() is a top-level function so bulk exports can run it on the
+worker pool; a merged team pack is the cached per-game PDFs joined with
+merge_pdfs().
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from io import BytesIO
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from metrics import span
+
+PDF_CACHE_DIR = "pdf_cache"
+
+# Cached PDFs kept, least recently used dropped first
+PDF_CACHE_MAX = 200
+
+
+def list_text(player):
+    """Full text of the player's default list (first list as fallback)."""
+    # If at some point you store a frozen snapshot, prefer that:
+    snap_text = player.get("list_text")
+    if isinstance(snap_text, str) and snap_text.strip():
+        return snap_text.strip()
+
+    lists = player.get("lists") or []
+    idx = player.get("default_index")
+    if isinstance(idx, int) and 0 <= idx < len(lists):
+        return (lists[idx] or "").strip()
+
+    # Fallback: first list if exists
+    if lists:
+        return (lists[0] or "").strip()
+
+    return "(No list text)"
+
+
+def pdf_source(game, by_id):
+    """What a game's PDF shows, or None without a roster. by_id: player id -> player."""
+    roster_players = [by_id[pid] for pid in game.get("player_ids") or [] if by_id.get(pid)]
+    if not roster_players:
+        return None
+    return {
+        "game_id": game.get("id"),
+        "title": f"Game #{game.get('id')} – {game.get('opponent_name') or 'Opponent'}",
+        "players": [
+            {"name": p.get("name") or f"Player {p.get('id')}", "list_text": list_text(p)}
+            for p in roster_players
+        ],
+    }
+
+
+def source_hash(source):
+    return hashlib.sha256(json.dumps(source, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def _draw(c, source):
+    width, height = A4
+
+    y = height - 40  # start position
+    left_margin = 40
+    line_height = 12
+
+    # Title
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(left_margin, y, source["title"])
+    y -= 24
+
+    for p in source["players"]:
+        # Page break if needed
+        if y < 80:
+            c.showPage()
+            y = height - 40
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(left_margin, y, source["title"])
+            y -= 24
+
+        # Player header
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(left_margin, y, p["name"])
+        y -= 16
+
+        # List text (monospace style)
+        c.setFont("Courier", 9)
+
+        # Simple word-wrap
+        max_chars = 95  # rough width
+        for raw_line in p["list_text"].splitlines() or [""]:
+            line = raw_line if raw_line.strip() != "" else " "
+            while len(line) > max_chars:
+                segment = line[:max_chars]
+                c.drawString(left_margin, y, segment)
+                y -= line_height
+                line = line[max_chars:]
+                if y < 40:
+                    c.showPage()
+                    y = height - 40
+                    c.setFont("Courier", 9)
+            c.drawString(left_margin, y, line)
+            y -= line_height
+            if y < 40:
+                c.showPage()
+                y = height - 40
+                c.setFont("Courier", 9)
+
+        # Spacer between players
+        y -= 10
+
+    c.showPage()
+
+
+def render_merged(sources):
+    """One PDF with every source, each game starting on a new page."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    for source in sources:
+        _draw(c, source)
+    c.save()
+    return buffer.getvalue()
+
+
+def render_pdf(source):
+    return render_merged([source])
+
+
+def merge_pdfs(parts):
+    """One PDF with the pages of each PDF in parts (bytes), in order."""
+    writer = PdfWriter()
+    for data in parts:
+        writer.append(PdfReader(BytesIO(data)))
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class PdfCache:
+    """PDF bytes by content hash, as files in one directory (shared by every worker process)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return self.directory / f"{key}.pdf"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # recently used
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._prune()
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - PDF_CACHE_MAX)]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def fetch(self, source, pool=None):
+        """Cached PDF of a source, rendered (on the pool if given) and stored on a miss."""
+        key = source_hash(source)
+        data = self.get(key)
+        if data is None:
+            with span("pdf.render"):
+                data = pool.submit(render_pdf, source).result() if pool else render_pdf(source)
+            self.put(key, data)
+        return data
+
+    def fetch_all(self, sources, pool, progress=None):
+        """
+        PDFs of several sources, in order. Misses render in parallel on the
+        pool. progress(done, total) is called as each one is ready.
+        """
+        keys = [source_hash(s) for s in sources]
+        cached = [self.get(key) for key in keys]
+        futures = {
+            i: pool.submit(render_pdf, source)
+            for i, (source, data) in enumerate(zip(sources, cached))
+            if data is None
+        }
+        for i, key in enumerate(keys):
+            data = cached[i]
+            if data is None:
+                with span("pdf.render"):
+                    data = futures[i].result()
+                self.put(key, data)
+            if progress:
+                progress(i + 1, len(keys))
+            yield data
+
+
+class _Chunks:
+    """Write-only file for zipfile that hands the written bytes over in chunks."""
+
+    def __init__(self):
+        self._parts = []
+        self._offset = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def zip_stream(files):
+    """Zip archive of (name, bytes) pairs, yielded as each file is added (PDFs are stored as is)."""
+    out = _Chunks()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            yield out.take()
+    yield out.take()
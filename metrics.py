@@ -0,0 +1,188 @@
+"""
+Request timings and store counters, for Server-Timing headers and /metrics.
+
+Off unless METRICS=1 (see app.py). Code marks its slow parts with
+`with span("name"):` and the store backends report what they read and
+write with count_read() / count_write(); while metrics are off these
+return at once. While on, every response carries a Server-Timing header
+with the spans its request went through (summed per name, plus the
+total), and /metrics serves per-route latency histograms, span histograms
+and the store counters in the Prometheus text format.
+
+Like the live events (events.py), the numbers are per process. Work that
+runs on the worker pool (pairing.process_pool) is timed by the span
+around the wait for it.
+"""
+import math
+import threading
+import time
+from contextlib import nullcontext
+
+PREFIX = "pairing_"
+
+# Histogram bucket upper bounds, in seconds (the Prometheus client defaults)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+# name -> (type, help), in /metrics order
+METRICS = {
+    "request_duration_seconds": ("histogram", "Time to build a response, per route and status"),
+    "span_duration_seconds": ("histogram", "Time spent in a span: store load / save, optimizers, PDF rendering"),
+    "store_reads_total": ("counter", "Reads from the storage backend, per collection or document"),
+    "store_read_bytes_total": ("counter", "JSON bytes read from the storage backend"),
+    "store_writes_total": ("counter", "Writes to the storage backend, per collection or document"),
+    "store_written_bytes_total": ("counter", "JSON bytes written to the storage backend"),
+}
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [count per bucket, sum]
+_local = threading.local()
+
+_NULL_SPAN = nullcontext()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def enabled():
+    return _enabled
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    bucket = next(i for i, bound in enumerate(BUCKETS) if seconds <= bound)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * len(BUCKETS), 0.0]
+        entry[0][bucket] += 1
+        entry[1] += seconds
+
+
+def count_read(kind, nbytes):
+    """One read of a collection / document (kind: "games", "players", "report"...) from the backend."""
+    count("store_reads_total", kind=kind)
+    count("store_read_bytes_total", nbytes, kind=kind)
+
+
+def count_write(kind, nbytes):
+    count("store_writes_total", kind=kind)
+    count("store_written_bytes_total", nbytes, kind=kind)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        observe("span_duration_seconds", seconds, span=self.name)
+        spans = getattr(_local, "spans", None)
+        if spans is not None:
+            spans.append((self.name, seconds))
+        return False
+
+
+def span(name):
+    """Context manager timing a block under `name` (a shared no-op while metrics are off)."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+# --- per request ---
+
+def start_request():
+    _local.spans = []
+    _local.start = time.perf_counter()
+
+
+def finish_request(endpoint, method, status):
+    """Record the request started in this thread. Returns its Server-Timing header value."""
+    start = getattr(_local, "start", None)
+    spans = getattr(_local, "spans", None) or []
+    _local.start = _local.spans = None
+    if start is None:
+        return None
+    seconds = time.perf_counter() - start
+    observe("request_duration_seconds", seconds, endpoint=endpoint, method=method, status=str(status))
+    return server_timing(spans, seconds)
+
+
+def server_timing(spans, total):
+    """Server-Timing value: spans summed per name, in first-seen order, then the total (ms)."""
+    summed = {}
+    for name, seconds in spans:
+        n, s = summed.get(name, (0, 0.0))
+        summed[name] = (n + 1, s + seconds)
+    parts = [
+        f"{name};dur={s * 1000:.1f}" + (f';desc="{n}x"' if n > 1 else "")
+        for name, (n, s) in summed.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# --- exposition ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _bound(bound):
+    return "+Inf" if bound == math.inf else repr(bound)
+
+
+def render():
+    """Everything recorded so far, in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(counts), total)) for key, (counts, total) in _histograms.items())
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        full = PREFIX + name
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        if kind == "counter":
+            for (n, labels), value in counters:
+                if n == name:
+                    lines.append(f"{full}{_labels(labels)} {value}")
+            continue
+        for (n, labels), (counts, total) in histograms:
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, c in zip(BUCKETS, counts):
+                cumulative += c
+                lines.append(f"{full}_bucket{_labels(labels + (('le', _bound(bound)),))} {cumulative}")
+            lines.append(f"{full}_sum{_labels(labels)} {total}")
+            lines.append(f"{full}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,743 @@
+"""
+Pairing engine: assignment solvers used by the optimize endpoints.
+
+A "score table" is a list of rows (one per player) of column values (one per
+opponent army). A cell can be None to forbid that pairing.
+"""
+import heapq
+import math
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from jobs import check_cancelled, report_progress
+
+INF = float("inf")
+
+
+def hungarian(score):
+    """
+    Max-weight assignment (Hungarian / Kuhn-Munkres, O(n^2 m)).
+    Every row gets a distinct column, so we need rows <= cols.
+    Returns (total, cols) with cols[i] = column assigned to row i,
+    or None if no assignment avoids the forbidden (None) cells.
+    """
+    n = len(score)
+    if n == 0:
+        return 0.0, []
+    m = len(score[0])
+    if n > m:
+        return None
+
+    # Min-cost formulation on a 1-indexed cost matrix
+    cost = [[0.0] * (m + 1)]
+    for row in score:
+        cost.append([0.0] + [INF if v is None else -v for v in row])
+
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)    # p[j] = row matched to column j
+    way = [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [INF] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0]
+            ui0 = u[i0]
+            delta = INF
+            j1 = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                cur = row[j] - ui0 - v[j]
+                if cur < minv[j]:
+                    minv[j] = cur
+                    way[j] = j0
+                if minv[j] < delta:
+                    delta = minv[j]
+                    j1 = j
+            if delta == INF:
+                return None
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+
+    cols = [0] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            cols[p[j] - 1] = j - 1
+    total = sum(score[i][cols[i]] for i in range(n))
+    return total, cols
+
+
+def _solve_constrained(score, include, exclude):
+    """Best assignment with some (row, col) pairs forced and some forbidden."""
+    m = len(score[0]) if score else 0
+    fixed_rows = {i for i, _ in include}
+    fixed_cols = {j for _, j in include}
+    free_rows = [i for i in range(len(score)) if i not in fixed_rows]
+    free_cols = [j for j in range(m) if j not in fixed_cols]
+
+    sub = []
+    for i in free_rows:
+        sub.append([
+            None if (i, j) in exclude else score[i][j]
+            for j in free_cols
+        ])
+
+    res = hungarian(sub)
+    if res is None:
+        return None
+    sub_total, sub_cols = res
+
+    cols = [0] * len(score)
+    for i, j in include:
+        cols[i] = j
+    for k, i in enumerate(free_rows):
+        cols[i] = free_cols[sub_cols[k]]
+    total = sub_total + sum(score[i][j] for i, j in include)
+    return total, cols
+
+
+def iter_assignments(score):
+    """
+    Murty's ranking: every assignment, best first, as (total, cols).
+    Each popped solution splits its subspace into disjoint children, so
+    every assignment is produced at most once.
+    """
+    first = hungarian(score)
+    if first is None:
+        return
+
+    counter = 0
+    heap = [(-first[0], counter, first[1], (), frozenset())]
+    while heap:
+        neg_total, _, cols, include, exclude = heapq.heappop(heap)
+        yield -neg_total, tuple(cols)
+
+        check_cancelled()
+        fixed_rows = {i for i, _ in include}
+        free_rows = [i for i in range(len(score)) if i not in fixed_rows]
+        forced = list(include)
+        for i in free_rows:
+            child_exclude = exclude | {(i, cols[i])}
+            res = _solve_constrained(score, forced, child_exclude)
+            if res is not None:
+                counter += 1
+                heapq.heappush(heap, (-res[0], counter, res[1], tuple(forced), child_exclude))
+            forced.append((i, cols[i]))
+
+
+def k_best_assignments(score, k=5):
+    """The k best assignments, best first, as (total, cols)."""
+    out = []
+    if k <= 0:
+        return out
+    for solution in iter_assignments(score):
+        out.append(solution)
+        if len(out) == k:
+            break
+        report_progress(len(out), k)
+    return out
+
+
+def k_best_layout_assignments(score, modifiers, n_layouts, k=5, max_candidates=5000):
+    """
+    Joint player x army x layout assignment: every row gets a distinct
+    column and a distinct layout, maximising score + layout modifiers.
+    modifiers maps (row, col, layout) -> bonus, missing entries are 0.
+
+    Pairings are walked in Murty order on a relaxed table where each cell
+    gets its best layout bonus; that order is an upper bound, so once it
+    drops below the k-th exact value no later pairing can do better. Each
+    candidate pairing gets its exact value from a Hungarian solve on layouts.
+    Returns (solutions, exact) with solutions = [(total, cols, layouts)];
+    exact is False if max_candidates ran out before the bound closed.
+    """
+    n = len(score)
+    if n > n_layouts:
+        return [], True
+
+    by_cell = {}
+    for (i, j, l), bonus in modifiers.items():
+        by_cell.setdefault((i, j), {})[l] = bonus
+
+    def cell_bonus(i, j):
+        bonuses = by_cell.get((i, j))
+        if not bonuses:
+            return 0.0
+        best = max(bonuses.values())
+        # a layout without a modifier is worth 0
+        return best if len(bonuses) == n_layouts else max(best, 0.0)
+
+    relaxed = [
+        [None if score[i][j] is None else score[i][j] + cell_bonus(i, j) for j in range(len(score[i]))]
+        for i in range(n)
+    ]
+
+    best = []  # (total, cols, layouts), best first
+    exact = False
+    for count, (bound, cols) in enumerate(iter_assignments(relaxed)):
+        if len(best) == k and bound <= best[-1][0] + 1e-9:
+            exact = True
+            break
+        if count >= max_candidates:
+            break
+        layout_table = [
+            [by_cell.get((i, cols[i]), {}).get(l, 0.0) for l in range(n_layouts)]
+            for i in range(n)
+        ]
+        bonus, layouts = hungarian(layout_table)
+        total = sum(score[i][cols[i]] for i in range(n)) + bonus
+        best.append((total, cols, tuple(layouts)))
+        best.sort(key=lambda s: -s[0])
+        del best[k:]
+    else:
+        exact = True
+    return best, exact
+
+
+def assignment_alternatives(score):
+    """
+    Sensitivity of the optimal assignment, one constrained solve per cell.
+    Returns (total, cols, alt) where alt[i][j] is the best total among
+    assignments that disagree with the optimum on cell (i, j): forbidding it
+    when it is in the optimum, forcing it otherwise (None if impossible).
+
+    Changing the cell by d moves every assignment using it by d and leaves
+    the others unchanged, so the optimum switches as soon as:
+      in the optimum:   total + d < alt[i][j]
+      outside it:       alt[i][j] + d > total
+    """
+    first = hungarian(score)
+    if first is None:
+        return None
+    total, cols = first
+    n = len(score)
+    alt = []
+    for i in range(n):
+        report_progress(i, n)
+        row = []
+        for j in range(len(score[i])):
+            if cols[i] == j:
+                res = _solve_constrained(score, [], {(i, j)})
+            elif score[i][j] is None:
+                res = None
+            else:
+                res = _solve_constrained(score, [(i, j)], frozenset())
+            row.append(None if res is None else res[0])
+        alt.append(row)
+    return total, cols, alt
+
+
+_COMPLETION_CACHE = OrderedDict()
+_COMPLETION_CACHE_SIZE = 256
+_COMPLETION_CACHE_LOCK = threading.Lock()
+
+
+def k_best_completions(score, locked, k=5):
+    """
+    k best assignments that keep the locked (row, col) pairs, as (total, cols).
+    Only the free sub-table is ranked. Results are cached per score table and
+    locked set, so re-asking after each click of a pairing round is a lookup.
+    """
+    key = (tuple(tuple(row) for row in score), frozenset(locked))
+    with _COMPLETION_CACHE_LOCK:
+        hit = _COMPLETION_CACHE.get(key)
+        if hit is not None:
+            _COMPLETION_CACHE.move_to_end(key)
+    # A cached ranking for a larger k already contains the answer
+    if hit is not None and (hit[0] >= k or len(hit[1]) < hit[0]):
+        return hit[1][:k]
+
+    fixed_rows = {i for i, _ in locked}
+    fixed_cols = {j for _, j in locked}
+    free_rows = [i for i in range(len(score)) if i not in fixed_rows]
+    free_cols = [j for j in range(len(score[0]) if score else 0) if j not in fixed_cols]
+    sub = [[score[i][j] for j in free_cols] for i in free_rows]
+    locked_total = sum(score[i][j] for i, j in locked)
+
+    out = []
+    for sub_total, sub_cols in k_best_assignments(sub, k):
+        cols = [0] * len(score)
+        for i, j in locked:
+            cols[i] = j
+        for x, i in enumerate(free_rows):
+            cols[i] = free_cols[sub_cols[x]]
+        out.append((locked_total + sub_total, tuple(cols)))
+
+    with _COMPLETION_CACHE_LOCK:
+        _COMPLETION_CACHE[key] = (k, out)
+        while len(_COMPLETION_CACHE) > _COMPLETION_CACHE_SIZE:
+            _COMPLETION_CACHE.popitem(last=False)
+    return out
+
+
+def _best_roster(score, size, include, exclude):
+    """Best `size` rows of score (one per column) keeping include, avoiding exclude."""
+    check_cancelled()
+    rows = [i for i in range(len(score)) if i not in exclude]
+    if len(rows) < size or not score:
+        return None
+    # Forced rows get a bonus larger than any possible swing, then we take it back
+    flat = [v for row in score for v in row]
+    bonus = size * (max(flat) - min(flat)) + 1.0
+    # Columns (armies) pick rows (players): transposed rectangular assignment
+    table = [
+        [score[i][j] + (bonus if i in include else 0.0) for i in rows]
+        for j in range(size)
+    ]
+    res = hungarian(table)
+    if res is None:
+        return None
+    picked = [rows[x] for x in res[1]]  # picked[j] = row playing column j
+    if not include <= set(picked):
+        return None
+    total = sum(score[picked[j]][j] for j in range(size))
+    return total, picked
+
+
+def k_best_rosters(score, k=5):
+    """
+    Pick which rows (players) to field when there are more candidates than
+    columns (opposing armies). Returns up to k (total, picked) with picked[j]
+    the row facing column j, ranked by optimal assignment value.
+
+    Lawler's partitioning over row membership: every roster is reached once
+    and each subspace is bounded by one rectangular Hungarian solve, so we do
+    k * size solves instead of enumerating C(N, size) rosters.
+    """
+    size = len(score[0]) if score else 0
+    first = _best_roster(score, size, frozenset(), frozenset())
+    if first is None or k <= 0:
+        return []
+
+    counter = 0
+    heap = [(-first[0], counter, first[1], frozenset(), frozenset())]
+    out = []
+    while heap and len(out) < k:
+        neg_total, _, picked, include, exclude = heapq.heappop(heap)
+        out.append((-neg_total, tuple(picked)))
+        report_progress(len(out), k)
+
+        forced = set(include)
+        for i in sorted(set(picked) - include):
+            child_exclude = exclude | {i}
+            res = _best_roster(score, size, frozenset(forced), child_exclude)
+            if res is not None:
+                counter += 1
+                heapq.heappush(heap, (-res[0], counter, res[1], frozenset(forced), child_exclude))
+            forced.add(i)
+    return out
+
+
+# ---------- Score distributions ----------
+
+def discrete_normal(mean, sd, max_score=20):
+    """Score distribution on 0..max_score, a normal curve cut to the table."""
+    weights = [math.exp(-((x - mean) ** 2) / (2.0 * sd * sd)) for x in range(max_score + 1)]
+    total = sum(weights)
+    return [w / total for w in weights]
+
+
+def convolve(a, b):
+    out = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                out[i + j] += x * y
+    return out
+
+
+class TeamOdds:
+    """
+    Exact distribution of a team total, by convolving per-game distributions.
+
+    A total only depends on the multiset of game states, so convolutions are
+    memoised on the sorted state tuple and every prefix of it: candidates
+    that share most of their states only pay for the games that differ.
+    """
+
+    def __init__(self, distributions, loss_below, win_above):
+        self.distributions = distributions  # state -> pmf over game scores
+        self.loss_below = loss_below
+        self.win_above = win_above
+        self.totals = {(): [1.0]}
+
+    def total_pmf(self, states):
+        key = tuple(sorted(states))
+        pmf = self.totals.get(key)
+        if pmf is None:
+            pmf = convolve(self.total_pmf(key[:-1]), self.distributions[key[-1]])
+            self.totals[key] = pmf
+        return pmf
+
+    def odds(self, states):
+        """(P(win), P(draw), P(loss)) for one pairing, given its game states."""
+        pmf = self.total_pmf(states)
+        p_loss = sum(p for t, p in enumerate(pmf) if t < self.loss_below)
+        p_win = sum(p for t, p in enumerate(pmf) if t > self.win_above)
+        return p_win, max(0.0, 1.0 - p_win - p_loss), p_loss
+
+
+# ---------- Defender / attacker pairing game ----------
+
+# Round names, same order as the fight page GAME_PHASES
+DEFENSE_PHASES = ["First defense", "Second defense", "Third defense",
+                  "Fourth defense", "Fifth defense", "Sixth defense"]
+
+
+def _bits(mask):
+    out = []
+    i = 0
+    while mask:
+        if mask & 1:
+            out.append(i)
+        mask >>= 1
+        i += 1
+    return out
+
+
+def _pairs(items):
+    # Attackers sent against a defender: two of them, or the only one left
+    if len(items) < 2:
+        return [tuple(items)]
+    return [(items[x], items[y]) for x in range(len(items)) for y in range(x + 1, len(items))]
+
+
+class PairingGame:
+    """
+    WTC-style pairing process, solved by minimax with a transposition table.
+
+    Each round both captains put up a defender, send two attackers at the
+    other defender, and each defender picks one of them; refused attackers
+    go back to the pool. When four or fewer remain, the refused attackers
+    and the leftovers are paired with each other and the process ends.
+
+    Simultaneous reveals are solved conservatively: we commit first and the
+    opponent answers knowing our choice, so values are what we can guarantee.
+    Subgame values are memoised by (players bitmask, armies bitmask).
+    """
+
+    def __init__(self, score):
+        self.score = score
+        self.n = len(score)
+        self.table = {}
+
+    @property
+    def full_mask(self):
+        return (1 << self.n) - 1
+
+    def value(self, pmask=None, amask=None):
+        if pmask is None:
+            pmask = amask = self.full_mask
+        key = (pmask, amask)
+        v = self.table.get(key)
+        if v is None:
+            # only finished values go in the table, so a cancelled search leaves it usable
+            check_cancelled()
+            v = self._solve(pmask, amask)
+            self.table[key] = v
+        return v
+
+    # --- principal line ---
+
+    def best_defender(self, pmask, amask):
+        """(value, our defender, their most damaging defender) for a state."""
+        return self._root(pmask, amask)
+
+    def attacker_choice(self, pmask, amask, pd, ad):
+        """Our best attacker pair against their defender ad, and their answer."""
+        best = None
+        for ppair in _pairs(_bits(pmask & ~(1 << pd))):
+            worst = None
+            for apair in _pairs(_bits(amask & ~(1 << ad))):
+                y, a, p = self.defender_picks(pmask, amask, pd, ad, ppair, apair)
+                if worst is None or y < worst[0]:
+                    worst = (y, apair, a, p)
+            if best is None or worst[0] > best[0]:
+                best = (worst[0], ppair) + worst[1:]
+        return best  # (value, our pair, their pair, our pick, their pick)
+
+    def defender_picks(self, pmask, amask, pd, ad, ppair, apair):
+        """Which attacker each defender takes: (value, army for pd, player for ad)."""
+        best = None
+        for a in apair:
+            worst = None
+            for p in ppair:
+                o = self.outcome(pmask, amask, pd, ad, ppair, apair, a, p)
+                if worst is None or o < worst[0]:
+                    worst = (o, p)
+            if best is None or worst[0] > best[0]:
+                best = (worst[0], a, worst[1])
+        return best
+
+    def plan(self, pmask=None, amask=None, first_round=0):
+        """
+        Principal line from a state: each round with the recommended defender,
+        the attackers sent, the picks, and the games they lock. The opponent
+        is assumed to answer as badly for us as possible, so the games add up
+        to value(). first_round names the rounds when resuming mid-process.
+        """
+        if pmask is None:
+            pmask = amask = self.full_mask
+        rounds = []
+        r = first_round
+        while pmask:
+            if _popcount(pmask) == 1:
+                p, a = _bits(pmask)[0], _bits(amask)[0]
+                rounds.append({"phase": "Leftovers", "value": self.score[p][a], "games": [(p, a)]})
+                break
+            value, pd, ad = self.best_defender(pmask, amask)
+            _, ppair, apair, a, p = self.attacker_choice(pmask, amask, pd, ad)
+            games = [(pd, a), (p, ad)]
+            rest_p = pmask & ~((1 << pd) | (1 << p))
+            rest_a = amask & ~((1 << ad) | (1 << a))
+            final = _popcount(pmask) <= 4
+            rounds.append({
+                "phase": DEFENSE_PHASES[min(r, len(DEFENSE_PHASES) - 1)],
+                "value": value,
+                "our_defender": pd,
+                "their_defender": ad,
+                "our_attackers": list(ppair),
+                "their_attackers": list(apair),
+                "our_pick": a,
+                "their_pick": p,
+                "games": games,
+            })
+            if final:
+                labels = ["Refused attackers", "Leftovers"]
+                for idx, g in enumerate(_final_games(rest_p, rest_a, ppair, apair, p, a)):
+                    rounds.append({"phase": labels[idx], "value": self.score[g[0]][g[1]], "games": [g]})
+                break
+            pmask, amask = rest_p, rest_a
+            r += 1
+        return rounds
+
+    # --- search ---
+
+    def _solve(self, pmask, amask):
+        players = _bits(pmask)
+        armies = _bits(amask)
+        if len(players) == 1:
+            return self.score[players[0]][armies[0]]
+        if len(players) == 4:
+            return self._solve_last4(players, armies)
+        return self._root(pmask, amask)[0]
+
+    def _root(self, pmask, amask):
+        """Our best defender, their most damaging defender in reply, and the value."""
+        s = self.score
+        players = _bits(pmask)
+        armies = _bits(amask)
+        # Move ordering for the alpha-beta cuts: robust defenders first
+        players.sort(key=lambda p: -min(s[p][a] for a in armies))
+        armies.sort(key=lambda a: max(s[p][a] for p in players))
+
+        best, best_pd, best_ad = -INF, None, None
+        for pd in players:
+            worst, reply = INF, None
+            for ad in armies:
+                x = self._attack(pmask, amask, pd, ad, best, worst)
+                if x < worst:
+                    worst, reply = x, ad
+                    if worst <= best:
+                        break
+            if worst > best:
+                best, best_pd, best_ad = worst, pd, reply
+        return best, best_pd, best_ad
+
+    def _attack(self, pmask, amask, pd, ad, alpha, beta):
+        """
+        Value of a round once defenders are revealed, inside an alpha-beta
+        window: max over our attacker pair, min over theirs, then each
+        defender picks (ours max, theirs min).
+        """
+        s = self.score
+        table = self.table
+        row_pd = s[pd]
+        rest_p = pmask & ~(1 << pd)
+        rest_a = amask & ~(1 << ad)
+        # Move ordering: our best attackers into ad first, their best into pd first
+        ps = sorted(_bits(rest_p), key=lambda p: -s[p][ad])
+        as_ = sorted(_bits(rest_a), key=row_pd.__getitem__)
+        apairs = _pairs(as_)
+        deep = len(ps) >= 4
+        outcomes = {}  # (a, p) -> outcome, filled lazily (deep rounds only)
+        v = -INF
+        for ppair in _pairs(ps):
+            w = INF
+            for apair in apairs:
+                lo = alpha if alpha > v else v
+                y = -INF
+                for a in apair:
+                    z = INF
+                    for p in ppair:
+                        if deep:
+                            # refused attackers go back: independent of the pairs
+                            o = outcomes.get((a, p))
+                            if o is None:
+                                key = (rest_p & ~(1 << p), rest_a & ~(1 << a))
+                                sub = table.get(key)
+                                if sub is None:
+                                    sub = self.value(*key)
+                                o = row_pd[a] + s[p][ad] + sub
+                                outcomes[(a, p)] = o
+                        else:
+                            o = self.outcome(pmask, amask, pd, ad, ppair, apair, a, p)
+                        if o < z:
+                            z = o
+                        if z <= lo or z <= y:
+                            break
+                    if z > y:
+                        y = z
+                        if y >= w:
+                            break
+                if y < w:
+                    w = y
+                    if w <= lo:
+                        break
+            if w > v:
+                v = w
+                if v >= beta:
+                    break
+        return v
+
+    def _solve_last4(self, players, armies):
+        # Final round with 4 each, inlined: it is by far the most visited state
+        s = self.score
+        m = [[s[p][a] for a in armies] for p in players]
+        best = -INF
+        for pd in range(4):
+            row_pd = m[pd]
+            worst = INF
+            for ad in range(4):
+                v = -INF
+                for pl, q, r in _LAST4_SPLITS[pd]:
+                    sq, sr, spl = m[q], m[r], m[pl]
+                    qad, rad = sq[ad], sr[ad]
+                    w = INF
+                    for al, x, y in _LAST4_SPLITS[ad]:
+                        # our defender takes x or y, theirs takes q or r
+                        c1 = qad + sr[y]
+                        c2 = rad + sq[y]
+                        h1 = row_pd[x] + (c1 if c1 < c2 else c2)
+                        c1 = qad + sr[x]
+                        c2 = rad + sq[x]
+                        h2 = row_pd[y] + (c1 if c1 < c2 else c2)
+                        z = spl[al] + (h1 if h1 > h2 else h2)
+                        if z < w:
+                            w = z
+                            if w <= v or w <= best:
+                                break
+                    if w > v:
+                        v = w
+                        if v >= worst:
+                            break
+                if v < worst:
+                    worst = v
+                    if worst <= best:
+                        break
+            if worst > best:
+                best = worst
+        return best
+
+    def outcome(self, pmask, amask, pd, ad, ppair, apair, a, p):
+        """Value once both defenders have picked: their two games plus the rest."""
+        s = self.score
+        total = s[pd][a] + s[p][ad]
+        rest_p = pmask & ~((1 << pd) | (1 << p))
+        rest_a = amask & ~((1 << ad) | (1 << a))
+        if _popcount(pmask) >= 5:
+            # Refused attackers go back to the pool
+            return total + self.value(rest_p, rest_a)
+        return total + sum(s[i][j] for i, j in _final_games(rest_p, rest_a, ppair, apair, p, a))
+
+
+# For each defender slot in a 4-player final round: (leftover, attacker, attacker)
+_LAST4_SPLITS = [
+    [(rest[i], *(rest[j] for j in range(3) if j != i)) for i in range(3)]
+    for rest in ([x for x in range(4) if x != d] for d in range(4))
+]
+
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+def _final_games(rest_p, rest_a, ppair, apair, p, a):
+    # Last round: refused attackers face each other, then the leftovers
+    p_ref = [x for x in ppair if x != p]
+    a_ref = [x for x in apair if x != a]
+    games = []
+    if p_ref and a_ref:
+        games.append((p_ref[0], a_ref[0]))
+    p_left = [x for x in _bits(rest_p) if x not in p_ref]
+    a_left = [x for x in _bits(rest_a) if x not in a_ref]
+    if p_left and a_left:
+        games.append((p_left[0], a_left[0]))
+    return games
+
+
+_GAME_CACHE = OrderedDict()
+_GAME_CACHE_SIZE = 16
+_GAME_CACHE_LOCK = threading.Lock()
+
+
+def pairing_game(score):
+    """
+    Shared PairingGame per score table, so repeated queries on an unchanged
+    matrix reuse the transposition table instead of solving again.
+    """
+    key = tuple(tuple(row) for row in score)
+    with _GAME_CACHE_LOCK:
+        game = _GAME_CACHE.get(key)
+        if game is None:
+            game = PairingGame([list(row) for row in score])
+            _GAME_CACHE[key] = game
+            while len(_GAME_CACHE) > _GAME_CACHE_SIZE:
+                _GAME_CACHE.popitem(last=False)
+        else:
+            _GAME_CACHE.move_to_end(key)
+    return game
+
+
+def plan_pairing_game(score):
+    """PairingGame.plan() from the full state, as a top-level function for worker processes."""
+    return pairing_game(score).plan()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def process_pool():
+    """Shared worker processes for CPU-bound solves (batch optimize, simulation)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: never fork the threads of a running web server
+            _POOL = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _POOL
@@ -0,0 +1,247 @@
+"""
+Team report aggregates, maintained incrementally.
+
+The "report" document keeps, per game, the result rows of its pairings
+with a real_score (the per-player details), and running sums per player,
+per opponent faction, per scenario and per matchup. Saving or deleting a
+game swaps that game's rows out of and into the sums, so reading the
+report never walks the games. It also keeps each player's match_history
+tallied per faction; together with the matchup sums it drives the matrix
+suggestions.
+
+    {"version":   REPORT_VERSION,
+     "games":     {game_id: [row, ...]},        every game, [] without results
+     "players":   {player_id: totals},
+     "factions":  {faction: totals},
+     "scenarios": {scenario: totals},
+     "matchups":  {matchup_key(...): totals},   per player and faction, and per scenario
+     "history":   {player_id: {faction: {"WIN": n, "DRAW": n, "LOSS": n}}},
+     "state_scores":        {state: score_stats},          real_score per matrix state,
+     "player_state_scores": {"player_id|state": score_stats}  for calibration.py
+    }
+
+JSON keys are strings: ids are stored as str(id), factions lowercased in
+matchups and history.
+"""
+REPORT_DOC = "report"
+
+# Bump when the document layout changes: older documents are rebuilt
+REPORT_VERSION = 3
+
+TOTAL_FIELDS = ("games_played", "sum_real", "sum_delta", "delta_count")
+
+HISTORY_RESULTS = ("WIN", "DRAW", "LOSS")
+
+# Game score a match_history result counts as: the WIN / LOOSE matrix states
+HISTORY_SCORES = {"WIN": 13.5, "DRAW": 10.0, "LOSS": 6.5}
+
+# Suggestions start from an even game worth this many games, so one result
+# does not swing a cell to EASY or HELP on its own
+PRIOR_SCORE = 10.0
+PRIOR_WEIGHT = 2
+
+# Results on the game's scenario replace the all-scenario ones from this many games
+SCENARIO_MIN_GAMES = 3
+
+# States a suggestion can land on (GAMBLE / UNKNOWN are a captain's call)
+SUGGESTED_STATES = ("HELP", "LOOSE", "S_LOOSE", "S_WIN", "WIN", "EASY")
+
+
+def matchup_key(player_id, faction, scenario=None):
+    key = f"{player_id}|{(faction or '').strip().lower()}"
+    return f"{key}|{scenario}" if scenario else key
+
+
+def game_rows(game, state_to_score):
+    """Detail rows of a game's pairings that have a real_score."""
+    gid = game.get("id")
+    opp = game.get("opponent_name") or "Unknown"
+    scenario = game.get("scenario")
+    matrix = game.get("matrix") or {}
+    armies = game.get("armies") or []
+
+    rows = []
+    for pr in game.get("pairings") or []:
+        pid = pr.get("player_id")
+        aidx = pr.get("army_index")
+        real = pr.get("real_score")
+        if not isinstance(pid, int) or not isinstance(real, (int, float)):
+            continue
+
+        # expected from matrix state
+        state = None
+        expected = None
+        if isinstance(aidx, int):
+            state = matrix.get(f"{pid}-{aidx}")
+            expected = state_to_score.get(state) if state else None
+        delta = float(real) - float(expected) if isinstance(expected, (int, float)) else None
+
+        faction = None
+        if isinstance(aidx, int) and 0 <= aidx < len(armies):
+            faction = armies[aidx].get("faction")
+
+        rows.append({
+            "game_id": gid,
+            "player_id": pid,
+            "opponent": opp,
+            "game_no": pr.get("game_no"),
+            "faction": faction,
+            "scenario": scenario,
+            "real_score": real,
+            "state": state,
+            "expected": expected,
+            "delta": delta,
+        })
+    return rows
+
+
+def empty_report():
+    return {"version": REPORT_VERSION, "games": {}, "players": {}, "factions": {}, "scenarios": {},
+            "matchups": {}, "history": {}, "state_scores": {}, "player_state_scores": {}}
+
+
+def _add(totals, key, row, sign):
+    if key is None:
+        return
+    key = str(key)
+    t = totals.setdefault(key, dict.fromkeys(TOTAL_FIELDS, 0))
+    t["games_played"] += sign
+    t["sum_real"] += sign * float(row["real_score"])
+    if row["delta"] is not None:
+        t["sum_delta"] += sign * row["delta"]
+        t["delta_count"] += sign
+    if t["games_played"] <= 0:
+        del totals[key]
+
+
+def _add_score(stats, key, real, sign):
+    s = stats.setdefault(key, {"n": 0, "sum": 0.0, "sumsq": 0.0})
+    s["n"] += sign
+    s["sum"] += sign * real
+    s["sumsq"] += sign * real * real
+    if s["n"] <= 0:
+        del stats[key]
+
+
+def _apply_rows(report, rows, sign):
+    for row in rows:
+        _add(report["players"], row["player_id"], row, sign)
+        _add(report["factions"], row["faction"], row, sign)
+        _add(report["scenarios"], row["scenario"], row, sign)
+        if row["faction"]:
+            _add(report["matchups"], matchup_key(row["player_id"], row["faction"]), row, sign)
+            if row["scenario"]:
+                _add(report["matchups"], matchup_key(row["player_id"], row["faction"], row["scenario"]), row, sign)
+        if row["state"]:
+            real = float(row["real_score"])
+            _add_score(report["state_scores"], row["state"], real, sign)
+            _add_score(report["player_state_scores"], f"{row['player_id']}|{row['state']}", real, sign)
+
+
+def set_game_rows(report, game_id, rows):
+    """Replace a game's rows and their share of the sums, in place. rows None: game deleted."""
+    old = report["games"].pop(str(game_id), None)
+    if old:
+        _apply_rows(report, old, -1)
+    if rows is not None:
+        report["games"][str(game_id)] = rows
+        _apply_rows(report, rows, +1)
+    return report
+
+
+def player_history(player):
+    """match_history results per lowercased faction."""
+    tally = {}
+    for m in player.get("match_history") or []:
+        if not isinstance(m, dict) or m.get("result") not in HISTORY_RESULTS or not m.get("faction"):
+            continue
+        counts = tally.setdefault(m["faction"].strip().lower(), dict.fromkeys(HISTORY_RESULTS, 0))
+        counts[m["result"]] += 1
+    return tally
+
+
+def history_of(players):
+    return {
+        str(p["id"]): player_history(p)
+        for p in players
+        if isinstance(p, dict) and p.get("id") is not None
+    }
+
+
+def set_player_history(report, player_id, history):
+    """Replace a player's match_history tally, in place. history None: player deleted."""
+    if history is None:
+        report["history"].pop(str(player_id), None)
+    else:
+        report["history"][str(player_id)] = history
+    return report
+
+
+def build_report(games, players, state_to_score, progress=None):
+    """
+    Full rebuild from every game and player (first run, or after out-of-band
+    edits). progress(done, total) is called after each game.
+    """
+    report = empty_report()
+    for done, game in enumerate(games, 1):
+        if isinstance(game, dict) and game.get("id") is not None:
+            set_game_rows(report, game["id"], game_rows(game, state_to_score))
+        if progress:
+            progress(done, len(games))
+    report["history"] = history_of(players)
+    return report
+
+
+def averages(totals):
+    """Public view of a totals entry."""
+    played = totals["games_played"]
+    return {
+        "games_played": played,
+        "avg_score": totals["sum_real"] / played if played else None,
+        "avg_delta": totals["sum_delta"] / totals["delta_count"] if totals["delta_count"] else None,
+    }
+
+
+def suggest_cell(report, player_id, faction, scenario, state_to_score, exclude=()):
+    """
+    Suggested matrix state for one player against one faction, or None
+    without any data: past real scores (on this scenario once there are
+    enough) and match_history results, pulled towards an even game.
+    exclude: result rows not to count (the game being filled in).
+    """
+    if not faction:
+        return None
+
+    faction_key = faction.strip().lower()
+    own = [r for r in exclude
+           if r["player_id"] == player_id and (r["faction"] or "").strip().lower() == faction_key]
+
+    source = "faction"
+    totals = report["matchups"].get(matchup_key(player_id, faction))
+    if scenario:
+        on_scenario = report["matchups"].get(matchup_key(player_id, faction, scenario))
+        own_on_scenario = [r for r in own if r["scenario"] == scenario]
+        if on_scenario and on_scenario["games_played"] - len(own_on_scenario) >= SCENARIO_MIN_GAMES:
+            source, totals, own = "scenario", on_scenario, own_on_scenario
+
+    totals = totals or dict.fromkeys(TOTAL_FIELDS, 0)
+    games = totals["games_played"] - len(own)
+    real = totals["sum_real"] - sum(float(r["real_score"]) for r in own)
+
+    results = (report["history"].get(str(player_id)) or {}).get(faction_key) or {}
+    matches = sum(results.values())
+    history = sum(HISTORY_SCORES[result] * n for result, n in results.items())
+
+    if not games and not matches:
+        return None
+
+    expected = (real + history + PRIOR_SCORE * PRIOR_WEIGHT) / (games + matches + PRIOR_WEIGHT)
+    state = min(SUGGESTED_STATES, key=lambda s: abs(state_to_score[s] - expected))
+    return {
+        "state": state,
+        "expected": expected,
+        "games": games,
+        "avg_score": real / games if games else None,
+        "history": results,
+        "source": source,
+    }
@@ -0,0 +1,269 @@
+"""
+Monte Carlo simulation of full pairing rounds against opponent captains.
+
+Our captain follows the pairing game solver. The opponent follows one of
+OPPONENT_STRATEGIES:
+  greedy   best single matchup at each step, no look-ahead
+  random   uniform choices
+  minimax  sees each of our moves and answers as badly for us as possible
+           (the worst case the solver plans for)
+  mirror   runs the same solver as us, from their side of the matrix
+
+Game scores are sampled from per-state 0-20 distributions. Rounds are split
+into chunks run on a process pool; inside a chunk, rounds that end with the
+same game states are sampled together in one batch per game.
+"""
+import math
+import os
+import random
+from collections import Counter
+
+from pairing import INF, _bits, _final_games, _pairs, _popcount, pairing_game, process_pool
+
+OPPONENT_STRATEGIES = ("greedy", "random", "minimax", "mirror")
+
+MAX_GAME_SCORE = 20
+
+
+# ---------- Captains ----------
+# Every captain sees the matrix from its own side: own_score[mine][theirs].
+# `seen` is the other captain's move for this step, only the omniscient
+# minimax opponent looks at it.
+
+class SolverCaptain:
+    def __init__(self, own_score):
+        self.game = pairing_game(own_score)
+        self.memo = {}
+
+    def _cached(self, key, fn):
+        v = self.memo.get(key)
+        if v is None:
+            v = fn()
+            self.memo[key] = v
+        return v
+
+    def defender(self, mine, theirs, seen=None):
+        return self._cached(("d", mine, theirs), lambda: self.game.best_defender(mine, theirs)[1])
+
+    def attackers(self, mine, theirs, my_def, their_def, seen=None):
+        key = ("a", mine, theirs, my_def, their_def)
+        return self._cached(key, lambda: self.game.attacker_choice(mine, theirs, my_def, their_def)[1])
+
+    def pick(self, mine, theirs, my_def, their_def, my_att, their_att, seen=None):
+        key = ("p", mine, theirs, my_def, their_def, my_att, their_att)
+        return self._cached(key, lambda: self.game.defender_picks(
+            mine, theirs, my_def, their_def, my_att, their_att)[1])
+
+
+class MinimaxOpponent:
+    """Best response to our actual moves, read off our own solver's tables."""
+
+    def __init__(self, our_score):
+        self.game = pairing_game(our_score)
+
+    def defender(self, mine, theirs, seen=None):
+        # mine = their armies, theirs = our players, seen = our defender
+        return min(_bits(mine), key=lambda ad: self.game._attack(theirs, mine, seen, ad, -INF, INF))
+
+    def attackers(self, mine, theirs, my_def, their_def, seen=None):
+        return min(
+            _pairs(_bits(mine & ~(1 << my_def))),
+            key=lambda apair: self.game.defender_picks(theirs, mine, their_def, my_def, seen, apair)[0],
+        )
+
+    def pick(self, mine, theirs, my_def, their_def, my_att, their_att, seen=None):
+        return min(their_att, key=lambda p: self.game.outcome(
+            theirs, mine, their_def, my_def, their_att, my_att, seen, p))
+
+
+class GreedyCaptain:
+    def __init__(self, own_score):
+        self.score = own_score
+
+    def defender(self, mine, theirs, seen=None):
+        # the defender whose worst matchup is the least bad
+        s = self.score
+        return max(_bits(mine), key=lambda d: min(s[d][t] for t in _bits(theirs)))
+
+    def attackers(self, mine, theirs, my_def, their_def, seen=None):
+        s = self.score
+        ranked = sorted(_bits(mine & ~(1 << my_def)), key=lambda x: -s[x][their_def])
+        return tuple(ranked[:2])
+
+    def pick(self, mine, theirs, my_def, their_def, my_att, their_att, seen=None):
+        return max(their_att, key=lambda t: self.score[my_def][t])
+
+
+class RandomCaptain:
+    def __init__(self, rng):
+        self.rng = rng
+
+    def defender(self, mine, theirs, seen=None):
+        return self.rng.choice(_bits(mine))
+
+    def attackers(self, mine, theirs, my_def, their_def, seen=None):
+        return self.rng.choice(_pairs(_bits(mine & ~(1 << my_def))))
+
+    def pick(self, mine, theirs, my_def, their_def, my_att, their_att, seen=None):
+        return self.rng.choice(their_att)
+
+
+def opponent_view(score):
+    """The matrix from the opponent's side: their points, armies as rows."""
+    n = len(score)
+    return [[MAX_GAME_SCORE - score[i][j] for i in range(n)] for j in range(n)]
+
+
+def make_opponent(strategy, score, rng):
+    if strategy == "greedy":
+        return GreedyCaptain(opponent_view(score))
+    if strategy == "random":
+        return RandomCaptain(rng)
+    if strategy == "minimax":
+        return MinimaxOpponent(score)
+    if strategy == "mirror":
+        return SolverCaptain(opponent_view(score))
+    raise ValueError(f"Unknown strategy {strategy}")
+
+
+def play_round(n, us, them):
+    """One full pairing process, following the fight page phases. Returns [(player, army)]."""
+    pm = am = (1 << n) - 1
+    games = []
+    while pm:
+        if _popcount(pm) == 1:
+            games.append((_bits(pm)[0], _bits(am)[0]))
+            break
+        pd = us.defender(pm, am)
+        ad = them.defender(am, pm, seen=pd)
+        ppair = us.attackers(pm, am, pd, ad)
+        apair = them.attackers(am, pm, ad, pd, seen=ppair)
+        a = us.pick(pm, am, pd, ad, ppair, apair)
+        p = them.pick(am, pm, ad, pd, apair, ppair, seen=a)
+        games += [(pd, a), (p, ad)]
+        rest_p = pm & ~((1 << pd) | (1 << p))
+        rest_a = am & ~((1 << ad) | (1 << a))
+        if _popcount(pm) <= 4:
+            games += _final_games(rest_p, rest_a, ppair, apair, p, a)
+            break
+        pm, am = rest_p, rest_a
+    return games
+
+
+# ---------- Sampling ----------
+
+def _run_chunk(score, states, cdfs, strategy, rounds, seed):
+    """
+    Worker: play `rounds` pairing rounds and sample their totals.
+    Returns (histogram of totals, Counter of final pairings).
+    """
+    rng = random.Random(seed)
+    n = len(score)
+    us = SolverCaptain(score)
+    them = make_opponent(strategy, score, rng)
+
+    pairings = Counter()
+    if strategy == "random":
+        for _ in range(rounds):
+            pairings[tuple(sorted(play_round(n, us, them)))] += 1
+    else:
+        # Deterministic captains: every round pairs the same way
+        pairings[tuple(sorted(play_round(n, us, them)))] = rounds
+
+    # Totals only depend on the game states: sample each group in one batch
+    groups = Counter()
+    for games, count in pairings.items():
+        groups[tuple(sorted(states[i][j] for i, j in games))] += count
+
+    population = range(MAX_GAME_SCORE + 1)
+    histogram = Counter()
+    for game_states, count in groups.items():
+        columns = [rng.choices(population, cum_weights=cdfs[st], k=count) for st in game_states]
+        histogram.update(map(sum, zip(*columns)))
+    return histogram, pairings
+
+
+def simulate(score, states, distributions, strategies, rounds, loss_below, win_above,
+             workers=None, seed=None, progress=None):
+    """
+    Simulate `rounds` pairing rounds per opponent strategy.
+    score: expected points per cell (drives the captains), states: matrix state
+    per cell (drives the sampling), distributions: state -> pmf over 0..20.
+    progress(done, total) is called after each chunk; an exception it
+    raises cancels the chunks not started yet.
+    """
+    workers = workers or os.cpu_count() or 1
+    seed = random.randrange(1 << 30) if seed is None else seed
+    cdfs = {}
+    for st, pmf in distributions.items():
+        acc, cdf = 0.0, []
+        for p in pmf:
+            acc += p
+            cdf.append(acc)
+        cdfs[st] = cdf
+
+    chunk = max(1, math.ceil(rounds / workers))
+    tasks = []
+    for strategy in strategies:
+        done = 0
+        idx = 0
+        while done < rounds:
+            size = min(chunk, rounds - done)
+            tasks.append((strategy, (score, states, cdfs, strategy, size, seed + 7919 * idx + len(tasks))))
+            done += size
+            idx += 1
+
+    results = []
+    if workers == 1:
+        for strategy, args in tasks:
+            results.append((strategy, _run_chunk(*args)))
+            if progress:
+                progress(len(results), len(tasks))
+    else:
+        pool = process_pool()
+        futures = [(strategy, pool.submit(_run_chunk, *args)) for strategy, args in tasks]
+        try:
+            for strategy, f in futures:
+                results.append((strategy, f.result()))
+                if progress:
+                    progress(len(results), len(tasks))
+        except BaseException:
+            for _, f in futures:
+                f.cancel()
+            raise
+
+    merged = {s: (Counter(), Counter()) for s in strategies}
+    for strategy, (histogram, pairings) in results:
+        merged[strategy][0].update(histogram)
+        merged[strategy][1].update(pairings)
+
+    return {
+        strategy: summarize(histogram, pairings, loss_below, win_above)
+        for strategy, (histogram, pairings) in merged.items()
+    }
+
+
+def summarize(histogram, pairings, loss_below, win_above):
+    count = sum(histogram.values())
+    mean = sum(t * c for t, c in histogram.items()) / count
+    var = sum(c * (t - mean) ** 2 for t, c in histogram.items()) / count
+
+    percentiles = {}
+    acc = 0
+    wanted = [5, 25, 50, 75, 95]
+    for t in sorted(histogram):
+        acc += histogram[t]
+        while wanted and acc >= count * wanted[0] / 100:
+            percentiles[wanted.pop(0)] = t
+
+    return {
+        "rounds": count,
+        "mean": mean,
+        "sd": math.sqrt(var),
+        "p_win": sum(c for t, c in histogram.items() if t > win_above) / count,
+        "p_draw": sum(c for t, c in histogram.items() if loss_below <= t <= win_above) / count,
+        "p_loss": sum(c for t, c in histogram.items() if t < loss_below) / count,
+        "percentiles": percentiles,
+        "histogram": dict(sorted(histogram.items())),
+        "pairings": pairings.most_common(5),
+    }
@@ -0,0 +1,80 @@
+/* =========================
+   Cached GETs
+   ========================= */
+
+// url -> {etag, text} of the last 200 answer: sent back as If-None-Match,
+// a 304 reuses the kept body instead of downloading it again
+const gCachedResponses = new Map();
+
+// fetch() for read APIs. Callers use it like fetch: res.ok, res.status, await res.json().
+async function fetchCached(url) {
+  const cached = gCachedResponses.get(url);
+  const res = await fetch(url, {
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+    cache: "no-store"  // validators are handled here, not by the browser cache
+  });
+
+  if (res.status === 304 && cached) {
+    // parsed again on each call: pages modify what they load
+    return { ok: true, status: 200, json: async () => JSON.parse(cached.text) };
+  }
+  if (!res.ok) return res;
+
+  const text = await res.text();
+  const etag = res.headers.get("ETag");
+  if (etag) gCachedResponses.set(url, { etag, text });
+  return { ok: true, status: res.status, json: async () => JSON.parse(text) };
+}
+
+/* =========================
+   Background jobs
+   ========================= */
+
+const JOB_FINISHED = ["done", "failed", "cancelled"];
+
+// Queue a long API call (optimizers, exports) as a job; resolves to the job, throws if refused
+async function startJob(path, { method = "GET", body } = {}) {
+  const res = await fetch("/api/jobs", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ path, method, body })
+  });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) throw new Error(data.error || "Could not start the job");
+  return data;
+}
+
+// Poll a job until it finishes, slowing down from 250 ms to 2 s; onProgress gets {done, total, message}
+async function waitForJob(job, onProgress) {
+  let delay = 250;
+  while (!JOB_FINISHED.includes(job.status)) {
+    await new Promise(resolve => setTimeout(resolve, delay));
+    delay = Math.min(delay * 1.5, 2000);
+    const res = await fetch(`/api/jobs/${job.id}`);
+    if (!res.ok) throw new Error("The job was lost (server restarted?)");
+    job = await res.json();
+    if (onProgress && job.progress) onProgress(job.progress);
+  }
+  return job;
+}
+
+function cancelJob(id) {
+  return fetch(`/api/jobs/${id}`, { method: "DELETE" });
+}
+
+// startJob + waitForJob, then the call's own response (res.ok, await res.json()) as with fetch()
+async function runJob(path, { method, body, onStart, onProgress } = {}) {
+  let job;
+  try {
+    job = await startJob(path, { method, body });
+    if (onStart) onStart(job);
+    job = await waitForJob(job, onProgress);
+  } catch (err) {
+    return { ok: false, status: 0, json: async () => ({ error: err.message }) };
+  }
+  if (job.status !== "done") {
+    const error = job.status === "cancelled" ? "Cancelled." : (job.error || "The job failed.");
+    return { ok: false, status: 0, json: async () => ({ error }) };
+  }
+  return fetch(job.result_url);
+}
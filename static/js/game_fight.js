@@ -62,6 +62,11 @@ let gPairings = [];       // 8 slots: {game_no, player_id, army_index, layout_n,
 let gLayouts = {};        // scenarioKey -> [{n, file}, ...]
 
 let gDirtyPairings = false;
+let gSavedPairings = [];  // slots as last saved / loaded, to send only the changed ones
+let gSavedScenario = null;
+let gRevision = 0;        // game revision our pairings are based on
+let gRevisionHeld = false; // a teammate changed a slot we are editing: keep the old base so saving reports it
+const gClientId = Math.random().toString(36).slice(2); // our own live events are skipped
 let gActiveSlot = null;
 let gScenario = null;
 
@@ -247,7 +252,7 @@ function renderLayoutsStrip() {
     return;
   }
 
-  layouts.forEach(({ n, file }) => {
+  layouts.forEach(({ n, file, images }) => {
     const key = `${gScenario}-${n}`;
     if (used.has(key)) return;
 
@@ -263,16 +268,34 @@ function renderLayoutsStrip() {
     label.style.marginBottom = "0.25rem";
     label.textContent = `Layout #${n}`;
 
+    // Thumbnail in the strip (WebP where supported), full image only when clicked
+    const link = document.createElement("a");
+    link.href = images ? images.full.webp : `/layouts/${file}`;
+    link.target = "_blank";
+    link.rel = "noopener";
+    link.title = "Open full size";
+
+    const picture = document.createElement("picture");
+    if (images) {
+      const source = document.createElement("source");
+      source.type = "image/webp";
+      source.srcset = images.thumb.webp;
+      picture.appendChild(source);
+    }
+
     const img = document.createElement("img");
-    img.src = `/layouts/${file}`;
+    img.src = images ? images.thumb.png : `/layouts/${file}`;
     img.alt = file;
+    img.loading = "lazy";
     img.style.width = "240px";
     img.style.maxWidth = "70vw";
     img.style.borderRadius = "8px";
     img.style.display = "block";
 
+    picture.appendChild(img);
+    link.appendChild(picture);
     wrap.appendChild(label);
-    wrap.appendChild(img);
+    wrap.appendChild(link);
     strip.appendChild(wrap);
   });
 }
@@ -509,6 +532,7 @@ function buildGameSlots() {
       refreshSummaryTable();
       refreshAllLayoutDropdowns();
       if (gActiveSlot === slot.game_no) renderLayoutsStrip();
+      scheduleLiveSuggestions();
     });
     card.appendChild(clearBtn);
 
@@ -814,12 +838,105 @@ function assignPairingToSlot(gameNo, playerId, armyIndex) {
   refreshAllLayoutDropdowns();
 
   markPairingsDirty();
+  scheduleLiveSuggestions();
+}
+
+/* =========================
+   Live suggestions
+   ========================= */
+
+let gLiveTimer = null;
+let gLiveAbort = null;
+
+function scheduleLiveSuggestions() {
+  // Debounced: a burst of clicks only asks the server once
+  if (gLiveTimer) clearTimeout(gLiveTimer);
+  gLiveTimer = setTimeout(refreshLiveSuggestions, 150);
+}
+
+async function refreshLiveSuggestions() {
+  const box = document.getElementById("live-suggestions");
+  if (!box) return;
+
+  if (gLiveAbort) gLiveAbort.abort();
+  gLiveAbort = new AbortController();
+
+  const locked = gPairings
+    .filter(p => p.player_id && typeof p.army_index === "number")
+    .map(p => ({ game_no: p.game_no, player_id: p.player_id, army_index: p.army_index }));
+
+  let data;
+  try {
+    const res = await fetch(`/api/games/${window.GAME_ID}/optimize/live`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ pairings: locked, k: 3 }),
+      signal: gLiveAbort.signal
+    });
+    data = await res.json();
+    if (!res.ok) {
+      box.textContent = data.error || "No suggestion available.";
+      return;
+    }
+  } catch (err) {
+    if (err.name !== "AbortError") console.error(err);
+    return;
+  }
+
+  box.innerHTML = "";
+  const sols = data.solutions || [];
+  if (!sols.length) {
+    box.textContent = "No completion available.";
+    return;
+  }
+
+  const next = (data.plan || [])[0];
+  if (next && next.our_defender) {
+    const line = document.createElement("div");
+    line.style.marginBottom = "0.4rem";
+    line.style.color = "#ddd";
+    line.textContent =
+      `${next.phase}: defend with ${next.our_defender.player_name}, ` +
+      `send ${next.our_attackers.map(p => p.player_name).join(" & ")} ` +
+      `(guaranteed ${next.value} pts left to play)`;
+    box.appendChild(line);
+  }
+
+  sols.forEach((sol, idx) => {
+    const line = document.createElement("div");
+    line.style.fontSize = "0.8rem";
+    line.style.color = idx === 0 ? "#f5f5f5" : "#aaa";
+    const rest = sol.pairings.map(p => `${p.player_name} → ${p.faction}`).join(", ");
+    line.textContent = `${idx === 0 ? "Best" : "Alt #" + idx}: ${sol.total_expected} pts` + (rest ? ` · ${rest}` : "");
+    box.appendChild(line);
+  });
 }
 
 /* =========================
    Save / Reset
    ========================= */
 
+function slotKey(p) {
+  return JSON.stringify([p.player_id, p.army_index, p.layout_n, p.real_score]);
+}
+
+// Slots that differ from the last saved state, in PATCH format
+function changedSlots() {
+  return gPairings
+    .filter((p, idx) => slotKey(p) !== slotKey(gSavedPairings[idx] || {}))
+    .map(p => (p.player_id === null || p.army_index === null)
+      ? { game_no: p.game_no, clear: true }
+      : { ...p });
+}
+
+function renderPairings() {
+  buildGameSlots();
+  buildMatrixTable();
+  refreshSummaryTable();
+  refreshAllLayoutDropdowns();
+  renderLayoutsStrip();
+}
+
 async function savePairings() {
   if (!gDirtyPairings) return;
 
@@ -827,14 +944,28 @@ async function savePairings() {
   if (btn) btn.disabled = true;
   setFightStatus("Saving...");
 
+  const slots = changedSlots();
+  const body = { slots, base_revision: gRevision };
+  // a scenario can be changed, not removed: without one the server keeps its own
+  if (gScenario && gScenario !== gSavedScenario) body.scenario = gScenario;
+
   try {
     const res = await fetch(`/api/games/${window.GAME_ID}/pairings`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ scenario: gScenario, pairings: gPairings })
+      method: "PATCH",
+      headers: { "Content-Type": "application/json", "X-Client-Id": gClientId },
+      body: JSON.stringify(body)
     });
     const data = await res.json();
 
+    if (res.status === 409) {
+      // Someone else changed the same slots: take theirs, keep our other slots
+      const conflicting = new Set((data.conflicts || []).map(c => c.key));
+      const pending = slots.filter(s => !conflicting.has(`pairing:${s.game_no}`));
+      await reloadKeepingSlots(pending);
+      setFightStatus(data.error || "Someone else changed these pairings.", "error");
+      return;
+    }
+
     if (!res.ok) {
       console.error(data);
       setFightStatus(data.error || "Error saving pairings.", "error");
@@ -842,6 +973,25 @@ async function savePairings() {
       return;
     }
 
+    // The server copy also holds the slots other people saved meanwhile
+    gRevision = Math.max(gRevision, data.revision);
+    gRevisionHeld = false;
+    gSavedScenario = data.scenario || null;
+    if (!gScenario && gSavedScenario) {
+      gScenario = gSavedScenario;
+      const scenarioSelect = document.getElementById("scenario-select");
+      if (scenarioSelect) scenarioSelect.value = gScenario;
+      renderLayoutsStrip();
+      refreshAllLayoutDropdowns();
+    }
+    const merged = ensure8Slots(data.pairings);
+    const othersChanged = merged.some((p, idx) => slotKey(p) !== slotKey(gPairings[idx]));
+    gSavedPairings = ensure8Slots(data.pairings);
+    if (othersChanged) {
+      gPairings = merged;
+      renderPairings();
+    }
+
     gDirtyPairings = false;
     setFightStatus("Pairings saved.", "saved");
     refreshSummaryTable();
@@ -852,6 +1002,84 @@ async function savePairings() {
   }
 }
 
+// Reload everything, then put back our unsaved slots (in changedSlots() format)
+async function reloadKeepingSlots(pending) {
+  await loadFightData();
+  pending.forEach(s => {
+    const idx = gPairings.findIndex(p => p.game_no === s.game_no);
+    if (idx < 0) return;
+    gPairings[idx] = s.clear
+      ? { game_no: s.game_no, player_id: null, army_index: null, layout_n: null, real_score: null }
+      : s;
+  });
+  renderPairings();
+  if (pending.length) markPairingsDirty();
+}
+
+/* =========================
+   Live updates
+   ========================= */
+
+// A teammate saved some slots: apply them in place, unless we changed the same slot
+function applyPairingsEvent(ev) {
+  if (ev.client === gClientId) return;
+
+  ensure8Slots(ev.slots).forEach((slot, idx) => {
+    if (!(ev.slots || []).some(s => s.game_no === slot.game_no)) return;
+    if (slotKey(gPairings[idx]) !== slotKey(gSavedPairings[idx])) {
+      gRevisionHeld = true;
+      return;
+    }
+    gPairings[idx] = { ...slot };
+    gSavedPairings[idx] = { ...slot };
+  });
+  if ("scenario" in ev) {
+    if (gScenario !== gSavedScenario) {
+      gRevisionHeld = true;
+    } else {
+      gScenario = gSavedScenario = ev.scenario || null;
+      const scenarioSelect = document.getElementById("scenario-select");
+      if (scenarioSelect) scenarioSelect.value = gScenario || "";
+    }
+  }
+  if (!gRevisionHeld) gRevision = Math.max(gRevision, ev.revision);
+
+  renderPairings();
+  if (!gDirtyPairings) setFightStatus("Updated by a teammate.", "saved");
+  scheduleLiveSuggestions();
+}
+
+function applyMatrixEvent(ev) {
+  Object.entries(ev.cells || {}).forEach(([key, value]) => {
+    if (value === null) delete gMatrixStates[key];
+    else gMatrixStates[key] = value;
+  });
+  if ("comment" in ev) setFightNotes(ev.comment);
+  buildMatrixTable();
+  refreshGameCards();
+  refreshSummaryTable();
+  scheduleLiveSuggestions();
+}
+
+function openLiveUpdates() {
+  const source = new EventSource(`/api/games/${window.GAME_ID}/events?since=${gRevision}`);
+  source.addEventListener("pairings", e => applyPairingsEvent(JSON.parse(e.data)));
+  source.addEventListener("matrix", e => applyMatrixEvent(JSON.parse(e.data)));
+  // layout modifiers are not shown here, only their revision is taken
+  source.addEventListener("layout_modifiers", e => {
+    if (!gRevisionHeld) gRevision = Math.max(gRevision, JSON.parse(e.data).revision);
+  });
+  source.addEventListener("reload", e => {
+    // after a roster reset our pending slots no longer apply
+    const pending = JSON.parse(e.data).reset ? [] : changedSlots();
+    reloadKeepingSlots(pending).catch(console.error);
+  });
+  source.addEventListener("deleted", () => {
+    source.close();
+    setFightStatus("This game was deleted.", "error");
+  });
+}
+
 function resetPairings() {
   if (!confirm("Reset all pairings and start from scratch?")) return;
 
@@ -876,6 +1104,7 @@ function resetPairings() {
 
   setFightStatus("Pairings reset. Pick Game 1 and start again.", "unsaved");
   setActiveSlot(1);
+  scheduleLiveSuggestions();
 }
 
 /* =========================
@@ -887,18 +1116,19 @@ async function loadFightData() {
   const saveBtn = document.getElementById("fight-save-btn");
   if (saveBtn) saveBtn.disabled = true;
 
-  // 1) Load matrix + players
-  const resMatrix = await fetch(`/api/games/${window.GAME_ID}/matrix`);
-  if (!resMatrix.ok) {
+  // Matrix + players, layouts inventory and existing pairings, in one call
+  const res = await fetchCached(`/api/games/${window.GAME_ID}/bootstrap`);
+  if (!res.ok) {
     setFightStatus("Error loading matrix.", "error");
     throw new Error("Failed to load matrix");
   }
-  const dataMatrix = await resMatrix.json();
-  const game = dataMatrix.game;
+  const data = await res.json();
+  const game = data.game;
 
-  gPlayers = dataMatrix.players || [];
+  // 1) Matrix + players
+  gPlayers = data.players || [];
   gArmies = game.armies || [];
-  gMatrixStates = dataMatrix.matrix || {};
+  gMatrixStates = data.matrix || {};
   setFightNotes(game?.comment || "");
 
   const oppLabel = document.getElementById("fight-opponent-label");
@@ -906,18 +1136,17 @@ async function loadFightData() {
   if (oppLabel) oppLabel.textContent = `Opponent: ${game.opponent_name || "Unknown"}`;
   if (cntLabel) cntLabel.textContent = `${gArmies.length} codex`;
 
-  // 2) Load layouts inventory
-  const resLayouts = await fetch("/api/layouts");
-  gLayouts = resLayouts.ok ? await resLayouts.json() : {};
-
-  // 3) Load existing pairings
-  const resPairings = await fetch(`/api/games/${window.GAME_ID}/pairings`);
-  let pairingsData = { pairings: [] };
-  if (resPairings.ok) pairingsData = await resPairings.json();
+  // 2) Layouts inventory
+  gLayouts = data.layouts || {};
 
-  gPairings = ensure8Slots(pairingsData.pairings);
+  // 3) Existing pairings
+  gPairings = ensure8Slots(data.pairings);
+  gSavedPairings = ensure8Slots(data.pairings);
+  gRevision = data.revision || 0;
+  gRevisionHeld = false;
 
-  gScenario = pairingsData.scenario || null;
+  gScenario = data.scenario || null;
+  gSavedScenario = gScenario;
   const scenarioSelect = document.getElementById("scenario-select");
   if (scenarioSelect) scenarioSelect.value = gScenario || "";
 
@@ -930,6 +1159,7 @@ async function loadFightData() {
   gDirtyPairings = false;
   setFightStatus("Loaded. Start with Game 1.");
   setActiveSlot(1);
+  scheduleLiveSuggestions();
 }
 
 /* =========================
@@ -972,4 +1202,5 @@ document.addEventListener("DOMContentLoaded", async () => {
   } catch (err) {
     console.error(err);
   }
+  openLiveUpdates();
 });
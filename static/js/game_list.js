@@ -1,11 +1,35 @@
-async function fetchGames() {
-  const res = await fetch("/api/games");
+const PAGE_SIZE = 50;
+let gNextCursor = null;
+
+function currentFilters() {
+  const filters = {};
+  ["opponent", "faction", "scenario", "from", "to"].forEach(name => {
+    const el = document.getElementById(`filter-${name}`);
+    if (el && el.value.trim()) filters[name] = el.value.trim();
+  });
+  return filters;
+}
+
+// One page of game summaries (no list texts, no matrix), newest first
+async function fetchGames(cursor = null) {
+  const params = new URLSearchParams({ fields: "summary", limit: PAGE_SIZE, ...currentFilters() });
+  if (cursor) params.set("cursor", cursor);
+  const res = await fetchCached(`/api/games?${params}`);
   if (!res.ok) {
     throw new Error("Failed to fetch games");
   }
   return await res.json();
 }
 
+async function fetchGameArmies(id) {
+  const res = await fetchCached(`/api/games/${id}?fields=armies`);
+  if (!res.ok) {
+    throw new Error("Failed to fetch armies");
+  }
+  const data = await res.json();
+  return data.armies || [];
+}
+
 async function deleteGame(id) {
   const res = await fetch(`/api/games/${id}`, { method: "DELETE" });
   if (!res.ok) {
@@ -14,135 +38,241 @@ async function deleteGame(id) {
   }
 }
 
-function renderGames(games) {
-  const container = document.getElementById("games-container");
-  const statusEl = document.getElementById("status");
-  container.innerHTML = "";
+function renderArmies(armiesDiv, armies) {
+  armiesDiv.innerHTML = "";
 
-  if (!games.length) {
-    statusEl.textContent = "No games saved yet. The galaxy awaits new conflicts.";
-    statusEl.className = "status empty";
-    return;
-  }
+  if (Array.isArray(armies) && armies.length) {
+    armies.forEach((army, idx) => {
+      const item = document.createElement("div");
+      item.className = "army-item";
 
-  statusEl.textContent = `${games.length} game(s) recorded.`;
-  statusEl.className = "status";
+      const title = document.createElement("div");
+      title.className = "army-title";
+      title.textContent = `#${idx + 1} – ${army.faction || "Unknown Faction"}`;
+
+      const pre = document.createElement("pre");
+      pre.textContent = army.list || "";
+
+      item.appendChild(title);
+      item.appendChild(pre);
+      armiesDiv.appendChild(item);
+    });
+  } else {
+    const empty = document.createElement("div");
+    empty.className = "army-item";
+    empty.textContent = "No armies recorded for this game.";
+    armiesDiv.appendChild(empty);
+  }
+}
 
-  games.forEach(game => {
-    const card = document.createElement("div");
-    card.className = "game-card";
+function renderGameCard(game) {
+  const card = document.createElement("div");
+  card.className = "game-card";
+  card.dataset.gameId = game.id;
 
-    const header = document.createElement("div");
-    header.className = "game-header";
+  const header = document.createElement("div");
+  header.className = "game-header";
 
-    const main = document.createElement("div");
-    main.className = "game-main";
+  const main = document.createElement("div");
+  main.className = "game-main";
 
-    const opponent = document.createElement("div");
-    opponent.className = "game-opponent";
-    opponent.textContent = game.opponent_name || "Unknown Opponent";
+  const opponent = document.createElement("div");
+  opponent.className = "game-opponent";
+  opponent.textContent = game.opponent_name || "Unknown Opponent";
 
-    const meta = document.createElement("div");
-    meta.className = "game-meta";
-    const armiesCount = Array.isArray(game.armies) ? game.armies.length : 0;
-    meta.textContent = `${armiesCount} codex · ${game.created_at || "Unknown date"}`;
+  const meta = document.createElement("div");
+  meta.className = "game-meta";
+  const armiesCount = Array.isArray(game.armies) ? game.armies.length : 0;
+  meta.textContent = `${armiesCount} codex · ${game.created_at || "Unknown date"}`;
 
-    main.appendChild(opponent);
-    main.appendChild(meta);
+  main.appendChild(opponent);
+  main.appendChild(meta);
 
-    const actions = document.createElement("div");
-    actions.className = "game-actions";
+  const actions = document.createElement("div");
+  actions.className = "game-actions";
 
-    const matrixBtn = document.createElement("button");
-    matrixBtn.className = "secondary";
-    matrixBtn.textContent = "Filling matrices";
-    matrixBtn.addEventListener("click", () => {
+  const matrixBtn = document.createElement("button");
+  matrixBtn.className = "secondary";
+  matrixBtn.textContent = "Filling matrices";
+  matrixBtn.addEventListener("click", () => {
     window.location.href = `/games/${game.id}/matrix`;
-    });
+  });
 
-    // NEW: Fight button
-    const fightBtn = document.createElement("button");
-    fightBtn.className = "secondary";
-    fightBtn.textContent = "Fight";
-    fightBtn.addEventListener("click", () => {
+  const fightBtn = document.createElement("button");
+  fightBtn.className = "secondary";
+  fightBtn.textContent = "Fight";
+  fightBtn.addEventListener("click", () => {
     window.location.href = `/games/${game.id}/fight`;
-    });
+  });
+
+  const toggleBtn = document.createElement("button");
+  toggleBtn.className = "secondary";
+  toggleBtn.textContent = "Show Armies";
 
-    const toggleBtn = document.createElement("button");
-    toggleBtn.className = "secondary";
-    toggleBtn.textContent = "Show Armies";
+  const deleteBtn = document.createElement("button");
+  deleteBtn.className = "danger";
+  deleteBtn.textContent = "Delete";
 
-    const deleteBtn = document.createElement("button");
-    deleteBtn.className = "danger";
-    deleteBtn.textContent = "Delete";
+  actions.appendChild(matrixBtn);
+  actions.appendChild(fightBtn);
+  actions.appendChild(toggleBtn);
+  actions.appendChild(deleteBtn);
 
-    actions.appendChild(matrixBtn);
-    actions.appendChild(fightBtn);
-    actions.appendChild(toggleBtn);
-    actions.appendChild(deleteBtn);
+  header.appendChild(main);
+  header.appendChild(actions);
 
+  card.appendChild(header);
 
-    header.appendChild(main);
-    header.appendChild(actions);
+  const armiesDiv = document.createElement("div");
+  armiesDiv.className = "armies";
+  card.appendChild(armiesDiv);
 
-    card.appendChild(header);
+  // List texts are only fetched when the armies are first shown
+  let armiesLoaded = false;
+  toggleBtn.addEventListener("click", async () => {
+    if (!armiesLoaded) {
+      try {
+        renderArmies(armiesDiv, await fetchGameArmies(game.id));
+        armiesLoaded = true;
+      } catch (err) {
+        alert(err.message || "Error loading armies");
+        return;
+      }
+    }
+    const visible = armiesDiv.classList.toggle("visible");
+    toggleBtn.textContent = visible ? "Hide Armies" : "Show Armies";
+  });
 
-    const armiesDiv = document.createElement("div");
-    armiesDiv.className = "armies";
+  deleteBtn.addEventListener("click", async () => {
+    if (!confirm(`Delete game vs "${game.opponent_name}"?`)) return;
+    try {
+      await deleteGame(game.id);
+      await loadGames();
+    } catch (err) {
+      alert(err.message || "Error deleting game");
+    }
+  });
 
-    if (Array.isArray(game.armies) && game.armies.length) {
-      game.armies.forEach((army, idx) => {
-        const item = document.createElement("div");
-        item.className = "army-item";
+  return card;
+}
 
-        const title = document.createElement("div");
-        title.className = "army-title";
-        title.textContent = `#${idx + 1} – ${army.faction || "Unknown Faction"}`;
+function renderGames(data, append = false) {
+  const container = document.getElementById("games-container");
+  const statusEl = document.getElementById("status");
+  const moreBtn = document.getElementById("load-more-btn");
+  if (!append) container.innerHTML = "";
 
-        const pre = document.createElement("pre");
-        pre.textContent = army.list || "";
+  gNextCursor = data.next_cursor || null;
+  if (moreBtn) moreBtn.style.display = gNextCursor ? "" : "none";
 
-        item.appendChild(title);
-        item.appendChild(pre);
-        armiesDiv.appendChild(item);
-      });
-    } else {
-      const empty = document.createElement("div");
-      empty.className = "army-item";
-      empty.textContent = "No armies recorded for this game.";
-      armiesDiv.appendChild(empty);
-    }
+  if (!data.total) {
+    const filtered = Object.keys(currentFilters()).length > 0;
+    statusEl.textContent = filtered
+      ? "No game matches these filters."
+      : "No games saved yet. The galaxy awaits new conflicts.";
+    statusEl.className = "status empty";
+    return;
+  }
 
-    card.appendChild(armiesDiv);
+  statusEl.textContent = `${data.total} game(s) recorded.`;
+  statusEl.className = "status";
 
-    toggleBtn.addEventListener("click", () => {
-      const visible = armiesDiv.classList.toggle("visible");
-      toggleBtn.textContent = visible ? "Hide Armies" : "Show Armies";
-    });
+  data.games.forEach(game => container.appendChild(renderGameCard(game)));
+}
 
-    deleteBtn.addEventListener("click", async () => {
-      if (!confirm(`Delete game vs "${game.opponent_name}"?`)) return;
-      try {
-        await deleteGame(game.id);
-        const updated = await fetchGames();
-        renderGames(updated);
-      } catch (err) {
-        alert(err.message || "Error deleting game");
-      }
-    });
+async function loadGames() {
+  renderGames(await fetchGames());
+}
 
-    container.appendChild(card);
+async function loadMoreGames() {
+  if (!gNextCursor) return;
+  renderGames(await fetchGames(gNextCursor), true);
+}
+
+// Best pairing against every opponent with a complete matrix, hardest first
+async function compareOpponents() {
+  const box = document.getElementById("compare-results");
+  box.textContent = "Optimizing every game...";
+
+  const res = await fetch("/api/games/optimize/batch", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ game_ids: "all" }),
   });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) {
+    box.textContent = data.error || "Batch optimization failed.";
+    return;
+  }
+  if (!data.games.length) {
+    box.textContent = "No game has a complete matrix yet.";
+    return;
+  }
+
+  box.innerHTML = data.games.map(g => `
+    <div class="army-item">
+      <div class="army-title">${g.opponent_name || "Unknown Opponent"} · ${g.total_expected} pts</div>
+      <div>${g.solutions[0].pairings.map(p => `${p.player_name} → ${p.faction}`).join(" · ")}</div>
+    </div>
+  `).join("");
 }
 
-document.addEventListener("DOMContentLoaded", async () => {
-  const statusEl = document.getElementById("status");
+// Army list PDFs of the games on screen (all loaded pages), one file per game or merged.
+// Rendered as a background job; the file downloads once it is ready.
+async function exportTeamPacks(format) {
+  const ids = [...document.querySelectorAll("#games-container .game-card")].map(card => card.dataset.gameId);
+  if (!ids.length) return;
+  const box = document.getElementById("compare-results");
+  box.textContent = "Rendering team packs...";
+
   try {
-    const games = await fetchGames();
-    renderGames(games);
+    let job = await startJob(`/api/games/lists_pdf?${new URLSearchParams({ ids: ids.join(","), format })}`);
+    job = await waitForJob(job, p => {
+      box.textContent = `Rendering team packs... ${p.done} / ${p.total}`;
+    });
+    if (job.status !== "done" || job.status_code !== 200) {
+      const res = job.status === "done" ? await fetch(job.result_url) : null;
+      const data = res ? await res.json().catch(() => ({})) : {};
+      box.textContent = data.error || job.error || "Export failed.";
+      return;
+    }
+    box.textContent = "";
+    window.location.href = job.result_url;
   } catch (err) {
+    box.textContent = err.message || "Export failed.";
+  }
+}
+
+document.addEventListener("DOMContentLoaded", async () => {
+  const compareBtn = document.getElementById("compare-btn");
+  if (compareBtn) compareBtn.addEventListener("click", compareOpponents);
+
+  const exportZipBtn = document.getElementById("export-zip-btn");
+  if (exportZipBtn) exportZipBtn.addEventListener("click", () => exportTeamPacks("zip"));
+  const exportPdfBtn = document.getElementById("export-pdf-btn");
+  if (exportPdfBtn) exportPdfBtn.addEventListener("click", () => exportTeamPacks("pdf"));
+
+  const statusEl = document.getElementById("status");
+  const showError = err => {
     console.error(err);
     statusEl.textContent = "Failed to load games from the data-vault.";
     statusEl.className = "status error";
+  };
+
+  const filtersForm = document.getElementById("filters-form");
+  if (filtersForm) {
+    filtersForm.addEventListener("submit", e => {
+      e.preventDefault();
+      loadGames().catch(showError);
+    });
+  }
+
+  const moreBtn = document.getElementById("load-more-btn");
+  if (moreBtn) moreBtn.addEventListener("click", () => loadMoreGames().catch(showError));
+
+  try {
+    await loadGames();
+  } catch (err) {
+    showError(err);
   }
 });
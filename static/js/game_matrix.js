@@ -25,10 +25,16 @@ const STATE_CONFIG = {
 let gPlayers = [];
 let gArmies = [];
 let gMatrix = {};      // key: "playerId-armyIndex" -> stateKey
+let gChangedCells = {}; // cells edited since the last save (null = cleared)
+let gRevision = 0;      // game revision our matrix is based on
+let gRevisionHeld = false; // a teammate changed a cell we are editing: keep the old base so saving reports it
+const gClientId = Math.random().toString(36).slice(2); // our own live events are skipped
 let gDirty = false;
 let gRosterLocked = false;
 let gAllPlayers = [];
 let gComment = "";
+let gSavedComment = "";   // comment as last loaded / saved: only a local edit is sent
+let gSuggestions = {};  // key -> suggestion from past results, shown as cell tooltips
 
 
 /* =========================
@@ -90,7 +96,7 @@ function markDirty() {
 }
 
 function setCommentUI(comment) {
-  gComment = comment || "";
+  gComment = gSavedComment = comment || "";
   const input = document.getElementById("matrix-comment-input");
   if (input) input.value = gComment;
 }
@@ -191,6 +197,8 @@ function buildMatrixTable() {
       const stateKey = gMatrix[key] || "NONE";
       btn.dataset.stateKey = stateKey;
       applyStateToButton(btn, stateKey);
+      const suggestion = gSuggestions[key];
+      if (suggestion) btn.title = suggestionLabel(suggestion);
 
       btn.addEventListener("click", () => {
         let current = btn.dataset.stateKey || "NONE";
@@ -200,6 +208,7 @@ function buildMatrixTable() {
         const mapKey = `${pid}-${armyIdx}`;
         if (next === "NONE") delete gMatrix[mapKey];
         else gMatrix[mapKey] = next;
+        gChangedCells[mapKey] = next === "NONE" ? null : next;
 
         applyStateToButton(btn, next);
         markDirty();
@@ -232,14 +241,15 @@ function renderRosterPicker() {
   title.style.textTransform = "uppercase";
   title.style.marginBottom = "0.6rem";
   title.style.color = "#ddd";
-  title.textContent = "Select 8 players for this game (roster will be locked)";
+  const size = gArmies.length;
+  title.textContent = `Select ${size} players for this game (roster will be locked)`;
   panel.appendChild(title);
 
   const hint = document.createElement("div");
   hint.style.color = "#aaa";
   hint.style.fontSize = "0.85rem";
   hint.style.marginBottom = "0.8rem";
-  hint.textContent = "You can have more players saved globally. Only 8 are used for this specific game.";
+  hint.textContent = `You can have more players saved globally. Only ${size} are used for this specific game.`;
   panel.appendChild(hint);
 
   const list = document.createElement("div");
@@ -251,8 +261,8 @@ function renderRosterPicker() {
   const selected = new Set();
 
   function updateCountLabel() {
-    count.textContent = `${selected.size} / 8 selected`;
-    lockBtn.disabled = selected.size !== 8;
+    count.textContent = `${selected.size} / ${size} selected`;
+    lockBtn.disabled = selected.size !== size;
   }
 
   gAllPlayers.forEach(p => {
@@ -271,9 +281,9 @@ function renderRosterPicker() {
 
     cb.addEventListener("change", () => {
       if (cb.checked) {
-        if (selected.size >= 8) {
+        if (selected.size >= size) {
           cb.checked = false;
-          alert("You must select exactly 8 players.");
+          alert(`You must select exactly ${size} players.`);
           return;
         }
         selected.add(p.id);
@@ -344,7 +354,7 @@ async function loadMatrixData() {
   setStatus("Loading matrix...");
   document.getElementById("save-matrix-btn").disabled = true;
 
-  const res = await fetch(`/api/games/${window.GAME_ID}/matrix`);
+  const res = await fetchCached(`/api/games/${window.GAME_ID}/bootstrap`);
   if (!res.ok) {
     setStatus("Error loading matrix.", "error");
     throw new Error("Failed to load matrix");
@@ -371,7 +381,7 @@ async function loadMatrixData() {
     const table = document.getElementById("matrix-table");
     if (table) table.innerHTML = "";
 
-    setStatus("Roster not locked for this game. Select 8 players first.", "unsaved");
+    setStatus(`Roster not locked for this game. Select ${gArmies.length} players first.`, "unsaved");
     renderRosterPicker();
     return;
   }
@@ -386,6 +396,9 @@ async function loadMatrixData() {
   gPlayers = data.players || [];     // now roster snapshot objects
   gArmies = game.armies || [];
   gMatrix = data.matrix || {};
+  gRevision = data.revision || 0;
+  gRevisionHeld = false;
+  gChangedCells = {};
 
   buildMatrixTable();
   gDirty = false;
@@ -402,7 +415,9 @@ async function saveMatrix() {
   const commentInput = document.getElementById("matrix-comment-input");
   if (commentInput) gComment = commentInput.value || "";
 
-  const entries = Object.entries(gMatrix).map(([key, value]) => {
+  // Only the cells changed since the last save
+  const sent = gChangedCells;
+  const cells = Object.entries(sent).map(([key, value]) => {
     const [playerIdStr, armyIndexStr] = key.split("-");
     return {
       player_id: parseInt(playerIdStr, 10),
@@ -410,34 +425,169 @@ async function saveMatrix() {
       value
     };
   });
+  gChangedCells = {};
+
+  const body = { cells, base_revision: gRevision };
+  // an untouched comment is not ours to save (a teammate may have changed it meanwhile)
+  if (gComment !== gSavedComment) body.comment = gComment;
 
   try {
     const res = await fetch(`/api/games/${window.GAME_ID}/matrix`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ entries, comment: gComment })
+      method: "PATCH",
+      headers: { "Content-Type": "application/json", "X-Client-Id": gClientId },
+      body: JSON.stringify(body)
     });
 
     const data = await res.json();
 
+    if (res.status === 409) {
+      // Someone else changed some of the same cells: take their values,
+      // keep our other edits pending
+      const conflicts = data.conflicts || [];
+      const pending = { ...sent, ...gChangedCells };
+      conflicts.forEach(c => delete pending[c.key.replace(/^matrix:/, "")]);
+      await reloadKeepingEdits(pending);
+      const cellCount = conflicts.filter(c => c.key.startsWith("matrix:")).length;
+      const what = [];
+      if (cellCount) what.push(`${cellCount} cell(s)`);
+      if (conflicts.some(c => c.key === "comment")) what.push("the comment");
+      setStatus(`Someone else changed ${what.join(" and ") || "this matrix"}: reloaded with their values.`, "error");
+      return;
+    }
+
     if (!res.ok) {
       console.error(data);
+      gChangedCells = { ...sent, ...gChangedCells };
       setStatus(data.error || "Error saving matrix.", "error");
       btn.disabled = false;
       return;
     }
 
+    // Server matrix includes the other editors' cells; re-apply edits made meanwhile
+    gRevision = Math.max(gRevision, data.revision);
+    gRevisionHeld = false;
+    gMatrix = data.matrix || gMatrix;
+    Object.entries(gChangedCells).forEach(([key, value]) => {
+      if (value === null) delete gMatrix[key];
+      else gMatrix[key] = value;
+    });
+    buildMatrixTable();
+
     gDirty = false;
     setCommentUI(gComment);
     setStatus("Matrix saved. The data-vault is pleased.", "saved");
   } catch (err) {
     console.error(err);
+    gChangedCells = { ...sent, ...gChangedCells };
     setStatus("Network or server error while saving.", "error");
     btn.disabled = false;
   }
 }
 
 
+async function reloadKeepingEdits(pending) {
+  await loadMatrixData();
+  if (!gRosterLocked) return;
+  Object.entries(pending).forEach(([key, value]) => {
+    if (value === null) delete gMatrix[key];
+    else gMatrix[key] = value;
+  });
+  gChangedCells = pending;
+  buildMatrixTable();
+  if (Object.keys(pending).length) markDirty();
+}
+
+
+/* =========================
+   Suggestions from history
+   ========================= */
+
+function suggestionLabel(s) {
+  const parts = [`Suggested ${s.state} (~${s.expected.toFixed(1)} pts)`];
+  if (s.games) parts.push(`${s.games} game(s) avg ${s.avg_score.toFixed(1)}${s.source === "scenario" ? " on this scenario" : ""}`);
+  const h = s.history || {};
+  const matches = (h.WIN || 0) + (h.DRAW || 0) + (h.LOSS || 0);
+  if (matches) parts.push(`history ${h.WIN || 0}W ${h.DRAW || 0}D ${h.LOSS || 0}L`);
+  return parts.join(" · ");
+}
+
+// Empty cells take the suggested state; filled cells are never overwritten
+async function fillFromHistory() {
+  if (!gRosterLocked) return;
+
+  const res = await fetchCached(`/api/games/${window.GAME_ID}/matrix/suggestions`);
+  const data = await res.json();
+  if (!res.ok) {
+    setStatus(data.error || "Error loading suggestions.", "error");
+    return;
+  }
+
+  gSuggestions = data.suggestions || {};
+  let filled = 0;
+  Object.entries(gSuggestions).forEach(([key, s]) => {
+    if (gMatrix[key]) return;
+    gMatrix[key] = s.state;
+    gChangedCells[key] = s.state;
+    filled += 1;
+  });
+
+  buildMatrixTable();
+  if (filled) {
+    markDirty();
+    setStatus(`${filled} empty cell(s) pre-filled from history. Review, then save.`, "unsaved");
+  } else {
+    setStatus("No empty cell with past data to pre-fill.");
+  }
+}
+
+
+/* =========================
+   Live updates
+   ========================= */
+
+// A teammate saved some cells: apply them in place, unless we are editing the same cell
+function applyMatrixEvent(ev) {
+  if (ev.client === gClientId || !gRosterLocked) return;
+
+  Object.entries(ev.cells || {}).forEach(([key, value]) => {
+    if (key in gChangedCells) {
+      gRevisionHeld = true;
+      return;
+    }
+    if (value === null) delete gMatrix[key];
+    else gMatrix[key] = value;
+  });
+  if ("comment" in ev) {
+    // only an unsaved comment edit of ours clashes with theirs
+    if (gComment !== gSavedComment) gRevisionHeld = true;
+    else setCommentUI(ev.comment);
+  }
+  if (!gRevisionHeld) gRevision = Math.max(gRevision, ev.revision);
+
+  buildMatrixTable();
+  if (!gDirty) setStatus("Updated by a teammate.", "saved");
+}
+
+function openLiveUpdates() {
+  const source = new EventSource(`/api/games/${window.GAME_ID}/events?since=${gRevision}`);
+  source.addEventListener("matrix", e => applyMatrixEvent(JSON.parse(e.data)));
+  // layout modifiers are not shown here, only their revision is taken
+  source.addEventListener("layout_modifiers", e => {
+    if (!gRevisionHeld) gRevision = Math.max(gRevision, JSON.parse(e.data).revision);
+  });
+  source.addEventListener("reload", e => {
+    const ev = JSON.parse(e.data);
+    if (ev.client === gClientId) return;
+    // after a roster reset our pending cells no longer apply
+    reloadKeepingEdits(ev.reset ? {} : gChangedCells).catch(console.error);
+  });
+  source.addEventListener("deleted", () => {
+    source.close();
+    setStatus("This game was deleted.", "error");
+  });
+}
+
+
 /* =========================
    Init
    ========================= */
@@ -446,11 +596,15 @@ document.addEventListener("DOMContentLoaded", async () => {
   const saveBtn = document.getElementById("save-matrix-btn");
   saveBtn.addEventListener("click", saveMatrix);
 
+  const suggestBtn = document.getElementById("suggest-btn");
+  if (suggestBtn) suggestBtn.addEventListener("click", () => fillFromHistory().catch(console.error));
+
   try {
     await loadMatrixData();
   } catch (err) {
     console.error(err);
   }
+  openLiveUpdates();
 });
 
 
@@ -458,11 +612,31 @@ document.addEventListener("DOMContentLoaded", async () => {
    Optimize
    ========================= */
 
-async function optimizePairing() {
-  const box = document.getElementById("optimize-results");
-  box.innerHTML = "Computing optimal pairing...";
+// Optimizer call run as a background job, with progress and (if it can stop) a Cancel button in the results box
+function runOptimizerJob(box, label, path) {
+  box.textContent = label;
+  const progress = document.createElement("span");
+  return runJob(path, {
+    onStart: job => {
+      box.appendChild(progress);
+      if (!job.cancellable) return;
+      const cancelBtn = document.createElement("button");
+      cancelBtn.className = "secondary";
+      cancelBtn.textContent = "Cancel";
+      cancelBtn.style.marginLeft = "0.6rem";
+      cancelBtn.addEventListener("click", () => cancelJob(job.id));
+      box.appendChild(cancelBtn);
+    },
+    onProgress: p => {
+      progress.textContent = p.total ? ` ${Math.round(100 * p.done / p.total)}%` : "";
+    }
+  });
+}
 
-  const res = await fetch(`/api/games/${window.GAME_ID}/optimize`);
+async function optimizePairing(mode = "ideal_assignment") {
+  const box = document.getElementById("optimize-results");
+  const res = await runOptimizerJob(box, "Computing optimal pairing...",
+    `/api/games/${window.GAME_ID}/optimize?mode=${mode}`);
   const data = await res.json();
 
   if (!res.ok) {
@@ -487,14 +661,17 @@ async function optimizePairing() {
           </div>
           <div style="color:#e74c3c; font-weight:600;">
             Total: ${sol.total_expected} pts
+            ${typeof sol.p_win === "number"
+              ? ` · Win ${(sol.p_win * 100).toFixed(1)}% / Draw ${(sol.p_draw * 100).toFixed(1)}% / Loss ${(sol.p_loss * 100).toFixed(1)}%`
+              : ""}
           </div>
         </div>
 
         <div style="margin-top:.6rem;">
           ${sol.pairings.map(p => `
             <div style="display:flex; justify-content:space-between; gap:1rem; padding:.35rem .2rem; border-bottom:1px solid rgba(255,255,255,0.06);">
-              <div>${p.player_name} → <strong>${p.faction}</strong></div>
-              <div style="opacity:.85;">${p.state} (${p.expected})</div>
+              <div>${p.player_name} → <strong>${p.faction}</strong>${p.layout_n ? ` · layout ${p.layout_n}` : ""}</div>
+              <div style="opacity:.85;">${p.state} (${p.expected}${p.layout_modifier ? `, ${p.layout_modifier > 0 ? "+" : ""}${p.layout_modifier}` : ""})</div>
             </div>
           `).join("")}
         </div>
@@ -505,6 +682,89 @@ async function optimizePairing() {
   box.innerHTML = html;
 }
 
+async function solvePairingGame() {
+  const box = document.getElementById("optimize-results");
+  const res = await runOptimizerJob(box, "Solving the pairing game...",
+    `/api/games/${window.GAME_ID}/optimize?mode=pairing_game`);
+  const data = await res.json();
+
+  if (!res.ok) {
+    box.innerHTML = `<div style="color:#ff8a80;">${data.error || "Pairing game solve failed."}</div>`;
+    return;
+  }
+
+  let html = `
+    <div style="display:flex; justify-content:space-between; gap:1rem; align-items:center; margin-bottom:.6rem;">
+      <div style="letter-spacing:.14em; text-transform:uppercase; color:#ddd;">Pairing game plan</div>
+      <div style="color:#e74c3c; font-weight:600;">Guaranteed: ${data.total_expected} pts</div>
+    </div>
+  `;
+
+  (data.phases || []).forEach(ph => {
+    let picks = "";
+    if (ph.our_defender) {
+      picks = `
+        <div style="opacity:.85; font-size:.85rem; margin:.3rem 0;">
+          Defend with <strong>${ph.our_defender.player_name}</strong> ·
+          send ${ph.our_attackers.map(p => p.player_name).join(" & ")} at ${ph.their_defender.faction} ·
+          expect ${ph.their_attackers.map(a => a.faction).join(" & ")} on our defender
+        </div>
+      `;
+    }
+    html += `
+      <div style="border:1px solid rgba(255,255,255,0.08); border-radius:12px; padding:0.8rem; margin-bottom:0.8rem; background:rgba(0,0,0,0.35);">
+        <div style="letter-spacing:.14em; text-transform:uppercase; color:#ddd;">${ph.phase}</div>
+        ${picks}
+        ${ph.games.map(g => `
+          <div style="display:flex; justify-content:space-between; gap:1rem; padding:.35rem .2rem; border-bottom:1px solid rgba(255,255,255,0.06);">
+            <div>Game ${g.game_no}: ${g.player_name} → <strong>${g.faction}</strong></div>
+            <div style="opacity:.85;">${g.state} (${g.expected})</div>
+          </div>
+        `).join("")}
+      </div>
+    `;
+  });
+
+  box.innerHTML = html;
+}
+
+
+async function showSensitivity() {
+  const box = document.getElementById("optimize-results");
+  const res = await runOptimizerJob(box, "Analysing matrix sensitivity...",
+    `/api/games/${window.GAME_ID}/sensitivity`);
+  const data = await res.json();
+
+  if (!res.ok) {
+    box.innerHTML = `<div style="color:#ff8a80;">${data.error || "Sensitivity analysis failed."}</div>`;
+    return;
+  }
+
+  // Only the cells where one or two states change the recommendation
+  const fragile = (data.cells || []).filter(c => c.shifts.some(s => s.changes_pairing));
+
+  let html = `
+    <div style="display:flex; justify-content:space-between; gap:1rem; align-items:center; margin-bottom:.6rem;">
+      <div style="letter-spacing:.14em; text-transform:uppercase; color:#ddd;">Cells the best pairing depends on</div>
+      <div style="color:#e74c3c; font-weight:600;">Best: ${data.total_expected} pts</div>
+    </div>
+  `;
+  if (!fragile.length) {
+    html += `<div style="color:#bbb;">No single cell moved by one or two states changes the best pairing.</div>`;
+  }
+  fragile.forEach(c => {
+    const flips = c.shifts.filter(s => s.changes_pairing)
+      .map(s => `${s.state} → ${s.total_expected} pts`).join(" · ");
+    html += `
+      <div style="display:flex; justify-content:space-between; gap:1rem; padding:.35rem .2rem; border-bottom:1px solid rgba(255,255,255,0.06);">
+        <div>${c.player_name} vs <strong>${c.faction}</strong> (${c.state}${c.in_best ? ", in best pairing" : ""})</div>
+        <div style="opacity:.85;">margin ${c.margin} · ${flips}</div>
+      </div>
+    `;
+  });
+
+  box.innerHTML = html;
+}
 
 
 
@@ -524,7 +784,19 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   // OPTIMIZE
   const optBtn = document.getElementById("optimize-btn");
-  if (optBtn) optBtn.addEventListener("click", optimizePairing);
+  if (optBtn) optBtn.addEventListener("click", () => optimizePairing());
+
+  const winBtn = document.getElementById("win-probability-btn");
+  if (winBtn) winBtn.addEventListener("click", () => optimizePairing("win_probability"));
+
+  const layoutBtn = document.getElementById("layout-aware-btn");
+  if (layoutBtn) layoutBtn.addEventListener("click", () => optimizePairing("layout_aware"));
+
+  const gameBtn = document.getElementById("pairing-game-btn");
+  if (gameBtn) gameBtn.addEventListener("click", solvePairingGame);
+
+  const sensBtn = document.getElementById("sensitivity-btn");
+  if (sensBtn) sensBtn.addEventListener("click", showSensitivity);
 
   // 📄 NEW — download PDF
   const dlBtn = document.getElementById("download-lists-btn");
@@ -1,5 +1,5 @@
 async function fetchPlayer(pid) {
-  const res = await fetch(`/api/players/${pid}`);
+  const res = await fetchCached(`/api/players/${pid}`);
   const data = await res.json();
   if (!res.ok) throw new Error(data.error || "Failed to load player");
   return data;
@@ -1,5 +1,5 @@
 async function fetchPlayers() {
-  const res = await fetch("/api/players");
+  const res = await fetchCached("/api/players");
   return await res.json();
 }
 
@@ -1,6 +1,7 @@
 let gRows = [];
 let gSortKey = "avg_score";
 let gSortDir = "desc"; // desc = best first
+const gDetails = {};    // player_id -> games breakdown, fetched when first opened
 
 function fmtNum(x, digits = 2) {
   if (typeof x !== "number" || !Number.isFinite(x)) return "—";
@@ -79,7 +80,7 @@ function renderTable() {
     const btn = document.createElement("button");
     btn.className = "row-btn";
     btn.textContent = "View";
-    btn.addEventListener("click", () => renderDetails(row));
+    btn.addEventListener("click", () => showDetails(row).catch(console.error));
     tdBtn.appendChild(btn);
     tr.appendChild(tdBtn);
 
@@ -87,7 +88,22 @@ function renderTable() {
   });
 }
 
-function renderDetails(row) {
+async function showDetails(row) {
+  if (!gDetails[row.player_id]) {
+    const res = await fetchCached(`/api/report/players/${row.player_id}`);
+    const data = await res.json();
+    if (!res.ok) {
+      const box = document.getElementById("details");
+      box.style.display = "block";
+      box.textContent = data.error || "Failed to load details.";
+      return;
+    }
+    gDetails[row.player_id] = data.details || [];
+  }
+  renderDetails(row, gDetails[row.player_id]);
+}
+
+function renderDetails(row, rowDetails) {
   const box = document.getElementById("details");
   box.style.display = "block";
   box.innerHTML = "";
@@ -104,7 +120,7 @@ function renderDetails(row) {
   }`;
   box.appendChild(meta);
 
-  const details = Array.isArray(row.details) ? row.details.slice() : [];
+  const details = Array.isArray(rowDetails) ? rowDetails.slice() : [];
   details.sort((a, b) => (a.game_id || 0) - (b.game_id || 0) || (a.game_no || 0) - (b.game_no || 0));
 
   details.forEach(d => {
@@ -141,7 +157,7 @@ async function loadReport() {
   const meta = document.getElementById("report-meta");
   meta.textContent = "Loading…";
 
-  const res = await fetch("/api/report");
+  const res = await fetchCached("/api/report");
   const data = await res.json();
   if (!res.ok) {
     meta.textContent = data.error || "Failed to load report.";
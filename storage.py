@@ -0,0 +1,774 @@
+"""
+Storage backends for games and players.
+
+Both backends expose the same methods, so app.py does not care which one runs:
+  load_games / save_games, get_game / save_game / delete_game
+  patch_game      small edit of one game (see apply_edit)
+  load_players / save_players, get_player / save_player / delete_player
+  load_doc / save_doc   derived documents (report aggregates, ...), rebuildable
+  transaction()   groups a read-modify-write cycle
+
+JsonStore keeps the historical games.json / players.json files (fine for
+small installs). SqliteStore keeps one row per game and per player in a WAL
+database, and imports the JSON files the first time it starts.
+
+open_store() wraps the backend in CachedStore, a process-wide read cache
+that only goes back to disk when the backend's version() changes. Its
+version() / item_version() / doc_version() are what HTTP validators
+(ETags) are made of.
+
+Backends count the bytes they read and write, and CachedStore times the
+loads and saves that reach them (metrics.py).
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from metrics import count_read, count_write, span
+
+try:
+    import fcntl
+except ImportError:  # Windows: thread lock only, single process
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+class StorageError(Exception):
+    pass
+
+
+def apply_edit(game, edit):
+    """
+    Apply a patch_game edit to a game dict, in place:
+      {"set":   {field: value},                 top-level fields replaced
+       "merge": {field: {key: value or None}}}  dict fields updated, None deletes
+    """
+    for field, value in (edit.get("set") or {}).items():
+        game[field] = value
+    for field, changes in (edit.get("merge") or {}).items():
+        target = game.get(field)
+        if not isinstance(target, dict):
+            target = game[field] = {}
+        for key, value in changes.items():
+            if value is None:
+                target.pop(key, None)
+            else:
+                target[key] = value
+    return game
+
+
+# Fold the journal into games.json once it grows past this size
+JOURNAL_COMPACT_BYTES = 64 * 1024
+
+
+class JsonStore:
+    """
+    Files are replaced atomically (temp file + fsync + rename), the previous
+    version is kept as <name>.bak, and transactions hold an flock on
+    data/.storage.lock so several worker processes can share the files.
+
+    patch_game() appends one line to games.journal instead of rewriting
+    games.json. Reads replay the journal on top of games.json; any full
+    games write (and compaction, once the journal is big enough) folds it
+    back in and truncates it. Each line records the games.json it applies
+    to (its inode, new on every replace), so lines left behind by a crash
+    between the replace and the truncation are skipped, not replayed on
+    the newer snapshot.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.games_file = data_dir / "games.json"
+        self.players_file = data_dir / "players.json"
+        self.journal_file = data_dir / "games.journal"
+        self.lock_file = data_dir / ".storage.lock"
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._corrupt = set()  # files whose last read fell back to the backup
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            depth = getattr(self._local, "depth", 0)
+            if depth or fcntl is None:
+                self._local.depth = depth + 1
+                try:
+                    yield
+                finally:
+                    self._local.depth = depth
+                return
+
+            # outermost: lock out the other processes too
+            with open(self.lock_file, "a") as lock:
+                with span("store.lock"):
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                self._local.depth = 1
+                try:
+                    yield
+                finally:
+                    self._local.depth = 0
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # --- whole collections ---
+
+    def _parse(self, path):
+        raw = path.read_bytes()
+        count_read(path.stem, len(raw))
+        data = json.loads(raw)
+        if not isinstance(data, list):
+            raise ValueError(f"{path.name} does not hold a list")
+        return data
+
+    def _read(self, path):
+        if not path.exists():
+            return []
+        try:
+            return self._parse(path)
+        except (ValueError, UnicodeDecodeError) as e:
+            # json.JSONDecodeError is a ValueError
+            backup = _backup_path(path)
+            log.error("%s is unreadable (%s), falling back to %s", path, e, backup.name)
+            self._corrupt.add(path)
+            try:
+                return self._parse(backup)
+            except (OSError, ValueError, UnicodeDecodeError):
+                # Never hand out [] here: the next save would wipe the history
+                raise StorageError(f"{path.name} is corrupted and no readable backup exists")
+
+    def _write(self, path, items):
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.data_dir, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(items, f, indent=2)
+                count_write(path.stem, f.tell())
+                f.flush()
+                os.fsync(f.fileno())
+            with self.transaction():
+                # Keep the current good version as the recovery snapshot
+                if path.exists() and path not in self._corrupt:
+                    _snapshot(path, _backup_path(path))
+                os.replace(tmp, path)
+                _bump_seq(path)
+                self._corrupt.discard(path)
+            _fsync_dir(self.data_dir)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def version(self, kind):
+        """
+        Changes whenever the collection is written, by us or another process.
+        The write counter catches rewrites that keep the size within one
+        mtime tick; the stat catches edits made by hand.
+        """
+        if kind == "games":
+            return _stat(self.games_file), _stat(self.journal_file), _read_seq(self.games_file)
+        return _stat(self.players_file), _read_seq(self.players_file)
+
+    def load_games(self):
+        while True:
+            snapshot = _inode(self.games_file)
+            games = self._read(self.games_file)
+            edits = self._read_journal(snapshot)
+            if _inode(self.games_file) == snapshot:
+                break
+            # games.json was replaced while we read: start over with the new one
+        if edits:
+            by_id = {g.get("id"): g for g in games if isinstance(g, dict)}
+            for edit in edits:
+                game = by_id.get(edit.get("game_id"))
+                if game is not None:
+                    apply_edit(game, edit)
+        return games
+
+    def save_games(self, games):
+        with self.transaction():
+            # games already hold the journal edits: fold them in
+            self._write(self.games_file, games)
+            if self.journal_file.exists():
+                self.journal_file.unlink()
+
+    def patch_game(self, game_id, edit):
+        with self.transaction():
+            line = json.dumps(dict(edit, game_id=game_id, snapshot=_inode(self.games_file))) + "\n"
+            with open(self.journal_file, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            _bump_seq(self.games_file)
+            count_write("games", len(line))
+            if self.journal_file.stat().st_size > JOURNAL_COMPACT_BYTES:
+                self.compact()
+
+    def compact(self):
+        """Rewrite games.json with the journal applied, then drop the journal."""
+        with self.transaction():
+            self.save_games(self.load_games())
+
+    def _read_journal(self, snapshot):
+        try:
+            with self.journal_file.open() as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        count_read("games", sum(len(line) for line in lines))
+        edits = []
+        for line in lines:
+            try:
+                edit = json.loads(line)
+            except ValueError:
+                # torn last line from a crash mid-append: that edit never completed
+                log.warning("Skipping unreadable journal line in %s", self.journal_file)
+                continue
+            # lines without a snapshot predate it: they apply to the current file
+            if edit.get("snapshot", snapshot) == snapshot:
+                edits.append(edit)
+        return edits
+
+    def load_players(self):
+        return self._read(self.players_file)
+
+    def save_players(self, players):
+        self._write(self.players_file, players)
+
+    # --- single items ---
+
+    def get_game(self, game_id):
+        return next((g for g in self.load_games() if g.get("id") == game_id), None)
+
+    def save_game(self, game):
+        with self.transaction():
+            self.save_games(_upsert(self.load_games(), game))
+
+    def delete_game(self, game_id):
+        with self.transaction():
+            games = self.load_games()
+            kept = [g for g in games if g.get("id") != game_id]
+            if len(kept) == len(games):
+                return False
+            self.save_games(kept)
+            return True
+
+    def get_player(self, player_id):
+        return next((p for p in self.load_players() if p.get("id") == player_id), None)
+
+    def save_player(self, player):
+        with self.transaction():
+            self.save_players(_upsert(self.load_players(), player))
+
+    # --- derived documents ---
+
+    def _doc_file(self, name):
+        return self.data_dir / f"{name}.json"
+
+    def doc_version(self, name):
+        path = self._doc_file(name)
+        return _stat(path), _read_seq(path)
+
+    def load_doc(self, name):
+        """The saved document, or None if missing or unreadable (callers rebuild it)."""
+        path = self._doc_file(name)
+        try:
+            raw = path.read_bytes()
+            count_read(name, len(raw))
+            return json.loads(raw)
+        except FileNotFoundError:
+            return None
+        except (ValueError, UnicodeDecodeError) as e:
+            log.error("%s is unreadable (%s), it will be rebuilt", path, e)
+            return None
+
+    def save_doc(self, name, doc):
+        self._write(self._doc_file(name), doc)
+
+    def delete_player(self, player_id):
+        with self.transaction():
+            players = self.load_players()
+            kept = [p for p in players if p.get("id") != player_id]
+            if len(kept) == len(players):
+                return False
+            self.save_players(kept)
+            return True
+
+
+def _stat(path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    # every write is a rename: a new inode even when size and mtime repeat
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _inode(path):
+    try:
+        return path.stat().st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _seq_path(path):
+    return path.with_name(f".{path.name}.seq")
+
+
+def _read_seq(path):
+    """Number of writes of `path` through JsonStore (0 before the first)."""
+    try:
+        return int(_seq_path(path).read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _bump_seq(path):
+    # Call under the store lock: read-increment-write of the counter must not interleave
+    seq = _seq_path(path)
+    tmp = seq.with_name(seq.name + ".tmp")
+    tmp.write_text(str(_read_seq(path) + 1))
+    os.replace(tmp, seq)
+
+
+def _backup_path(path):
+    return path.with_name(path.name + ".bak")
+
+
+def _snapshot(path, backup):
+    # Hard link when possible: no copy, and the old inode survives the rename
+    tmp = backup.with_name(backup.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        os.link(path, tmp)
+    except OSError:
+        shutil.copyfile(path, tmp)
+    os.replace(tmp, backup)
+
+
+def _fsync_dir(path):
+    # Make the rename itself durable (no-op where directories can't be opened)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _upsert(items, item):
+    for idx, existing in enumerate(items):
+        if isinstance(existing, dict) and existing.get("id") == item.get("id"):
+            items[idx] = item
+            return items
+    items.append(item)
+    return items
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_position ON players (position);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('games_version', '0'), ('players_version', '0');
+CREATE TABLE IF NOT EXISTS docs (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+class SqliteStore:
+    """
+    One JSON document per row, keyed by id. Players keep their list order
+    (the first players are the default active ones) in a position column.
+    Connections are per thread; transactions take the write lock up front
+    (BEGIN IMMEDIATE) so concurrent read-modify-write cycles serialise.
+    """
+
+    def __init__(self, path, migrate_from=None):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if migrate_from is not None:
+            self.migrate(migrate_from)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        if self._local.depth:
+            # nested: part of the outer transaction
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        with span("store.lock"):
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            with span("store.commit"):
+                conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def migrate(self, json_store):
+        """One-shot import of the JSON files into an empty database."""
+        with self.transaction():
+            conn = self._conn()
+            done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if done:
+                return
+            empty = (
+                conn.execute("SELECT COUNT(*) FROM games").fetchone()[0] == 0
+                and conn.execute("SELECT COUNT(*) FROM players").fetchone()[0] == 0
+            )
+            if empty:
+                self.save_games(json_store.load_games())
+                self.save_players(json_store.load_players())
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+    def version(self, kind):
+        """Write counter of a collection, bumped in the same transaction as the write."""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (f"{kind}_version",)).fetchone()
+        return row[0] if row else None
+
+    def _bump(self, kind):
+        self._conn().execute(
+            "UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = ?", (f"{kind}_version",)
+        )
+
+    # --- whole collections ---
+
+    def load_games(self):
+        rows = self._conn().execute("SELECT data FROM games ORDER BY id").fetchall()
+        count_read("games", sum(len(data) for (data,) in rows))
+        return [json.loads(data) for (data,) in rows]
+
+    def save_games(self, games):
+        games = [g for g in games if isinstance(g, dict) and isinstance(g.get("id"), int)]
+        with self.transaction():
+            conn = self._conn()
+            ids = [g["id"] for g in games]
+            conn.execute(
+                f"DELETE FROM games WHERE id NOT IN ({','.join('?' * len(ids))})", ids
+            )
+            rows = [(g["id"], json.dumps(g)) for g in games]
+            conn.executemany("INSERT OR REPLACE INTO games (id, data) VALUES (?, ?)", rows)
+            count_write("games", sum(len(data) for _, data in rows))
+            self._bump("games")
+
+    def load_players(self):
+        rows = self._conn().execute("SELECT data FROM players ORDER BY position, id").fetchall()
+        count_read("players", sum(len(data) for (data,) in rows))
+        return [json.loads(data) for (data,) in rows]
+
+    def save_players(self, players):
+        players = [p for p in players if isinstance(p, dict) and isinstance(p.get("id"), int)]
+        with self.transaction():
+            conn = self._conn()
+            ids = [p["id"] for p in players]
+            conn.execute(
+                f"DELETE FROM players WHERE id NOT IN ({','.join('?' * len(ids))})", ids
+            )
+            rows = [(p["id"], pos, json.dumps(p)) for pos, p in enumerate(players)]
+            conn.executemany("INSERT OR REPLACE INTO players (id, position, data) VALUES (?, ?, ?)", rows)
+            count_write("players", sum(len(data) for _, _, data in rows))
+            self._bump("players")
+
+    # --- single items ---
+
+    def get_game(self, game_id):
+        row = self._conn().execute("SELECT data FROM games WHERE id = ?", (game_id,)).fetchone()
+        if row is None:
+            return None
+        count_read("games", len(row[0]))
+        return json.loads(row[0])
+
+    def save_game(self, game):
+        data = json.dumps(game)
+        with self.transaction():
+            self._conn().execute("INSERT OR REPLACE INTO games (id, data) VALUES (?, ?)", (game["id"], data))
+            count_write("games", len(data))
+            self._bump("games")
+
+    def patch_game(self, game_id, edit):
+        # A row update is already small: apply the edit in place
+        with self.transaction():
+            game = self.get_game(game_id)
+            if game is not None:
+                self.save_game(apply_edit(game, edit))
+
+    def delete_game(self, game_id):
+        with self.transaction():
+            cur = self._conn().execute("DELETE FROM games WHERE id = ?", (game_id,))
+            count_write("games", 0)
+            self._bump("games")
+            return cur.rowcount > 0
+
+    def get_player(self, player_id):
+        row = self._conn().execute("SELECT data FROM players WHERE id = ?", (player_id,)).fetchone()
+        if row is None:
+            return None
+        count_read("players", len(row[0]))
+        return json.loads(row[0])
+
+    def save_player(self, player):
+        conn = self._conn()
+        with self.transaction():
+            row = conn.execute("SELECT position FROM players WHERE id = ?", (player["id"],)).fetchone()
+            if row:
+                position = row[0]
+            else:
+                position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM players").fetchone()[0]
+            data = json.dumps(player)
+            conn.execute(
+                "INSERT OR REPLACE INTO players (id, position, data) VALUES (?, ?, ?)",
+                (player["id"], position, data),
+            )
+            count_write("players", len(data))
+            self._bump("players")
+
+    def delete_player(self, player_id):
+        with self.transaction():
+            cur = self._conn().execute("DELETE FROM players WHERE id = ?", (player_id,))
+            count_write("players", 0)
+            self._bump("players")
+            return cur.rowcount > 0
+
+    # --- derived documents ---
+
+    def doc_version(self, name):
+        row = self._conn().execute("SELECT version FROM docs WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def load_doc(self, name):
+        row = self._conn().execute("SELECT data FROM docs WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        count_read(name, len(row[0]))
+        return json.loads(row[0])
+
+    def save_doc(self, name, doc):
+        data = json.dumps(doc)
+        with self.transaction():
+            self._conn().execute(
+                "INSERT INTO docs (name, version, data) VALUES (?, 1, ?) "
+                "ON CONFLICT (name) DO UPDATE SET version = version + 1, data = excluded.data",
+                (name, data),
+            )
+            count_write(name, len(data))
+
+
+class CachedStore:
+    """
+    Process-wide read cache over a backend: each collection is parsed once
+    and kept with a by-id dict until backend.version() changes (another
+    process wrote) or we write through this store.
+
+    load_games() / load_players() return the shared cached objects: treat
+    them as read-only. get_game() / get_player() return private copies that
+    handlers can modify and save.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._cache = {}  # kind -> (version, items, by_id, derived)
+        self._local = threading.local()
+
+    @contextmanager
+    def transaction(self):
+        try:
+            with self.backend.transaction():
+                yield
+        finally:
+            # Reads inside a transaction that wrote may have cached data
+            # that was then rolled back: start over from disk
+            if getattr(self._local, "wrote", False):
+                self._local.wrote = False
+                self._cache.clear()
+
+    def _collection(self, kind):
+        version = self.backend.version(kind)
+        entry = self._cache.get(kind)
+        if entry is not None and entry[0] == version:
+            return entry
+        with self._lock:
+            entry = self._cache.get(kind)
+            if entry is not None and entry[0] == version:
+                return entry
+            # version read before the load: a concurrent write only causes one extra reload
+            with span(f"store.load_{kind}"):
+                items = self.backend.load_games() if kind == "games" else self.backend.load_players()
+            by_id = {x.get("id"): x for x in items if isinstance(x, dict)}
+            entry = (version, items, by_id, {})
+            self._cache[kind] = entry
+            return entry
+
+    def _invalidate(self, kind):
+        self._local.wrote = True
+        self._cache.pop(kind, None)
+
+    def load_games(self):
+        return list(self._collection("games")[1])
+
+    def load_players(self):
+        return list(self._collection("players")[1])
+
+    def version(self, kind):
+        return self.backend.version(kind)
+
+    def item_version(self, kind, item_id):
+        """
+        Hash of one game / player, computed once per collection version: it
+        only changes when that item does. None if there is no such item.
+        """
+        entry = self._collection(kind)
+        hashes = entry[3].setdefault("item_versions", {})
+        if item_id not in hashes:
+            item = entry[2].get(item_id)
+            hashes[item_id] = None if item is None else hashlib.sha1(
+                json.dumps(item, sort_keys=True).encode()
+            ).hexdigest()
+        return hashes[item_id]
+
+    def derived(self, kind, name, build):
+        """build(items) for the cached collection, computed once per version (secondary indexes...)."""
+        entry = self._collection(kind)
+        value = entry[3].get(name)
+        if value is None:
+            value = entry[3][name] = build(entry[1])
+        return value
+
+    def get_game(self, game_id):
+        game = self._collection("games")[2].get(game_id)
+        return copy.deepcopy(game) if game is not None else None
+
+    def get_player(self, player_id):
+        player = self._collection("players")[2].get(player_id)
+        return copy.deepcopy(player) if player is not None else None
+
+    def save_games(self, games):
+        try:
+            with span("store.save_games"):
+                self.backend.save_games(games)
+        finally:
+            self._invalidate("games")
+
+    def save_game(self, game):
+        try:
+            with span("store.save_game"):
+                self.backend.save_game(game)
+        finally:
+            self._invalidate("games")
+
+    def patch_game(self, game_id, edit):
+        try:
+            with span("store.patch_game"):
+                self.backend.patch_game(game_id, edit)
+        finally:
+            self._invalidate("games")
+
+    def delete_game(self, game_id):
+        try:
+            with span("store.delete_game"):
+                return self.backend.delete_game(game_id)
+        finally:
+            self._invalidate("games")
+
+    def save_players(self, players):
+        try:
+            with span("store.save_players"):
+                self.backend.save_players(players)
+        finally:
+            self._invalidate("players")
+
+    def save_player(self, player):
+        try:
+            with span("store.save_player"):
+                self.backend.save_player(player)
+        finally:
+            self._invalidate("players")
+
+    def delete_player(self, player_id):
+        try:
+            with span("store.delete_player"):
+                return self.backend.delete_player(player_id)
+        finally:
+            self._invalidate("players")
+
+    def doc_version(self, name):
+        return self.backend.doc_version(name)
+
+    def load_doc(self, name):
+        """Shared cached document (read-only, like load_games), None if never saved."""
+        kind = ("doc", name)
+        version = self.backend.doc_version(name)
+        entry = self._cache.get(kind)
+        if entry is None or entry[0] != version:
+            with span("store.load_doc"):
+                entry = (version, self.backend.load_doc(name))
+            self._cache[kind] = entry
+        return entry[1]
+
+    def save_doc(self, name, doc):
+        try:
+            with span("store.save_doc"):
+                self.backend.save_doc(name, doc)
+        finally:
+            self._invalidate(("doc", name))
+
+
+STORAGE_BACKENDS = ("json", "sqlite")
+
+
+def open_store(data_dir, backend="json"):
+    """
+    Cached JsonStore, or cached SqliteStore at data_dir/pairing.db seeded
+    from the JSON files.
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    json_store = JsonStore(data_dir)
+    if backend == "json":
+        return CachedStore(json_store)
+    if backend == "sqlite":
+        return CachedStore(SqliteStore(data_dir / "pairing.db", migrate_from=json_store))
+    raise ValueError(f"Unknown storage backend {backend!r} (expected one of {', '.join(STORAGE_BACKENDS)})")